@@ -22,10 +22,12 @@ from .core_infrastructure.oss.storage_manager import storage_manager
 
 from .ai_foundation.llm.manager import llm_manager, embedding_manager
 from .ai_foundation.memory.memory_bank import memory_bank
-from .ai_foundation.agents.agent_factory import agent_factory
+from .ai_foundation.agents.agent_factory import (
+    agent_factory, PlanningMode, DEFAULT_MEMORY_TIMEOUT, DEFAULT_KNOWLEDGE_TIMEOUT
+)
 from .data_communication.rag.rag_manager import rag_manager
 
-from .config import config_manager, init_v2_from_settings, init_v2_from_env
+from .config import config_manager, init_v2_from_settings, init_v2_from_env, shutdown_v2
 
 # 导入原有工具功能
 from .tools.study_tools import (
@@ -45,7 +47,7 @@ class AgentType(str, Enum):
 
 # 智能体配置
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import AsyncGenerator, List, Dict, Any, Optional
 
 @dataclass
 class AgentConfig:
@@ -61,6 +63,10 @@ class AgentConfig:
     system_prompt: Optional[str] = None
     memory_enabled: bool = True
     rag_enabled: bool = True
+    planning_mode: PlanningMode = PlanningMode.STATIC
+    classifier_model: Optional[str] = None
+    memory_timeout: float = DEFAULT_MEMORY_TIMEOUT
+    knowledge_timeout: float = DEFAULT_KNOWLEDGE_TIMEOUT
     
     def __post_init__(self):
         if self.tools is None:
@@ -87,64 +93,108 @@ class StudyPlannerAgent:
         except Exception as e:
             raise AgentException(f"留学规划师初始化失败: {e}", tenant_id=self.tenant_id)
     
-    async def execute(self, query: str) -> str:
-        """执行留学规划查询"""
-        try:
-            if not self.agent_executor:
-                raise AgentException("智能体未正确初始化", tenant_id=self.tenant_id)
-            
-            # 添加记忆上下文
-            context = await memory_bank.get_context(
-                session_id=f"planner_{self.tenant_id}",
-                user_id=self.tenant_id,
-                query=query
-            )
-            
-            # 构建增强的查询
-            # 格式化历史对话
-            conversation_text = ""
-            if context and context.session_history:
-                for item in context.session_history:
-                    conversation_text += f"用户: {item.get('human', '')}\n"
-                    conversation_text += f"助手: {item.get('assistant', '')}\n---\n"
-            else:
-                conversation_text = "无历史记录"
-            
-            # 格式化相关记忆
-            relevant_text = ""
-            if context and context.relevant_memories:
-                for memory in context.relevant_memories:
-                    relevant_text += f"- {memory.get('summary', '')}\n"
-            else:
-                relevant_text = "无相关知识"
-            
-            enhanced_query = f"""用户问题: {query}
+    async def _build_enhanced_query(self, query: str) -> str:
+        """拼接历史对话和相关记忆，构建增强的查询"""
+        # 添加记忆上下文
+        context = await memory_bank.get_context(
+            session_id=f"planner_{self.tenant_id}",
+            user_id=self.tenant_id,
+            query=query
+        )
+        
+        # 格式化历史对话
+        conversation_text = ""
+        if context and context.session_history:
+            for item in context.session_history:
+                conversation_text += f"用户: {item.get('human', '')}\n"
+                conversation_text += f"助手: {item.get('assistant', '')}\n---\n"
+        else:
+            conversation_text = "无历史记录"
+        
+        # 更早轮次的滚动摘要
+        summary_text = ""
+        if context and context.session_summary:
+            summary_text = f"\n早期对话摘要:\n{context.session_summary}\n"
+        
+        # 格式化相关记忆
+        relevant_text = ""
+        if context and context.relevant_memories:
+            for memory in context.relevant_memories:
+                relevant_text += f"- {memory.get('summary', '')}\n"
+        else:
+            relevant_text = "无相关知识"
+        
+        return f"""用户问题: {query}
 
-历史对话上下文:
+历史对话上下文:{summary_text}
 {conversation_text}
 
 相关知识:
 {relevant_text}
 
 请作为专业的留学规划师，基于上述信息为用户提供个性化的留学申请策略建议。"""
-
+    
+    async def _save_interaction(self, query: str, response: str):
+        """保存对话记录"""
+        await memory_bank.add_interaction(
+            session_id=f"planner_{self.tenant_id}",
+            user_id=self.tenant_id,
+            human_message=query,
+            ai_message=response
+        )
+    
+    async def execute(self, query: str, use_cache: bool = False) -> str:
+        """执行留学规划查询 (use_cache 为 True 时相似问题直接复用缓存回答)"""
+        try:
+            if not self.agent_executor:
+                raise AgentException("智能体未正确初始化", tenant_id=self.tenant_id)
+            
+            if use_cache:
+                cached = await self.agent_executor.get_cached_response(query, self.tenant_id)
+                if cached is not None:
+                    await self._save_interaction(query, cached)
+                    return cached
+            
+            enhanced_query = await self._build_enhanced_query(query)
+            
             # 执行智能体
-            response = await self.agent_executor.execute(enhanced_query)
+            response = await self.agent_executor.execute(enhanced_query, tenant_id=self.tenant_id)
             if not response:
                 response = "抱歉，我无法为您提供建议。"
+            elif use_cache:
+                # 以原始问题为键缓存，拼接的历史上下文不参与匹配
+                await self.agent_executor.cache_response(query, response, self.tenant_id)
             
-            # 保存对话记录
-            await memory_bank.add_interaction(
-                session_id=f"planner_{self.tenant_id}",
-                user_id=self.tenant_id,
-                human_message=query,
-                ai_message=response
-            )
+            await self._save_interaction(query, response)
             
             return response
             
         except Exception as e:
             raise AgentException(f"留学规划师执行失败: {e}", tenant_id=self.tenant_id, agent_type="study_planner")
+    
+    async def stream(self, query: str, use_cache: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """流式执行留学规划查询，产出 token / tool_call / usage / final_answer / error 事件"""
+        if not self.agent_executor:
+            raise AgentException("智能体未正确初始化", tenant_id=self.tenant_id)
+        
+        if use_cache:
+            cached = await self.agent_executor.get_cached_response(query, self.tenant_id)
+            if cached is not None:
+                await self._save_interaction(query, cached)
+                yield {"type": "final_answer", "content": cached, "cached": True}
+                return
+        
+        enhanced_query = await self._build_enhanced_query(query)
+        async for event in self.agent_executor.stream(enhanced_query, tenant_id=self.tenant_id):
+            if event["type"] == "final_answer":
+                response = event["content"]
+                if not response:
+                    response = "抱歉，我无法为您提供建议。"
+                elif use_cache:
+                    await self.agent_executor.cache_response(query, response, self.tenant_id)
+                await self._save_interaction(query, response)
+                event = {**event, "content": response}
+            yield event
 
 
 class StudyConsultantAgent:
@@ -186,14 +236,16 @@ class StudyConsultantAgent:
 
 请始终保持专业的咨询师身份，为用户提供有价值的留学指导。"""
     
-    async def execute(self, query: str) -> str:
-        """执行留学咨询查询"""
+    async def execute(self, query: str, use_cache: bool = False) -> str:
+        """执行留学咨询查询 (use_cache 为 True 时相似问题直接复用缓存回答)"""
         try:
             if not self.agent_executor:
                 raise AgentException("智能体未正确初始化", tenant_id=self.tenant_id)
             
             # 执行智能体
-            response = await self.agent_executor.execute(query)
+            response = await self.agent_executor.execute(
+                query, cache_query=query if use_cache else None, tenant_id=self.tenant_id
+            )
             if not response:
                 response = "抱歉，我无法回答您的问题。"
             
@@ -201,6 +253,25 @@ class StudyConsultantAgent:
             
         except Exception as e:
             raise AgentException(f"留学咨询师执行失败: {e}", tenant_id=self.tenant_id, agent_type="study_consultant")
+    
+    async def stream(self, query: str, use_cache: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """流式执行留学咨询查询，产出 token / tool_call / usage / final_answer / error 事件"""
+        if not self.agent_executor:
+            raise AgentException("智能体未正确初始化", tenant_id=self.tenant_id)
+        
+        if use_cache:
+            cached = await self.agent_executor.get_cached_response(query, self.tenant_id)
+            if cached is not None:
+                yield {"type": "final_answer", "content": cached, "cached": True}
+                return
+        
+        async for event in self.agent_executor.stream(query, tenant_id=self.tenant_id):
+            if event["type"] == "final_answer":
+                if not event["content"]:
+                    event = {**event, "content": "抱歉，我无法回答您的问题。"}
+                elif use_cache:
+                    await self.agent_executor.cache_response(query, event["content"], self.tenant_id)
+            yield event
 
 
 # 便捷创建函数
@@ -268,10 +339,10 @@ __all__ = [
     "agent_factory", "rag_manager", "storage_manager",
     
     # 配置管理
-    "config_manager", "init_v2_from_settings", "init_v2_from_env",
+    "config_manager", "init_v2_from_settings", "init_v2_from_env", "shutdown_v2",
     
     # 智能体类型和配置
-    "AgentType", "AgentConfig",
+    "AgentType", "AgentConfig", "PlanningMode",
     
     # 智能体类
     "StudyPlannerAgent", "StudyConsultantAgent",
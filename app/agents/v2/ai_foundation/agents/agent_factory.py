@@ -2,13 +2,28 @@
 智能体工厂 - 动态创建和配置不同类型的Agent
 基于LangGraph实现的状态机Agent框架
 """
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncGenerator
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
+import asyncio
+import dataclasses
+import json
 import logging
+import re
+import time
 
 from langgraph.graph import StateGraph
 from ...core_infrastructure.error.exceptions import AgentException, ErrorCode
+from ..llm.query_embedding import request_embedding_scope
+from .response_cache import response_cache
+from .tool_executor import ToolCall, tool_executor
+
+# 并行检索阶段各路的默认超时 (秒)，超时的一路不阻塞生成
+DEFAULT_MEMORY_TIMEOUT = 1.0
+DEFAULT_KNOWLEDGE_TIMEOUT = 2.0
+# 工厂缓存的执行器 (编译好的状态图) 数量上限
+DEFAULT_MAX_EXECUTORS = 64
 
 
 class AgentType(str, Enum):
@@ -19,6 +34,13 @@ class AgentType(str, Enum):
     GENERAL_ADVISOR = "general_advisor"   # 通用咨询师
 
 
+class PlanningMode(str, Enum):
+    """执行规划模式"""
+    STATIC = "static"          # 按配置直接检索记忆和知识，只调用一次生成
+    CLASSIFIER = "classifier"  # 先用一次轻量分类调用决定是否需要检索
+    REACT = "react"            # 每一步之前都调用 LLM 思考 (旧流程)
+
+
 @dataclass
 class AgentConfig:
     """智能体配置"""
@@ -31,6 +53,11 @@ class AgentConfig:
     tools: List[str] = None
     memory_enabled: bool = True
     rag_enabled: bool = True
+    planning_mode: PlanningMode = PlanningMode.STATIC
+    classifier_model: Optional[str] = None  # 分类模式使用的模型，默认与 model_name 相同
+    max_iterations: int = 6                 # 工具调用轮数上限
+    memory_timeout: float = DEFAULT_MEMORY_TIMEOUT        # 记忆检索超时 (秒)
+    knowledge_timeout: float = DEFAULT_KNOWLEDGE_TIMEOUT  # 知识检索超时 (秒)
     
     def __post_init__(self):
         if self.tools is None:
@@ -48,6 +75,9 @@ class AgentState:
     rag_results: Optional[List[Dict]] = None
     final_response: str = ""
     metadata: Dict[str, Any] = None
+    tenant_id: str = ""
+    # 流式执行时的事件队列，节点向其中写入 token / 工具调用 / 用量事件
+    event_queue: Optional[asyncio.Queue] = None
     
     def __post_init__(self):
         if self.metadata is None:
@@ -59,13 +89,31 @@ class ToolRegistry:
     
     def __init__(self):
         self._tools = {}
+        self._options: Dict[str, Dict[str, Optional[float]]] = {}
         self.logger = logging.getLogger(__name__)
     
-    def register_tool(self, name: str, tool_func):
-        """注册工具"""
+    def register_tool(
+        self,
+        name: str,
+        tool_func,
+        timeout: Optional[float] = None,
+        cache_ttl: Optional[float] = None
+    ):
+        """
+        注册工具
+        
+        Args:
+            timeout: 执行超时 (秒)，默认使用工具执行器的超时
+            cache_ttl: 结果缓存时间 (秒)，0 表示不缓存 (如有副作用的工具)
+        """
         self._tools[name] = tool_func
+        self._options[name] = {"timeout": timeout, "cache_ttl": cache_ttl}
         self.logger.info(f"已注册工具: {name}")
     
+    def get_tool_call(self, name: str, args: Dict[str, Any]) -> ToolCall:
+        """构建带超时和缓存配置的工具调用"""
+        return ToolCall(name=name, func=self.get_tool(name), args=args, **self._options.get(name, {}))
+    
     def get_tool(self, name: str):
         """获取工具"""
         if name not in self._tools:
@@ -83,6 +131,7 @@ class ToolRegistry:
         """注销工具"""
         if name in self._tools:
             del self._tools[name]
+            self._options.pop(name, None)
             self.logger.info(f"已注销工具: {name}")
 
 
@@ -102,6 +151,7 @@ class AgentExecutor:
         self.memory_bank = memory_bank
         self.rag_manager = rag_manager
         self.tool_registry = tool_registry
+        self.tool_executor = tool_executor
         self.logger = logging.getLogger(__name__)
         
         # 构建状态图
@@ -109,6 +159,34 @@ class AgentExecutor:
     
     def _build_graph(self) -> StateGraph:
         """构建LangGraph状态图"""
+        if self.config.planning_mode == PlanningMode.REACT:
+            return self._build_react_graph()
+        
+        workflow = StateGraph(AgentState)
+        
+        # 先规划检索，检索完成后只调用一次生成；仅当模型请求工具时才进入工具循环
+        workflow.add_node("plan", self._plan_node)
+        workflow.add_node("retrieve_context", self._retrieve_context_node)
+        workflow.add_node("use_tool", self._use_tool_node)
+        workflow.add_node("generate_response", self._generate_response_node)
+        
+        workflow.set_entry_point("plan")
+        workflow.add_edge("plan", "retrieve_context")
+        workflow.add_edge("retrieve_context", "generate_response")
+        workflow.add_conditional_edges(
+            "generate_response",
+            self._route_after_response,
+            {
+                "tool": "use_tool",
+                "end": "__end__"
+            }
+        )
+        workflow.add_edge("use_tool", "generate_response")
+        
+        return workflow.compile()
+    
+    def _build_react_graph(self) -> StateGraph:
+        """构建思考-行动循环状态图 (每一步之前调用 LLM 思考)"""
         workflow = StateGraph(AgentState)
         
         # 添加节点
@@ -147,12 +225,14 @@ class AgentExecutor:
             # 构建思考提示
             messages = self._build_think_prompt(state)
             
-            # 调用LLM进行思考
+            # 调用LLM进行思考 (参数与响应节点一致，提示相同时由补全缓存复用结果)
             response = await self.llm_manager.chat(
-                tenant_id=self.config.tenant_id,
+                tenant_id=state.tenant_id,
                 model_name=self.config.model_name,
                 messages=messages,
-                temperature=self.config.temperature
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens,
+                cache=True
             )
             
             # 更新状态
@@ -171,24 +251,76 @@ class AgentExecutor:
             raise AgentException(
                 error_code=ErrorCode.AGENT_EXECUTION_ERROR,
                 message=f"思考节点执行失败: {str(e)}",
-                tenant_id=self.config.tenant_id
+                tenant_id=state.tenant_id
             )
     
+    async def _plan_node(self, state: AgentState) -> AgentState:
+        """规划节点 - 决定本轮需要检索哪些上下文"""
+        use_memory = self.config.memory_enabled
+        use_knowledge = self.config.rag_enabled
+        
+        if self.config.planning_mode == PlanningMode.CLASSIFIER and (use_memory or use_knowledge):
+            decision = await self._classify_retrieval(state)
+            use_memory = use_memory and decision.get("memory", True)
+            use_knowledge = use_knowledge and decision.get("knowledge", True)
+        
+        state.metadata["use_memory"] = use_memory
+        state.metadata["use_knowledge"] = use_knowledge
+        return state
+    
+    async def _classify_retrieval(self, state: AgentState) -> Dict[str, bool]:
+        """用一次轻量 LLM 调用判断是否需要历史记忆和知识库，失败时返回空字典 (全部检索)"""
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "判断回答用户问题是否需要: memory (用户的历史对话和个人信息)、"
+                    "knowledge (留学知识库)。只输出 JSON，例如 {\"memory\": true, \"knowledge\": false}"
+                )
+            },
+            {"role": "user", "content": state.input}
+        ]
+        try:
+            response = await self.llm_manager.chat(
+                tenant_id=state.tenant_id,
+                model_name=self.config.classifier_model or self.config.model_name,
+                messages=messages,
+                temperature=0,
+                max_tokens=20
+            )
+            match = re.search(r"\{.*\}", response.content or "", re.S)
+            decision = json.loads(match.group(0)) if match else {}
+            return {key: bool(value) for key, value in decision.items() if key in ("memory", "knowledge")}
+        except Exception as e:
+            self.logger.warning(f"检索分类失败，默认全部检索: {e}")
+            return {}
+    
+    async def _fetch_memory(self, state: AgentState) -> Dict[str, Any]:
+        """检索记忆上下文"""
+        memory_context = await self.memory_bank.get_context(
+            session_id=f"{state.tenant_id}_session",
+            user_id=state.tenant_id,
+            query=state.input,
+            top_k=3
+        )
+        return memory_context.__dict__
+    
+    async def _fetch_knowledge(self, state: AgentState) -> Optional[Dict[str, Any]]:
+        """检索相关知识"""
+        rag_results = await self.rag_manager.query(
+            tenant_id=state.tenant_id,
+            query_text=state.input,
+            top_k=5
+        )
+        return rag_results.__dict__ if rag_results else None
+    
     async def _retrieve_memory_node(self, state: AgentState) -> AgentState:
         """检索记忆节点"""
-        if not self.config.memory_enabled:
+        if not self.config.memory_enabled or not state.metadata.get("use_memory", True):
             return state
         
         try:
-            # 检索记忆上下文
-            memory_context = await self.memory_bank.get_context(
-                session_id=f"{self.config.tenant_id}_session",
-                user_id=self.config.tenant_id,
-                query=state.input,
-                top_k=3
-            )
-            
-            state.memory_context = memory_context.__dict__
+            state.memory_context = await self._fetch_memory(state)
             return state
             
         except Exception as e:
@@ -197,46 +329,80 @@ class AgentExecutor:
     
     async def _retrieve_knowledge_node(self, state: AgentState) -> AgentState:
         """检索知识节点"""
-        if not self.config.rag_enabled:
+        if not self.config.rag_enabled or not state.metadata.get("use_knowledge", True):
             return state
         
         try:
-            # 检索相关知识
-            rag_results = await self.rag_manager.query(
-                tenant_id=self.config.tenant_id,
-                query_text=state.input,
-                top_k=5
-            )
-            
-            state.rag_results = rag_results.__dict__ if rag_results else None
+            state.rag_results = await self._fetch_knowledge(state)
             return state
             
         except Exception as e:
             self.logger.warning(f"知识检索失败: {e}")
             return state
     
+    async def _retrieve_context_node(self, state: AgentState) -> AgentState:
+        """
+        并行检索节点 - 同时检索记忆和知识
+        
+        两路检索各有独立的超时，超时或失败的一路不写入状态，只记录在 metadata["retrieval"] 中，
+        检索耗时为两路中较慢的一路而不是两者之和；两路共享同一次查询嵌入
+        """
+        async def timed(name: str, fetch, timeout: float):
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(fetch(state), timeout=timeout)
+                status = "ok"
+            except asyncio.TimeoutError:
+                self.logger.warning(f"{name} 检索超时 ({timeout}s)，跳过")
+                result, status = None, "timeout"
+            except Exception as e:
+                self.logger.warning(f"{name} 检索失败: {e}")
+                result, status = None, "error"
+            return result, {"status": status, "latency": round(time.monotonic() - start, 4)}
+        
+        tasks = {}
+        if self.config.memory_enabled and state.metadata.get("use_memory", True):
+            tasks["memory"] = timed("memory", self._fetch_memory, self.config.memory_timeout)
+        if self.config.rag_enabled and state.metadata.get("use_knowledge", True):
+            tasks["knowledge"] = timed("knowledge", self._fetch_knowledge, self.config.knowledge_timeout)
+        
+        with request_embedding_scope():
+            results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+        retrieval = {name: stats for name, (_, stats) in results.items()}
+        if "memory" in results:
+            state.memory_context = results["memory"][0]
+        if "knowledge" in results:
+            state.rag_results = results["knowledge"][0]
+        state.metadata["retrieval"] = retrieval
+        return state
+    
     async def _use_tool_node(self, state: AgentState) -> AgentState:
         """使用工具节点"""
         if not state.tool_calls:
             return state
         
         try:
-            for tool_call in state.tool_calls:
-                tool_name = tool_call.get("name")
-                tool_args = tool_call.get("arguments", {})
-                
-                # 获取并执行工具
-                tool_func = self.tool_registry.get_tool(tool_name)
-                result = await tool_func(**tool_args)
-                
-                # 添加工具结果到上下文
-                if "tool_results" not in state.context:
-                    state.context["tool_results"] = []
-                
+            calls = [
+                self.tool_registry.get_tool_call(tool_call.get("name"), tool_call.get("arguments", {}))
+                for tool_call in state.tool_calls
+            ]
+            for call in calls:
+                await self._emit(state, {"type": "tool_call", "tool": call.name, "args": call.args})
+            
+            # 互不依赖的工具并发执行，单个工具超时或失败时以错误信息作为结果
+            results = await self.tool_executor.run_many(calls)
+            
+            # 添加工具结果到上下文
+            if "tool_results" not in state.context:
+                state.context["tool_results"] = []
+            
+            for result in results:
+                content = result.result if result.error is None else result.error
+                await self._emit(state, {"type": "tool_result", "tool": result.tool, "content": str(content)})
                 state.context["tool_results"].append({
-                    "tool": tool_name,
-                    "args": tool_args,
-                    "result": result
+                    "tool": result.tool,
+                    "args": result.args,
+                    "result": content
                 })
             
             # 清空tool_calls
@@ -247,7 +413,7 @@ class AgentExecutor:
             raise AgentException(
                 error_code=ErrorCode.AGENT_TOOL_ERROR,
                 message=f"工具执行失败: {str(e)}",
-                tenant_id=self.config.tenant_id
+                tenant_id=state.tenant_id
             )
     
     async def _generate_response_node(self, state: AgentState) -> AgentState:
@@ -257,23 +423,36 @@ class AgentExecutor:
             messages = self._build_response_prompt(state)
             
             # 生成最终响应
-            response = await self.llm_manager.chat(
-                tenant_id=self.config.tenant_id,
-                model_name=self.config.model_name,
-                messages=messages,
-                temperature=self.config.temperature,
-                max_tokens=self.config.max_tokens
-            )
+            if state.event_queue is not None:
+                content, tool_calls = await self._stream_response(state, messages)
+            else:
+                response = await self.llm_manager.chat(
+                    tenant_id=state.tenant_id,
+                    model_name=self.config.model_name,
+                    messages=messages,
+                    temperature=self.config.temperature,
+                    max_tokens=self.config.max_tokens,
+                    cache=True
+                )
+                content = response.content
+                tool_calls = response.tool_calls if response.has_tool_call else []
             
-            state.final_response = response.content
+            # 模型请求工具时先执行工具再重新生成 (思考-行动模式下工具由思考节点处理)
+            iterations = state.metadata.get("tool_iterations", 0)
+            if tool_calls and self.config.planning_mode != PlanningMode.REACT and iterations < self.config.max_iterations:
+                state.metadata["tool_iterations"] = iterations + 1
+                state.tool_calls.extend(tool_calls)
+                return state
+            
+            state.final_response = content
             
             # 保存交互到记忆
             if self.config.memory_enabled:
                 await self.memory_bank.add_interaction(
-                    session_id=f"{self.config.tenant_id}_session",
-                    user_id=self.config.tenant_id,
+                    session_id=f"{state.tenant_id}_session",
+                    user_id=state.tenant_id,
                     human_message=state.input,
-                    ai_message=response.content
+                    ai_message=state.final_response
                 )
             
             return state
@@ -282,9 +461,38 @@ class AgentExecutor:
             raise AgentException(
                 error_code=ErrorCode.AGENT_EXECUTION_ERROR,
                 message=f"响应生成失败: {str(e)}",
-                tenant_id=self.config.tenant_id
+                tenant_id=state.tenant_id
             )
     
+    async def _stream_response(self, state: AgentState, messages: List[Dict[str, str]]) -> tuple:
+        """流式生成最终响应，逐块写入事件队列，返回完整文本和工具调用"""
+        content = ""
+        tool_calls: List[Dict[str, Any]] = []
+        async for chunk in self.llm_manager.stream_chat(
+            tenant_id=state.tenant_id,
+            model_name=self.config.model_name,
+            messages=messages,
+            temperature=self.config.temperature,
+            max_tokens=self.config.max_tokens
+        ):
+            content = chunk.content
+            if chunk.delta:
+                await self._emit(state, {"type": "token", "content": chunk.delta})
+            if chunk.finished:
+                tool_calls = chunk.tool_calls or []
+                await self._emit(state, {"type": "usage", "usage": chunk.usage})
+        return content, tool_calls
+    
+    @staticmethod
+    async def _emit(state: AgentState, event: Dict[str, Any]):
+        """向流式事件队列写入事件 (非流式执行时忽略)"""
+        if state.event_queue is not None:
+            await state.event_queue.put(event)
+    
+    def _route_after_response(self, state: AgentState) -> str:
+        """生成后路由 - 模型请求了工具则执行工具，否则结束"""
+        return "tool" if state.tool_calls else "end"
+    
     def _route_decision(self, state: AgentState) -> str:
         """路由决策 - 决定下一个节点"""
         # 简化的路由逻辑
@@ -333,8 +541,16 @@ class AgentExecutor:
         return messages
     
     def _build_response_prompt(self, state: AgentState) -> List[Dict[str, str]]:
-        """构建响应提示"""
-        return self._build_think_prompt(state)
+        """构建响应提示 (思考提示 + 工具执行结果)"""
+        messages = self._build_think_prompt(state)
+        tool_results = state.context.get("tool_results")
+        if tool_results:
+            results_text = "\n".join(f"- {item['tool']}: {item['result']}" for item in tool_results)
+            messages.insert(-1, {
+                "role": "system",
+                "content": f"工具执行结果: {results_text}"
+            })
+        return messages
     
     def _get_default_system_prompt(self) -> str:
         """获取默认系统提示"""
@@ -365,39 +581,126 @@ class AgentExecutor:
         
         return "\n".join(formatted)
     
-    async def execute(self, user_input: str, context: Dict[str, Any] = None) -> str:
-        """执行智能体"""
+    def _cache_scope(self, tenant_id: Optional[str] = None):
+        """响应缓存分区: 租户、智能体类型、模型"""
+        agent_type = getattr(self.config.agent_type, "value", self.config.agent_type)
+        return tenant_id or self.config.tenant_id, agent_type, self.config.model_name
+    
+    async def get_cached_response(self, query: str, tenant_id: Optional[str] = None) -> Optional[str]:
+        """查找语义缓存中的回答"""
+        return await response_cache.get(*self._cache_scope(tenant_id), query)
+    
+    async def cache_response(self, query: str, response: str, tenant_id: Optional[str] = None):
+        """写入语义缓存"""
+        await response_cache.set(*self._cache_scope(tenant_id), query, response)
+    
+    async def execute(
+        self,
+        user_input: str,
+        context: Dict[str, Any] = None,
+        cache_query: Optional[str] = None,
+        tenant_id: Optional[str] = None
+    ) -> str:
+        """
+        执行智能体
+        
+        Args:
+            user_input: 输入 (可能已拼接历史上下文)
+            context: 额外上下文
+            cache_query: 用于语义缓存的原始问题；为空时不使用缓存
+            tenant_id: 本次请求的租户，默认使用配置中的租户 (执行器在租户间共享)
+        """
+        tenant_id = tenant_id or self.config.tenant_id
         try:
-            # 初始化状态
+            if cache_query:
+                cached = await self.get_cached_response(cache_query, tenant_id)
+                if cached is not None:
+                    return cached
+            
+            # 初始化状态 (请求级数据都放在图输入中，执行器本身无状态)
             initial_state = AgentState(
                 input=user_input,
                 messages=[],
                 context=context or {},
-                tool_calls=[]
+                tool_calls=[],
+                tenant_id=tenant_id
             )
             
             # 执行状态图
             final_state = await self.graph.ainvoke(initial_state)
             
             # LangGraph 返回的是字典，需要正确访问 final_response
-            return final_state.get("final_response", "抱歉，我无法处理您的请求。")
+            response = final_state.get("final_response", "抱歉，我无法处理您的请求。")
+            if cache_query and response:
+                await self.cache_response(cache_query, response, tenant_id)
+            return response
             
         except Exception as e:
             raise AgentException(
                 error_code=ErrorCode.AGENT_EXECUTION_ERROR,
                 message=f"智能体执行失败: {str(e)}",
-                tenant_id=self.config.tenant_id
+                tenant_id=tenant_id
             )
+    
+    async def stream(
+        self,
+        user_input: str,
+        context: Dict[str, Any] = None,
+        tenant_id: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        流式执行智能体
+        
+        依次产出事件字典: tool_call / tool_result (工具调用)、token (响应增量)、
+        usage (token 用量)，最后是包含完整回答的 final_answer；执行失败时产出 error
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        initial_state = AgentState(
+            input=user_input,
+            messages=[],
+            context=context or {},
+            tool_calls=[],
+            tenant_id=tenant_id or self.config.tenant_id,
+            event_queue=queue
+        )
+        
+        async def run_graph():
+            try:
+                final_state = await self.graph.ainvoke(initial_state)
+                await queue.put({
+                    "type": "final_answer",
+                    "content": final_state.get("final_response", "抱歉，我无法处理您的请求。")
+                })
+            except Exception as e:
+                self.logger.error(f"智能体流式执行失败: {e}")
+                await queue.put({"type": "error", "content": f"智能体执行失败: {str(e)}"})
+            finally:
+                await queue.put(None)
+        
+        task = asyncio.create_task(run_graph())
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            # 客户端断开时停止图执行，避免继续消耗 token
+            if not task.done():
+                task.cancel()
 
 
 class AgentFactory:
     """智能体工厂"""
     
-    def __init__(self, llm_manager, memory_bank, rag_manager):
+    def __init__(self, llm_manager, memory_bank, rag_manager, max_executors: int = DEFAULT_MAX_EXECUTORS):
         self.llm_manager = llm_manager
         self.memory_bank = memory_bank
         self.rag_manager = rag_manager
         self.tool_registry = ToolRegistry()
+        # 按配置 (不含租户) 缓存执行器及其编译好的状态图，LRU 淘汰
+        self.max_executors = max_executors
+        self._executors: "OrderedDict[str, AgentExecutor]" = OrderedDict()
         self.logger = logging.getLogger(__name__)
         
         # 注册默认工具
@@ -420,8 +723,33 @@ class AgentFactory:
         self.tool_registry.register_tool("database_search", database_search)
         self.tool_registry.register_tool("web_search", web_search)
     
+    @staticmethod
+    def _executor_key(agent_config) -> str:
+        """执行器缓存键: 除租户外的全部配置 (智能体类型、工具集、开关等)"""
+        fields = {
+            name: value for name, value in dataclasses.asdict(agent_config).items()
+            if name != "tenant_id"
+        }
+        return json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    
     def get_agent_executor(self, agent_config: AgentConfig) -> AgentExecutor:
-        """获取智能体执行器"""
+        """
+        获取智能体执行器
+        
+        相同配置 (不含租户) 共享同一个执行器和编译好的状态图；
+        租户等请求级数据在 execute / stream 时通过图输入传入
+        """
+        key = self._executor_key(agent_config)
+        executor = self._executors.get(key)
+        if (
+            executor is not None
+            and executor.llm_manager is self.llm_manager
+            and executor.memory_bank is self.memory_bank
+            and executor.rag_manager is self.rag_manager
+        ):
+            self._executors.move_to_end(key)
+            return executor
+        
         try:
             executor = AgentExecutor(
                 agent_config=agent_config,
@@ -431,6 +759,10 @@ class AgentFactory:
                 tool_registry=self.tool_registry
             )
             
+            self._executors[key] = executor
+            while len(self._executors) > self.max_executors:
+                self._executors.popitem(last=False)
+            
             self.logger.info(f"创建智能体执行器: {agent_config.agent_type}")
             return executor
             
@@ -0,0 +1,201 @@
+"""
+语义响应缓存 - 智能体对话的可选缓存层
+按 (租户, 智能体类型, 模型) 分区；先按规范化提示词精确匹配，
+未命中时用查询嵌入做最近邻匹配，相似度超过阈值即复用已有回答；每条缓存有独立 TTL，
+条目总数有全局上限，超出时从最久未访问的分区中淘汰最旧的条目
+"""
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ...core_infrastructure.utils.helpers import generate_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600  # 1小时
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+DEFAULT_MAX_ENTRIES_PER_SCOPE = 1000
+DEFAULT_MAX_ENTRIES = 20000
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+_TRAILING_PUNCTUATION = re.compile(r'[\s?？!！。.,，~～]+$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(text: str) -> str:
+    """规范化提示词: 全半角统一、小写、合并空白、去掉结尾标点"""
+    text = unicodedata.normalize('NFKC', text).lower().strip()
+    text = _WHITESPACE.sub(' ', text)
+    return _TRAILING_PUNCTUATION.sub('', text)
+
+
+@dataclass
+class CachedResponse:
+    """缓存条目"""
+    prompt: str
+    response: str
+    embedding: Optional[np.ndarray]
+    expires_at: float
+    hits: int = 0
+
+
+class SemanticResponseCache:
+    """智能体响应语义缓存"""
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        max_entries_per_scope: int = DEFAULT_MAX_ENTRIES_PER_SCOPE,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        embedding_manager=None
+    ):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_entries_per_scope = max_entries_per_scope
+        self.max_entries = max_entries
+        self.embedding_manager = embedding_manager
+        # 分区按最近访问排序，只在写入时创建，清空后删除
+        self._scopes: "OrderedDict[Tuple[str, str, str], OrderedDict[str, CachedResponse]]" = OrderedDict()
+        self._entries = 0
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    async def _embed(self, tenant_id: str, text: str) -> Optional[np.ndarray]:
+        if self.embedding_manager is None:
+            return None
+        try:
+            embedding = (await self.embedding_manager.embed_texts(
+                tenant_id=tenant_id, model_name=EMBEDDING_MODEL, texts=[text]
+            ))[0]
+        except Exception as e:
+            logger.warning(f"响应缓存嵌入失败，仅使用精确匹配: {e}")
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    @staticmethod
+    def _scope_key(tenant_id: str, agent_type: str, model_name: str) -> Tuple[str, str, str]:
+        return (tenant_id, str(agent_type), model_name)
+
+    def _purge_expired(self, scope_key: Tuple[str, str, str], now: float):
+        """删除分区内的过期条目，分区清空后一并删除"""
+        scope = self._scopes[scope_key]
+        for key in [key for key, entry in scope.items() if entry.expires_at <= now]:
+            del scope[key]
+            self._entries -= 1
+            self.stats["evictions"] += 1
+        if not scope:
+            del self._scopes[scope_key]
+
+    def _evict_lru(self):
+        """条目总数超过全局上限时，从最久未访问的分区淘汰最旧的条目"""
+        while self._entries > self.max_entries and self._scopes:
+            scope_key, scope = next(iter(self._scopes.items()))
+            scope.popitem(last=False)
+            self._entries -= 1
+            self.stats["evictions"] += 1
+            if not scope:
+                del self._scopes[scope_key]
+
+    async def get(self, tenant_id: str, agent_type: str, model_name: str, prompt: str) -> Optional[str]:
+        """查找缓存回答，未命中返回 None (不会为未写入过的分区创建条目)"""
+        normalized = normalize_prompt(prompt)
+        scope_key = self._scope_key(tenant_id, agent_type, model_name)
+        if scope_key in self._scopes:
+            self._purge_expired(scope_key, time.time())
+        scope = self._scopes.get(scope_key)
+        if scope is None:
+            self.stats["misses"] += 1
+            return None
+        self._scopes.move_to_end(scope_key)
+
+        key = generate_hash(normalized)
+        entry = scope.get(key)
+        if entry is not None:
+            scope.move_to_end(key)
+            entry.hits += 1
+            self.stats["exact_hits"] += 1
+            return entry.response
+
+        candidates = [(key, entry) for key, entry in scope.items() if entry.embedding is not None]
+        if candidates:
+            query = await self._embed(tenant_id, normalized)
+            if query is not None:
+                matrix = np.stack([entry.embedding for _, entry in candidates])
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    best_key, best_entry = candidates[best]
+                    # 嵌入期间条目可能已被其他请求淘汰
+                    if best_key in scope:
+                        scope.move_to_end(best_key)
+                    best_entry.hits += 1
+                    self.stats["semantic_hits"] += 1
+                    return best_entry.response
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(
+        self,
+        tenant_id: str,
+        agent_type: str,
+        model_name: str,
+        prompt: str,
+        response: str,
+        ttl: Optional[float] = None
+    ):
+        """写入缓存回答"""
+        if not response:
+            return
+        normalized = normalize_prompt(prompt)
+        embedding = await self._embed(tenant_id, normalized)
+        scope_key = self._scope_key(tenant_id, agent_type, model_name)
+        scope = self._scopes.get(scope_key)
+        if scope is None:
+            scope = self._scopes[scope_key] = OrderedDict()
+        self._scopes.move_to_end(scope_key)
+
+        key = generate_hash(normalized)
+        if key in scope:
+            scope.move_to_end(key)
+        else:
+            self._entries += 1
+        scope[key] = CachedResponse(
+            prompt=normalized,
+            response=response,
+            embedding=embedding,
+            expires_at=time.time() + (ttl if ttl is not None else self.ttl)
+        )
+        self.stats["stores"] += 1
+        while len(scope) > self.max_entries_per_scope:
+            scope.popitem(last=False)
+            self._entries -= 1
+            self.stats["evictions"] += 1
+        self._evict_lru()
+
+    def invalidate(self, tenant_id: Optional[str] = None):
+        """清空某个租户 (或全部) 的缓存"""
+        for key in [key for key in self._scopes if tenant_id is None or key[0] == tenant_id]:
+            self._entries -= len(self._scopes.pop(key))
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return {
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": self._entries,
+            "scopes": len(self._scopes)
+        }
+
+
+# 全局响应缓存实例 (嵌入管理器在初始化时设置)
+response_cache = SemanticResponseCache()
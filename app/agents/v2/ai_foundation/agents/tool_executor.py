@@ -0,0 +1,146 @@
+"""
+工具执行器 - 并发执行智能体的工具调用
+互不依赖的工具调用并发执行；同步工具放入有界线程池，避免阻塞事件循环；
+每个工具有独立超时，超时即取消；结果按 (工具, 参数) 缓存一段时间
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_TIMEOUT = 10.0
+DEFAULT_CACHE_TTL = 300  # 5分钟
+DEFAULT_CACHE_MAX_ENTRIES = 512
+DEFAULT_MAX_WORKERS = 8
+
+
+@dataclass
+class ToolCall:
+    """一次待执行的工具调用"""
+    name: str
+    func: Callable
+    args: Dict[str, Any]
+    timeout: Optional[float] = None
+    cache_ttl: Optional[float] = None
+
+
+@dataclass
+class ToolResult:
+    """工具执行结果；失败或超时时 error 不为空"""
+    tool: str
+    args: Dict[str, Any]
+    result: Any
+    error: Optional[str] = None
+    cached: bool = False
+    latency: float = 0.0
+
+
+def tool_cache_key(name: str, args: Dict[str, Any]) -> str:
+    return f"{name}:{json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)}"
+
+
+class ToolExecutor:
+    """工具执行器"""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        default_timeout: float = DEFAULT_TOOL_TIMEOUT,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+        cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES
+    ):
+        self.default_timeout = default_timeout
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"calls": 0, "cache_hits": 0, "timeouts": 0, "errors": 0}
+
+    async def run_in_pool(self, func: Callable, *args, **kwargs) -> Any:
+        """在有界线程池中执行同步函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(func, *args, **kwargs))
+
+    async def _invoke(self, func: Callable, args: Dict[str, Any]) -> Any:
+        # LangChain 工具 (@tool) 通过 ainvoke 调用，同步工具由其自身放入线程执行
+        if hasattr(func, "ainvoke"):
+            return await func.ainvoke(args)
+        if inspect.iscoroutinefunction(func):
+            return await func(**args)
+        result = await self.run_in_pool(func, **args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def _get_cached(self, key: str) -> Optional[Any]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.time():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return result
+
+    def _set_cached(self, key: str, result: Any, ttl: float):
+        self._cache[key] = (time.time() + ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    async def run(self, call: ToolCall) -> ToolResult:
+        """执行单个工具调用，超时或异常时返回带 error 的结果而不是抛出"""
+        self.stats["calls"] += 1
+        cache_ttl = self.cache_ttl if call.cache_ttl is None else call.cache_ttl
+        key = tool_cache_key(call.name, call.args)
+        if cache_ttl > 0:
+            cached = self._get_cached(key)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return ToolResult(tool=call.name, args=call.args, result=cached, cached=True)
+
+        timeout = call.timeout or self.default_timeout
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._invoke(call.func, call.args), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning(f"工具 {call.name} 执行超时 ({timeout}s)")
+            return ToolResult(
+                tool=call.name, args=call.args, result=None,
+                error=f"工具执行超时 ({timeout}s)", latency=time.monotonic() - start
+            )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"工具 {call.name} 执行失败: {e}")
+            return ToolResult(
+                tool=call.name, args=call.args, result=None,
+                error=f"工具执行失败: {str(e)}", latency=time.monotonic() - start
+            )
+
+        if cache_ttl > 0 and result is not None:
+            self._set_cached(key, result, cache_ttl)
+        return ToolResult(tool=call.name, args=call.args, result=result, latency=time.monotonic() - start)
+
+    async def run_many(self, calls: List[ToolCall]) -> List[ToolResult]:
+        """并发执行多个工具调用，结果与输入同序；本轮耗时取决于最慢的工具"""
+        return list(await asyncio.gather(*(self.run(call) for call in calls)))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "cache_entries": len(self._cache)}
+
+
+# 全局工具执行器实例
+tool_executor = ToolExecutor()
@@ -0,0 +1,178 @@
+"""
+补全缓存 - LLM 聊天结果的精确匹配缓存
+以 (模型, 消息, 温度, max_tokens, 工具等调用参数) 的规范化 sha256 为键；
+进程内 LRU 按条数和字节数双重限制，可选 Redis 二级缓存，相同请求并发时只调用一次提供商
+"""
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .providers.base_provider import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+DEFAULT_TTL = 600  # 10分钟
+
+
+def completion_key(model: str, messages: List[Dict[str, Any]], **params) -> str:
+    """缓存键: 模型名 + 消息与调用参数的规范化 JSON 的 sha256"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return f"{model}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def encode_response(response: LLMResponse) -> bytes:
+    return json.dumps(dataclasses.asdict(response), ensure_ascii=False).encode("utf-8")
+
+
+def decode_response(data: bytes) -> LLMResponse:
+    return LLMResponse(**json.loads(data))
+
+
+class RedisCompletionStore:
+    """Redis 二级缓存，多实例共享"""
+
+    def __init__(self, redis_client, prefix: str = "completion:"):
+        self.redis_client = redis_client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis_client.get(self.prefix + key)
+
+    async def set(self, key: str, data: bytes, ttl: int):
+        await self.redis_client.setex(self.prefix + key, ttl, data)
+
+
+class CompletionCache:
+    """LLM 补全缓存"""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: int = DEFAULT_TTL,
+        store=None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.store = store
+        # key -> (过期时间, 序列化响应)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "store_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def _remove(self, key: str):
+        _, data = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def _put_local(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time() + self.ttl, data)
+        self._bytes += len(data)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    async def _lookup(self, key: str) -> Optional[bytes]:
+        data = self._get_local(key)
+        if data is not None:
+            self.stats["hits"] += 1
+            return data
+        if self.store is None:
+            return None
+        try:
+            data = await self.store.get(key)
+        except Exception as e:
+            logger.warning(f"补全二级缓存读取失败: {e}")
+            return None
+        if data is not None:
+            self.stats["store_hits"] += 1
+            self._put_local(key, data)
+        return data
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[LLMResponse]]
+    ) -> LLMResponse:
+        """
+        获取缓存的补全结果，未命中时调用 compute；相同键的并发调用等待同一次计算
+
+        每次返回新的 LLMResponse 副本，调用方修改结果不会影响缓存
+        """
+        data = await self._lookup(key)
+        if data is not None:
+            return decode_response(data)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return decode_response(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 发起方被取消，由等待方自行重新计算
+                return await self.get_or_compute(key, compute)
+
+        self.stats["misses"] += 1
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await compute()
+        except BaseException as e:
+            self._inflight.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # 避免无人等待时出现 "exception was never retrieved"
+                future.exception()
+            raise
+
+        data = encode_response(response)
+        self._inflight.pop(key, None)
+        future.set_result(data)
+        # 空响应多为提供商降级结果，不缓存
+        if response.content or response.tool_calls:
+            self._put_local(key, data)
+            if self.store is not None:
+                try:
+                    await self.store.set(key, data, self.ttl)
+                except Exception as e:
+                    logger.warning(f"补全二级缓存写入失败: {e}")
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries), "bytes": self._bytes}
@@ -0,0 +1,117 @@
+"""
+嵌入微批处理 - 合并并发调用方的嵌入请求
+在几毫秒的窗口内收集各调用方的文本 (或达到批大小/token 预算时立即发送)，
+合并为一次提供商请求，再把结果按调用方切片返回；某一调用方的输入导致失败时不影响其他调用方
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_BATCH_TOKENS = 8000
+DEFAULT_MAX_WAIT = 0.005  # 5毫秒
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数: 中文约每字 1 个 token (UTF-8 三字节)，英文约每 3~4 个字符 1 个"""
+    return len(text.encode('utf-8')) // 3 + 1
+
+
+class EmbeddingBatcher:
+    """单个嵌入模型的微批处理器"""
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        max_wait: float = DEFAULT_MAX_WAIT
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait
+        self._pending: List[Tuple[List[str], int, asyncio.Future]] = []
+        self._pending_size = 0
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"requests": 0, "batches": 0, "texts": 0}
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """提交文本并等待本调用方的嵌入结果"""
+        if not texts:
+            return []
+        self.stats["requests"] += 1
+
+        # 大批量 (如文档摄取) 自身已足够大，直接分块发送
+        if len(texts) >= self.max_batch_size:
+            embeddings: List[List[float]] = []
+            for start in range(0, len(texts), self.max_batch_size):
+                batch = texts[start:start + self.max_batch_size]
+                self.stats["batches"] += 1
+                self.stats["texts"] += len(batch)
+                embeddings.extend(await self.embed_fn(batch))
+            return embeddings
+
+        tokens = sum(estimate_tokens(text) for text in texts)
+        if self._pending and (
+            self._pending_size + len(texts) > self.max_batch_size
+            or self._pending_tokens + tokens > self.max_batch_tokens
+        ):
+            self._flush()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((list(texts), tokens, future))
+        self._pending_size += len(texts)
+        self._pending_tokens += tokens
+
+        if self._pending_size >= self.max_batch_size or self._pending_tokens >= self.max_batch_tokens:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """发送当前收集的批次"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._pending_size = self._pending_tokens = 0
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[List[str], int, asyncio.Future]]):
+        texts = [text for caller_texts, _, _ in batch for text in caller_texts]
+        self.stats["batches"] += 1
+        self.stats["texts"] += len(texts)
+        try:
+            embeddings = await self.embed_fn(texts)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"嵌入数量不匹配: 期望 {len(texts)}，实际 {len(embeddings)}")
+        except Exception as e:
+            if len(batch) == 1:
+                self._set_exception(batch[0][2], e)
+                return
+            # 合并请求失败时逐个调用方重试，隔离有问题的输入
+            logger.warning(f"批量嵌入失败，按调用方拆分重试: {e}")
+            await asyncio.gather(*(self._send([item]) for item in batch))
+            return
+
+        offset = 0
+        for caller_texts, _, future in batch:
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(caller_texts)])
+            offset += len(caller_texts)
+
+    @staticmethod
+    def _set_exception(future: asyncio.Future, error: Exception):
+        if not future.done():
+            future.set_exception(error)
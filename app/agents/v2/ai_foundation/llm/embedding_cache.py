@@ -0,0 +1,226 @@
+"""
+嵌入缓存 - 以 (模型, 文本 sha256) 为键的两级嵌入向量缓存
+一级为进程内 LRU，二级为可选的 SQLite 文件或 Redis；向量以 float16 字节存储，
+相同文本的并发请求合并为一次提供商调用
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_REDIS_TTL = 30 * 24 * 3600  # 30天
+
+
+def embedding_key(model: str, text: str) -> str:
+    """缓存键: 模型名 + 文本 sha256"""
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def encode_vector(vector: Sequence[float]) -> bytes:
+    return np.asarray(vector, dtype=np.float16).tobytes()
+
+
+def decode_vector(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype=np.float16).astype(np.float32).tolist()
+
+
+class SQLiteEmbeddingStore:
+    """SQLite 文件二级缓存，适合单机部署"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+        return self._conn
+
+    def _get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            conn = self._connection()
+            found: Dict[str, bytes] = {}
+            # SQLite 单条语句参数个数有限，分批查询
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, vector in conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = vector
+            return [found.get(key) for key in keys]
+
+    def _set_many(self, items: Dict[str, bytes]):
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", items.items())
+            conn.commit()
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def set_many(self, items: Dict[str, bytes]):
+        await asyncio.to_thread(self._set_many, items)
+
+
+class RedisEmbeddingStore:
+    """Redis 二级缓存，多实例共享"""
+
+    def __init__(self, redis_client, ttl: int = DEFAULT_REDIS_TTL, prefix: str = "embedding:"):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await self.redis_client.mget([self.prefix + key for key in keys])
+
+    async def set_many(self, items: Dict[str, bytes]):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key, vector in items.items():
+            pipe.setex(self.prefix + key, self.ttl, vector)
+        await pipe.execute()
+
+
+class EmbeddingCache:
+    """两级嵌入缓存"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "store_hits": 0, "misses": 0, "coalesced": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def _put_local(self, key: str, data: bytes):
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_compute(
+        self,
+        model: str,
+        texts: List[str],
+        compute: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
+        """
+        获取文本嵌入，未命中的文本去重后调用 compute 一次计算
+
+        Args:
+            model: 嵌入模型名
+            texts: 文本列表
+            compute: 提供商调用，输入未命中的文本，返回同序嵌入
+        """
+        keys = [embedding_key(model, text) for text in texts]
+        results: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in results or key in missing:
+                continue
+            data = self._get_local(key)
+            if data is not None:
+                self.stats["hits"] += 1
+                results[key] = decode_vector(data)
+            else:
+                missing[key] = text
+
+        # 二级缓存
+        if missing and self.store is not None:
+            missing_keys = list(missing)
+            try:
+                stored = await self.store.get_many(missing_keys)
+            except Exception as e:
+                logger.warning(f"嵌入二级缓存读取失败: {e}")
+                stored = [None] * len(missing_keys)
+            for key, data in zip(missing_keys, stored):
+                if data is not None:
+                    self.stats["store_hits"] += 1
+                    self._put_local(key, data)
+                    results[key] = decode_vector(data)
+                    del missing[key]
+
+        # 合并进行中的相同请求
+        waiting: Dict[str, asyncio.Future] = {}
+        owned: Dict[str, asyncio.Future] = {}
+        loop = asyncio.get_running_loop()
+        for key in missing:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                waiting[key] = future
+            else:
+                owned[key] = self._inflight[key] = loop.create_future()
+
+        if owned:
+            self.stats["misses"] += len(owned)
+            owned_keys = list(owned)
+            try:
+                vectors = await compute([missing[key] for key in owned_keys])
+                if len(vectors) != len(owned_keys):
+                    raise ValueError(f"嵌入数量不匹配: 期望 {len(owned_keys)}，实际 {len(vectors)}")
+            except BaseException as e:
+                for key, future in owned.items():
+                    self._inflight.pop(key, None)
+                    if isinstance(e, asyncio.CancelledError):
+                        # 发起方被取消时由等待方自行重算
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+                        # 避免无人等待时出现 "exception was never retrieved"
+                        future.exception()
+                raise
+
+            to_store: Dict[str, bytes] = {}
+            for key, vector in zip(owned_keys, vectors):
+                self._inflight.pop(key, None)
+                owned[key].set_result(vector)
+                results[key] = vector
+                # 提供商出错时返回的零向量不缓存
+                if any(vector):
+                    data = encode_vector(vector)
+                    self._put_local(key, data)
+                    to_store[key] = data
+            if to_store and self.store is not None:
+                try:
+                    await self.store.set_many(to_store)
+                except Exception as e:
+                    logger.warning(f"嵌入二级缓存写入失败: {e}")
+
+        for key, future in waiting.items():
+            try:
+                results[key] = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                results[key] = (await self.get_or_compute(model, [missing[key]], compute))[0]
+
+        return [results[key] for key in keys]
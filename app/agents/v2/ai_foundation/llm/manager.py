@@ -3,14 +3,21 @@ LLM管理器 - 大语言模型统一入口
 提供模型调用、负载均衡、故障转移等功能
 """
 import asyncio
-from typing import Dict, List, Optional, AsyncGenerator, Any
-from dataclasses import dataclass
+import dataclasses
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, AsyncGenerator, AsyncIterator, Any
+from dataclasses import dataclass, field
 from enum import Enum
 import time
 import logging
 
 from ...core_infrastructure.error.exceptions import LLMException, ErrorCode
 from .providers.base_provider import LLMResponse
+from .embedding_batcher import EmbeddingBatcher, estimate_tokens
+from .embedding_cache import EmbeddingCache
+from .completion_cache import CompletionCache, completion_key
+from .rate_limiter import RateLimiter, RateLimitTimeout
+from .router import Deployment, ModelRouter
 
 
 class ModelProvider(str, Enum):
@@ -19,15 +26,29 @@ class ModelProvider(str, Enum):
     OLLAMA = "ollama"
     ANTHROPIC = "anthropic"
     ZHIPU = "zhipu"
+    MOCK = "mock"
 
 
 @dataclass
 class StreamChunk:
     """流式响应数据块"""
-    content: str
-    delta: str
+    content: str  # 截至当前的完整文本
+    delta: str    # 本次新增的文本
     finished: bool = False
     usage: Optional[Dict[str, int]] = None
+    tool_calls: Optional[List[Dict]] = None
+
+
+@dataclass
+class DeploymentConfig:
+    """逻辑模型的一个部署 (不同区域/账号/提供商)"""
+    name: str
+    provider: ModelProvider
+    api_key: str
+    model: Optional[str] = None  # 上游模型名，默认与逻辑模型同名
+    base_url: Optional[str] = None
+    weight: float = 1.0
+    options: Dict[str, Any] = field(default_factory=dict)
 
 
 @dataclass
@@ -41,7 +62,11 @@ class ModelConfig:
     temperature: float = 0.7
     timeout: int = 30
     rate_limit: int = 60  # requests per minute
+    tokens_per_minute: Optional[int] = None
+    max_concurrency: int = 16
     enabled: bool = True
+    # 配置多个部署时由路由器按延迟/错误率选择，并支持对冲请求和故障转移
+    deployments: List[DeploymentConfig] = field(default_factory=list)
 
 
 class LLMManager:
@@ -51,6 +76,9 @@ class LLMManager:
         self.models: Dict[str, ModelConfig] = {}
         self.providers: Dict[ModelProvider, Any] = {}
         self.usage_stats: Dict[str, Dict] = {}
+        self.rate_limiter = RateLimiter()
+        # 补全缓存: 温度为 0 或调用方传入 cache=True 时，相同请求直接复用结果
+        self.completion_cache = CompletionCache()
         self.logger = logging.getLogger(__name__)
         
     async def initialize(self, model_configs: List[ModelConfig]):
@@ -59,6 +87,12 @@ class LLMManager:
             for config in model_configs:
                 self.models[config.name] = config
                 await self._initialize_provider(config)
+                self.rate_limiter.configure(
+                    config.name,
+                    requests_per_minute=config.rate_limit,
+                    tokens_per_minute=config.tokens_per_minute,
+                    max_concurrency=config.max_concurrency
+                )
             
             self.logger.info(f"已初始化 {len(self.models)} 个模型")
             
@@ -70,13 +104,43 @@ class LLMManager:
     
     async def _initialize_provider(self, config: ModelConfig):
         """初始化具体的提供商"""
-        if config.provider == ModelProvider.OPENAI:
+        if config.deployments:
+            self.providers[config.name] = ModelRouter([
+                Deployment(
+                    name=deployment.name,
+                    provider=self._create_provider(
+                        deployment.provider, deployment.api_key, deployment.base_url, **deployment.options
+                    ),
+                    model=deployment.model or config.name,
+                    weight=deployment.weight
+                )
+                for deployment in config.deployments
+            ])
+            return
+        
+        provider = self._create_provider(config.provider, config.api_key, config.base_url)
+        if provider is not None:
+            self.providers[config.name] = provider
+    
+    def _create_provider(
+        self,
+        provider: ModelProvider,
+        api_key: str,
+        base_url: Optional[str] = None,
+        **options
+    ):
+        """创建提供商实例"""
+        if provider == ModelProvider.OPENAI:
             from .providers.openai_provider import OpenAIProvider
-            self.providers[config.name] = OpenAIProvider(config.api_key)
-        elif config.provider == ModelProvider.OLLAMA:
+            return OpenAIProvider(api_key, base_url=base_url, **options)
+        elif provider == ModelProvider.OLLAMA:
             from .providers.ollama_provider import OllamaProvider
-            self.providers[config.name] = OllamaProvider(config.api_key)
+            return OllamaProvider(api_key)
+        elif provider == ModelProvider.MOCK:
+            from .providers.mock_provider import MockProvider
+            return MockProvider(api_key, **options)
         # 可以继续添加其他提供商
+        return None
         
     async def chat(
         self, 
@@ -85,8 +149,14 @@ class LLMManager:
         messages: List[Dict[str, str]], 
         **kwargs
     ) -> LLMResponse:
-        """聊天接口"""
+        """
+        聊天接口
+        
+        kwargs 中的 cache 控制补全缓存: 默认仅在 temperature 为 0 时缓存，
+        cache=True 时总是缓存，cache=False 时不缓存
+        """
         start_time = time.time()
+        use_cache = kwargs.pop("cache", None)
         
         try:
             # 检查模型是否存在
@@ -97,26 +167,16 @@ class LLMManager:
                     tenant_id=tenant_id
                 )
             
-            # 检查速率限制
-            await self._check_rate_limit(tenant_id, model_name)
-            
-            # 获取提供商并调用
-            provider = self.providers[model_name]
-            response = await provider.chat(messages, model=model_name, **kwargs)
+            if use_cache is None:
+                use_cache = kwargs.get("temperature", self.models[model_name].temperature) == 0
+            if not use_cache:
+                return await self._chat(tenant_id, model_name, messages, kwargs, start_time)
             
-            # 记录使用统计
-            latency = time.time() - start_time
-            await self._record_usage(tenant_id, model_name, response.usage, latency)
-            
-            return LLMResponse(
-                content=response.content,
-                model=model_name,
-                usage=response.usage,
-                finish_reason=response.finish_reason,
-                response_time=latency,
-                has_tool_call=response.has_tool_call,
-                tool_calls=response.tool_calls
+            key = completion_key(model_name, messages, **kwargs)
+            response = await self.completion_cache.get_or_compute(
+                key, lambda: self._chat(tenant_id, model_name, messages, kwargs, start_time)
             )
+            return dataclasses.replace(response, response_time=time.time() - start_time)
             
         except LLMException:
             raise
@@ -127,6 +187,39 @@ class LLMManager:
                 tenant_id=tenant_id
             )
     
+    async def _chat(
+        self,
+        tenant_id: str,
+        model_name: str,
+        messages: List[Dict[str, str]],
+        kwargs: Dict[str, Any],
+        start_time: float
+    ) -> LLMResponse:
+        """调用提供商 (经过速率限制) 并记录使用统计"""
+        # 速率限制: 额度不足时排队等待，超过截止时间才失败
+        estimated_tokens = self._estimate_tokens(messages, kwargs)
+        async with self._check_rate_limit(tenant_id, model_name, estimated_tokens):
+            # 获取提供商并调用
+            provider = self.providers[model_name]
+            response = await provider.chat(messages, model=model_name, **kwargs)
+        self.rate_limiter.record_tokens(
+            model_name, response.usage.get("total_tokens", estimated_tokens), estimated_tokens, tenant_id
+        )
+        
+        # 记录使用统计
+        latency = time.time() - start_time
+        await self._record_usage(tenant_id, model_name, response.usage, latency)
+        
+        return LLMResponse(
+            content=response.content,
+            model=model_name,
+            usage=response.usage,
+            finish_reason=response.finish_reason,
+            response_time=latency,
+            has_tool_call=response.has_tool_call,
+            tool_calls=response.tool_calls
+        )
+    
     async def stream_chat(
         self, 
         tenant_id: str, 
@@ -134,7 +227,13 @@ class LLMManager:
         messages: List[Dict[str, str]], 
         **kwargs
     ) -> AsyncGenerator[StreamChunk, None]:
-        """流式聊天接口"""
+        """
+        流式聊天接口
+        
+        逐块返回提供商输出的增量文本；结束时总会返回一个 finished 数据块，
+        其中带有 token 用量 (提供商未返回用量时按字符数估算) 和完整的工具调用
+        """
+        start_time = time.time()
         try:
             if model_name not in self.models:
                 raise LLMException(
@@ -143,16 +242,32 @@ class LLMManager:
                     tenant_id=tenant_id
                 )
             
-            await self._check_rate_limit(tenant_id, model_name)
+            estimated_tokens = self._estimate_tokens(messages, kwargs)
+            content = ""
+            usage: Optional[Dict[str, int]] = None
+            tool_calls: Optional[List[Dict]] = None
+            async with self._check_rate_limit(tenant_id, model_name, estimated_tokens):
+                provider = self.providers[model_name]
+                async for chunk in provider.stream_chat(messages, model=model_name, **kwargs):
+                    usage = chunk.usage or usage
+                    tool_calls = chunk.tool_calls or tool_calls
+                    if chunk.content:
+                        content += chunk.content
+                        yield StreamChunk(content=content, delta=chunk.content)
             
-            provider = self.providers[model_name]
-            async for chunk in provider.stream_chat(messages, model=model_name, **kwargs):
-                yield StreamChunk(
-                    content=chunk.content,
-                    delta=chunk.delta,
-                    finished=chunk.finished,
-                    usage=chunk.usage
-                )
+            if usage is None:
+                prompt_tokens = estimated_tokens - int(kwargs.get("max_tokens") or 0)
+                completion_tokens = estimate_tokens(content)
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            self.rate_limiter.record_tokens(
+                model_name, usage.get("total_tokens", estimated_tokens), estimated_tokens, tenant_id
+            )
+            await self._record_usage(tenant_id, model_name, usage, time.time() - start_time)
+            yield StreamChunk(content=content, delta="", finished=True, usage=usage, tool_calls=tool_calls)
                 
         except LLMException:
             raise
@@ -163,10 +278,51 @@ class LLMManager:
                 tenant_id=tenant_id
             )
     
-    async def _check_rate_limit(self, tenant_id: str, model_name: str):
-        """检查速率限制"""
-        # 实现速率限制逻辑
-        pass
+    @asynccontextmanager
+    async def _check_rate_limit(
+        self,
+        tenant_id: str,
+        model_name: str,
+        estimated_tokens: int = 0
+    ) -> AsyncIterator[None]:
+        """
+        速率限制与并发控制
+        
+        按模型和租户的令牌桶排队获取额度，并在调用期间占用模型的并发槽位；
+        在排队截止时间内仍无法获得额度时抛出 LLMException
+        """
+        try:
+            async with self.rate_limiter.acquire(tenant_id, model_name, estimated_tokens):
+                yield
+        except RateLimitTimeout as e:
+            raise LLMException(
+                message=f"模型 {model_name} 请求过多，请稍后重试: {e}",
+                tenant_id=tenant_id,
+                model_name=model_name,
+                details={"reason": "rate_limit", "waited": round(e.waited, 3)}
+            )
+    
+    @staticmethod
+    def _estimate_tokens(messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> int:
+        """预估本次调用的 token 数 (提示词 + 最大输出)，调用完成后按实际用量修正"""
+        prompt_tokens = sum(estimate_tokens(str(message.get("content") or "")) for message in messages)
+        return prompt_tokens + int(kwargs.get("max_tokens") or 0)
+    
+    def get_rate_limit_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取各模型排队等待统计"""
+        return self.rate_limiter.get_stats()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取补全缓存统计"""
+        return self.completion_cache.get_stats()
+    
+    def get_routing_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取多部署模型的路由统计 (延迟、错误率、对冲、熔断状态)"""
+        return {
+            name: provider.get_stats()
+            for name, provider in self.providers.items()
+            if isinstance(provider, ModelRouter)
+        }
     
     async def _record_usage(self, tenant_id: str, model_name: str, usage: Dict, latency: float):
         """记录使用统计"""
@@ -202,9 +358,13 @@ class LLMManager:
 class EmbeddingManager:
     """嵌入模型管理器"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[EmbeddingCache] = None):
         self.models: Dict[str, ModelConfig] = {}
         self.providers: Dict[str, Any] = {}
+        # 嵌入缓存，同一轮对话中重复的查询和重新摄取的未变更文档块不再调用提供商
+        self.cache = cache if cache is not None else EmbeddingCache()
+        # 每个模型一个微批处理器，合并并发调用方的单条嵌入请求
+        self.batchers: Dict[str, EmbeddingBatcher] = {}
         self.logger = logging.getLogger(__name__)
     
     async def initialize(self, model_configs: List[ModelConfig]):
@@ -219,6 +379,17 @@ class EmbeddingManager:
             from .providers.openai_provider import OpenAIEmbeddingProvider
             self.providers[config.name] = OpenAIEmbeddingProvider(config.api_key)
     
+    def _get_batcher(self, model_name: str) -> EmbeddingBatcher:
+        """获取模型的微批处理器"""
+        batcher = self.batchers.get(model_name)
+        if batcher is None:
+            # 每次发送时再取提供商，重新初始化后批处理器仍然有效
+            batcher = EmbeddingBatcher(
+                lambda texts: self.providers[model_name].embed_texts(texts, model=model_name)
+            )
+            self.batchers[model_name] = batcher
+        return batcher
+    
     async def embed_texts(
         self, 
         tenant_id: str, 
@@ -234,10 +405,11 @@ class EmbeddingManager:
                     tenant_id=tenant_id
                 )
             
-            provider = self.providers[model_name]
-            embeddings = await provider.embed_texts(texts, model=model_name)
-            return embeddings
+            batcher = self._get_batcher(model_name)
+            return await self.cache.get_or_compute(model_name, texts, batcher.embed)
             
+        except LLMException:
+            raise
         except Exception as e:
             raise LLMException(
                 error_code=ErrorCode.LLM_PROVIDER_ERROR,
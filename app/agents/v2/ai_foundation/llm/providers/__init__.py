@@ -4,7 +4,7 @@ LLM 提供商模块
 """
 
 # 导入基础类
-from .base_provider import BaseLLMProvider, BaseEmbeddingProvider
+from .base_provider import BaseLLMProvider, BaseEmbeddingProvider, ProviderError
 
 # 导入具体提供商
 from .openai_provider import OpenAIProvider
@@ -13,6 +13,7 @@ from .mock_provider import MockProvider
 __all__ = [
     'BaseLLMProvider',
     'BaseEmbeddingProvider', 
+    'ProviderError',
     'OpenAIProvider',
     'MockProvider'
 ] 
\ No newline at end of file
@@ -23,6 +23,23 @@ class LLMResponse:
             self.tool_calls = []
 
 
+class ProviderError(Exception):
+    """
+    提供商调用失败
+    
+    status_code 为上游 HTTP 状态码 (网络错误、超时等无状态码时为 None)；
+    429、408、5xx 以及网络错误视为可重试，可以切换到其他部署
+    """
+    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        self.status_code = status_code
+        super().__init__(message)
+    
+    @property
+    def retryable(self) -> bool:
+        return self.status_code is None or self.status_code in (408, 429) or self.status_code >= 500
+
+
 @dataclass 
 class StreamChunk:
     """流式响应数据块"""
@@ -30,6 +47,9 @@ class StreamChunk:
     is_complete: bool
     model: str
     chunk_id: str
+    # 仅在最后的数据块中出现: token 用量和完整的工具调用
+    usage: Optional[Dict[str, Any]] = None
+    tool_calls: Optional[List[Dict]] = None
 
 
 class BaseLLMProvider(ABC):
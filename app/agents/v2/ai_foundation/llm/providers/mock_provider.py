@@ -8,7 +8,7 @@ import random
 from typing import AsyncGenerator, List, Dict, Any
 import uuid
 
-from .base_provider import BaseLLMProvider, BaseEmbeddingProvider, LLMResponse, StreamChunk
+from .base_provider import BaseLLMProvider, BaseEmbeddingProvider, LLMResponse, ProviderError, StreamChunk
 
 
 class MockProvider(BaseLLMProvider):
@@ -17,6 +17,24 @@ class MockProvider(BaseLLMProvider):
     def __init__(self, api_key: str = "mock", **kwargs):
         super().__init__(api_key, **kwargs)
         self.response_delay = kwargs.get('response_delay', 1.0)  # 模拟响应延迟
+        self.stream_delay = kwargs.get('stream_delay', 0.02)  # 模拟逐字输出间隔
+        # 模拟上游故障: 按比例返回错误 (默认 429)，按比例出现长尾延迟
+        self.error_rate = kwargs.get('error_rate', 0.0)
+        self.error_status = kwargs.get('error_status', 429)
+        self.tail_rate = kwargs.get('tail_rate', 0.0)
+        self.tail_delay = kwargs.get('tail_delay', 5.0)
+        self._random = random.Random(kwargs.get('seed'))
+        self.call_count = 0
+    
+    async def _simulate_upstream(self):
+        """模拟网络延迟、长尾和上游错误"""
+        self.call_count += 1
+        delay = self.response_delay
+        if self.tail_rate and self._random.random() < self.tail_rate:
+            delay = self.tail_delay
+        await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise ProviderError(f"模拟上游错误 {self.error_status}", status_code=self.error_status)
     
     async def chat(
         self, 
@@ -27,8 +45,8 @@ class MockProvider(BaseLLMProvider):
         """模拟聊天对话"""
         start_time = time.time()
         
-        # 模拟网络延迟
-        await asyncio.sleep(self.response_delay)
+        # 模拟网络延迟与上游故障
+        await self._simulate_upstream()
         
         # 根据输入生成模拟响应
         last_message = messages[-1].get('content', '') if messages else ''
@@ -74,14 +92,16 @@ class MockProvider(BaseLLMProvider):
         response = await self.chat(messages, model, **kwargs)
         content = response.content
         
-        # 模拟逐字符流式输出
+        # 模拟逐字符流式输出，用量随最后一个数据块返回
         for i, char in enumerate(content):
-            await asyncio.sleep(0.02)  # 模拟打字效果
+            await asyncio.sleep(self.stream_delay)  # 模拟打字效果
+            is_complete = i == len(content) - 1
             yield StreamChunk(
                 content=char,
-                is_complete=i == len(content) - 1,
+                is_complete=is_complete,
                 model=model,
-                chunk_id=str(uuid.uuid4())
+                chunk_id=str(uuid.uuid4()),
+                usage=response.usage if is_complete else None
             )
     
     async def get_available_models(self) -> List[str]:
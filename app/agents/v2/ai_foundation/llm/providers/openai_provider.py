@@ -2,12 +2,13 @@
 OpenAI 提供商实现
 提供 OpenAI GPT 和嵌入模型的接口
 """
+import json
 import time
 import logging
 from typing import AsyncGenerator, List, Dict, Any
 import uuid
 
-from .base_provider import BaseLLMProvider, BaseEmbeddingProvider, LLMResponse, StreamChunk
+from .base_provider import BaseLLMProvider, BaseEmbeddingProvider, LLMResponse, ProviderError, StreamChunk
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +25,7 @@ class OpenAIProvider(BaseLLMProvider):
         """设置 OpenAI 客户端"""
         try:
             from openai import AsyncOpenAI
-            self.client = AsyncOpenAI(api_key=self.api_key)
+            self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.config.get('base_url'))
             logger.info("OpenAI client initialized successfully")
         except ImportError:
             logger.warning("OpenAI package not installed, using mock responses")
@@ -66,14 +67,11 @@ class OpenAIProvider(BaseLLMProvider):
             
         except Exception as e:
             logger.error(f"OpenAI chat error: {e}")
-            # 返回错误响应
-            return LLMResponse(
-                content=f"OpenAI API 调用失败: {str(e)}",
-                model=model,
-                usage={},
-                finish_reason="error",
-                response_time=time.time() - start_time
-            )
+            # 抛出带状态码的异常，由上层决定重试或切换部署，不把错误当作正常回复
+            raise ProviderError(
+                f"OpenAI API 调用失败: {str(e)}",
+                status_code=getattr(e, 'status_code', None)
+            ) from e
     
     async def stream_chat(
         self,
@@ -99,26 +97,58 @@ class OpenAIProvider(BaseLLMProvider):
                 model=model,
                 messages=messages,
                 stream=True,
+                stream_options={"include_usage": True},
                 **kwargs
             )
             
+            # 工具调用参数按 index 分片下发，拼接完整后随结束块一起返回
+            tool_calls: Dict[int, Dict[str, Any]] = {}
             async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
+                if chunk.usage:
+                    # include_usage 时最后一个数据块没有 choices，只有用量
                     yield StreamChunk(
-                        content=chunk.choices[0].delta.content,
-                        is_complete=chunk.choices[0].finish_reason is not None,
+                        content="",
+                        is_complete=True,
                         model=chunk.model,
-                        chunk_id=chunk.id
+                        chunk_id=chunk.id,
+                        usage=chunk.usage.model_dump()
+                    )
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                for call in choice.delta.tool_calls or []:
+                    entry = tool_calls.setdefault(call.index, {"id": None, "name": "", "arguments": ""})
+                    entry["id"] = call.id or entry["id"]
+                    if call.function:
+                        entry["name"] += call.function.name or ""
+                        entry["arguments"] += call.function.arguments or ""
+                if choice.delta.content or choice.finish_reason is not None:
+                    yield StreamChunk(
+                        content=choice.delta.content or "",
+                        is_complete=choice.finish_reason is not None,
+                        model=chunk.model,
+                        chunk_id=chunk.id,
+                        tool_calls=self._parse_tool_calls(tool_calls) if choice.finish_reason and tool_calls else None
                     )
                     
         except Exception as e:
             logger.error(f"OpenAI stream chat error: {e}")
-            yield StreamChunk(
-                content=f"流式响应错误: {str(e)}",
-                is_complete=True,
-                model=model,
-                chunk_id=str(uuid.uuid4())
-            )
+            raise ProviderError(
+                f"流式响应错误: {str(e)}",
+                status_code=getattr(e, 'status_code', None)
+            ) from e
+    
+    @staticmethod
+    def _parse_tool_calls(tool_calls: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """将拼接完成的工具调用转换为 {id, name, arguments} 列表"""
+        parsed = []
+        for _, call in sorted(tool_calls.items()):
+            try:
+                arguments = json.loads(call["arguments"]) if call["arguments"] else {}
+            except json.JSONDecodeError:
+                arguments = {}
+            parsed.append({"id": call["id"], "name": call["name"], "arguments": arguments})
+        return parsed
     
     async def get_available_models(self) -> List[str]:
         """获取可用模型列表"""
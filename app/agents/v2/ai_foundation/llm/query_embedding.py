@@ -0,0 +1,41 @@
+"""
+请求级查询嵌入共享 - 同一轮中记忆检索与知识检索复用同一次查询嵌入
+在 request_embedding_scope() 内，相同 (模型, 文本) 的查询嵌入只计算一次，
+并发的检索分支等待同一个结果；作用域外则直接调用嵌入管理器
+"""
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_query_embeddings: ContextVar[Optional[Dict[Tuple[str, str], asyncio.Future]]] = ContextVar(
+    "query_embeddings", default=None
+)
+
+
+@contextmanager
+def request_embedding_scope() -> Iterator[None]:
+    """开启请求级查询嵌入作用域 (在其中创建的子任务共享同一作用域)"""
+    token = _query_embeddings.set({})
+    try:
+        yield
+    finally:
+        _query_embeddings.reset(token)
+
+
+async def embed_query(embedding_manager, tenant_id: str, model_name: str, text: str) -> List[float]:
+    """获取查询文本的嵌入，作用域内复用已有 (或进行中) 的结果"""
+    scope = _query_embeddings.get()
+    if scope is None:
+        embeddings = await embedding_manager.embed_texts(tenant_id=tenant_id, model_name=model_name, texts=[text])
+        return embeddings[0]
+
+    key = (model_name, text)
+    future = scope.get(key)
+    if future is None:
+        future = scope[key] = asyncio.ensure_future(
+            embedding_manager.embed_texts(tenant_id=tenant_id, model_name=model_name, texts=[text])
+        )
+    # 某一检索分支超时被取消时不影响仍在等待的其他分支
+    embeddings = await asyncio.shield(future)
+    return embeddings[0]
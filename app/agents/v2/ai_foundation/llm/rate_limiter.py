@@ -0,0 +1,270 @@
+"""
+LLM 速率限制 - 令牌桶 + 并发控制
+按模型限制每分钟请求数与 token 数，按模型限制并发请求数；
+其他租户在排队时，单个租户最多占用模型请求与 token 额度的 tenant_share，无竞争时可以用满空闲额度；
+超出限制的调用在截止时间内排队等待 (先到先得)，而不是直接失败
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+# 单个租户最多占用模型每分钟请求额度的比例
+DEFAULT_TENANT_SHARE = 0.5
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_QUEUE_TIMEOUT = 10.0
+# 租户桶数量上限 (已恢复满额的空闲桶会随时被回收，超过上限时淘汰最久未使用的桶)
+DEFAULT_MAX_TENANT_BUCKETS = 10000
+
+
+class RateLimitTimeout(Exception):
+    """在截止时间内未能获得额度"""
+
+    def __init__(self, scope: str, waited: float):
+        self.scope = scope
+        self.waited = waited
+        super().__init__(f"{scope} 排队 {waited:.2f}s 后仍超出速率限制")
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    额度按 rate_per_minute 匀速恢复，容量为一分钟的额度；
+    等待方持锁休眠，保证先到先得；实际消耗与预估不符时可以补扣或返还 (允许透支)
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0, deadline: Optional[float] = None):
+        """获取额度，额度不足时等待；预计等待超过截止时间 (monotonic) 时抛出 RateLimitTimeout"""
+        amount = min(amount, self.capacity)
+        start = time.monotonic()
+        try:
+            if deadline is None:
+                await self._lock.acquire()
+            else:
+                await asyncio.wait_for(self._lock.acquire(), max(0.0, deadline - start))
+        except asyncio.TimeoutError:
+            raise RateLimitTimeout("令牌桶", time.monotonic() - start)
+        try:
+            self._refill()
+            if self.tokens < amount:
+                wait = (amount - self.tokens) / self.rate
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise RateLimitTimeout("令牌桶", time.monotonic() - start)
+                await asyncio.sleep(wait)
+                self._refill()
+            self.tokens -= amount
+        finally:
+            self._lock.release()
+
+    def drain(self, amount: float):
+        """不等待地扣除额度，最多扣到 0 (无竞争时只记录用量，不限流)"""
+        self._refill()
+        self.tokens = max(0.0, self.tokens - amount)
+
+    def is_idle(self) -> bool:
+        """额度已恢复满且无人等待，此时丢弃与新建等价"""
+        self._refill()
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+    def adjust(self, amount: float):
+        """按实际消耗补扣 (正数) 或返还 (负数) 额度"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class TenantQuota:
+    """租户在某个模型上的请求桶与 token 桶 (模型未限制 token 数时无 token 桶)"""
+
+    __slots__ = ("requests", "tokens")
+
+    def __init__(self, requests: TokenBucket, tokens: Optional[TokenBucket] = None):
+        self.requests = requests
+        self.tokens = tokens
+
+    def is_idle(self) -> bool:
+        return self.requests.is_idle() and (self.tokens is None or self.tokens.is_idle())
+
+
+@dataclass
+class QueueStats:
+    """排队等待统计"""
+    requests: int = 0
+    waited: int = 0
+    rejected: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    in_flight: int = 0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+            "max_wait": self.max_wait,
+            "in_flight": self.in_flight
+        }
+
+
+class RateLimiter:
+    """按模型和租户的速率与并发限制器"""
+
+    def __init__(
+        self,
+        tenant_share: float = DEFAULT_TENANT_SHARE,
+        queue_timeout: float = DEFAULT_QUEUE_TIMEOUT,
+        max_tenant_buckets: int = DEFAULT_MAX_TENANT_BUCKETS
+    ):
+        self.tenant_share = tenant_share
+        self.queue_timeout = queue_timeout
+        self.max_tenant_buckets = max_tenant_buckets
+        self._limits: Dict[str, Tuple[int, Optional[int], int]] = {}
+        self._request_buckets: Dict[str, TokenBucket] = {}
+        self._token_buckets: Dict[str, TokenBucket] = {}
+        self._tenant_buckets: "OrderedDict[Tuple[str, str], TenantQuota]" = OrderedDict()
+        # 每个模型上各租户正在排队 (尚未拿到并发槽位) 的请求数
+        self._waiting: Dict[str, Dict[str, int]] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.stats: Dict[str, QueueStats] = {}
+
+    def configure(
+        self,
+        model_name: str,
+        requests_per_minute: int,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    ):
+        """设置模型限制"""
+        self._limits[model_name] = (requests_per_minute, tokens_per_minute, max_concurrency)
+        self._request_buckets[model_name] = TokenBucket(requests_per_minute)
+        if tokens_per_minute:
+            self._token_buckets[model_name] = TokenBucket(tokens_per_minute)
+        else:
+            self._token_buckets.pop(model_name, None)
+        self._semaphores[model_name] = asyncio.Semaphore(max_concurrency)
+        for key in [key for key in self._tenant_buckets if key[1] == model_name]:
+            del self._tenant_buckets[key]
+        self.stats.setdefault(model_name, QueueStats())
+
+    def _tenant_quota(self, tenant_id: str, model_name: str) -> TenantQuota:
+        key = (tenant_id, model_name)
+        quota = self._tenant_buckets.get(key)
+        if quota is None:
+            self._evict_tenant_buckets()
+            requests_per_minute, tokens_per_minute, _ = self._limits[model_name]
+            quota = TenantQuota(
+                TokenBucket(max(1.0, requests_per_minute * self.tenant_share)),
+                TokenBucket(max(1.0, tokens_per_minute * self.tenant_share)) if tokens_per_minute else None
+            )
+            self._tenant_buckets[key] = quota
+        else:
+            self._tenant_buckets.move_to_end(key)
+        return quota
+
+    def _evict_tenant_buckets(self):
+        """回收最久未使用且已空闲的租户桶；数量达到上限时淘汰最久未使用的桶"""
+        while self._tenant_buckets:
+            key, quota = next(iter(self._tenant_buckets.items()))
+            if not quota.is_idle() and len(self._tenant_buckets) < self.max_tenant_buckets:
+                break
+            del self._tenant_buckets[key]
+
+    def _others_waiting(self, tenant_id: str, model_name: str) -> bool:
+        waiting = self._waiting.get(model_name)
+        return bool(waiting) and any(tenant != tenant_id for tenant in waiting)
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        tenant_id: str,
+        model_name: str,
+        estimated_tokens: int = 0,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """
+        获取一次调用的额度，退出上下文时释放并发槽位
+
+        依次经过租户请求桶、租户 token 桶、模型请求桶、模型 token 桶和模型并发信号量，
+        任一环节在 timeout 内无法满足时抛出 RateLimitTimeout；
+        租户的桶只在其他租户也在排队时限流，否则只扣除剩余额度
+        """
+        if model_name not in self._limits:
+            yield
+            return
+
+        stats = self.stats[model_name]
+        start = time.monotonic()
+        deadline = start + (timeout if timeout is not None else self.queue_timeout)
+        semaphore = self._semaphores[model_name]
+        waiting = self._waiting.setdefault(model_name, {})
+        waiting[tenant_id] = waiting.get(tenant_id, 0) + 1
+        try:
+            # 先过租户自己的桶，有竞争时超额租户在自己的队列里等待，不占用模型队列
+            quota = self._tenant_quota(tenant_id, model_name)
+            tenant_tokens = estimated_tokens if quota.tokens is not None else 0
+            if self._others_waiting(tenant_id, model_name):
+                await quota.requests.acquire(1, deadline)
+                if tenant_tokens:
+                    await quota.tokens.acquire(tenant_tokens, deadline)
+            else:
+                quota.requests.drain(1)
+                if tenant_tokens:
+                    quota.tokens.drain(tenant_tokens)
+            await self._request_buckets[model_name].acquire(1, deadline)
+            token_bucket = self._token_buckets.get(model_name)
+            if token_bucket is not None and estimated_tokens:
+                await token_bucket.acquire(estimated_tokens, deadline)
+            await asyncio.wait_for(semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+        except (RateLimitTimeout, asyncio.TimeoutError):
+            stats.rejected += 1
+            raise RateLimitTimeout(model_name, time.monotonic() - start)
+        finally:
+            waiting[tenant_id] -= 1
+            if not waiting[tenant_id]:
+                del waiting[tenant_id]
+
+        waited = time.monotonic() - start
+        stats.requests += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        if waited > 0.001:
+            stats.waited += 1
+        stats.in_flight += 1
+        try:
+            yield
+        finally:
+            stats.in_flight -= 1
+            semaphore.release()
+
+    def record_tokens(
+        self,
+        model_name: str,
+        actual_tokens: int,
+        estimated_tokens: int,
+        tenant_id: Optional[str] = None
+    ):
+        """按实际 token 用量修正模型 (及租户) 的 token 桶"""
+        token_bucket = self._token_buckets.get(model_name)
+        if token_bucket is not None:
+            token_bucket.adjust(actual_tokens - estimated_tokens)
+        quota = self._tenant_buckets.get((tenant_id, model_name)) if tenant_id is not None else None
+        if quota is not None and quota.tokens is not None:
+            quota.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        return {model_name: stats.to_dict() for model_name, stats in self.stats.items()}
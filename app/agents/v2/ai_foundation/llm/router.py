@@ -0,0 +1,291 @@
+"""
+模型路由 - 一个逻辑模型背后的多个部署/提供商
+按观测到的延迟 (EWMA) 和错误率选择部署；首个请求慢于该部署 p95 时发送对冲请求；
+遇到 429/5xx 时切换部署，连续失败的部署由熔断器暂时摘除
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set
+
+from .providers.base_provider import LLMResponse, ProviderError, StreamChunk
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.2
+# 错误率对延迟得分的放大系数: 错误率 50% 的部署得分翻 (1 + 0.5 * 4) 倍
+ERROR_PENALTY = 4.0
+# 计算 p95 所需的最少样本数，样本不足时不对冲
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+LATENCY_WINDOW = 200
+EXPLORE_RATE = 0.05
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败达到阈值后打开，冷却期内拒绝请求；冷却后进入半开状态放行一个探测请求，
+    探测成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def available(self) -> bool:
+        """是否可以接收请求 (不改变状态)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not self._probing
+
+    def on_dispatch(self):
+        """请求发出时调用，冷却结束的熔断器进入半开并占用探测名额"""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            self._probing = True
+
+    def release_probe(self):
+        """探测请求被取消 (如对冲失败方)，释放探测名额"""
+        self._probing = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"熔断器打开 (连续失败 {self.failures} 次)")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class Deployment:
+    """逻辑模型的一个部署"""
+    name: str
+    provider: Any
+    model: str
+    weight: float = 1.0
+
+    def __post_init__(self):
+        self.breaker = CircuitBreaker()
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"requests": 0, "errors": 0, "hedges": 0, "wins": 0}
+
+    def score(self) -> float:
+        """路由得分，越小越好；尚无延迟样本的部署得分为 0，优先探测"""
+        if self.ewma_latency is None:
+            return 0.0
+        return self.ewma_latency * (1.0 + ERROR_PENALTY * self.error_rate) / max(self.weight, 1e-6)
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.ewma_latency = latency if self.ewma_latency is None else (
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma_latency
+        )
+        self.error_rate *= (1 - EWMA_ALPHA)
+        self.breaker.record_success()
+
+    def record_failure(self, error: ProviderError):
+        self.stats["errors"] += 1
+        self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+        # 请求本身有误 (4xx) 不说明部署不健康
+        if error.retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+
+class ModelRouter:
+    """
+    逻辑模型路由器
+
+    与提供商相同的 chat / stream_chat 接口，可直接放入 LLMManager.providers
+    """
+
+    def __init__(
+        self,
+        deployments: List[Deployment],
+        hedging: bool = True,
+        hedge_min_delay: float = HEDGE_MIN_DELAY,
+        seed: Optional[int] = None
+    ):
+        if not deployments:
+            raise ValueError("至少需要一个部署")
+        self.deployments = deployments
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+        self._random = random.Random(seed)
+        self.stats = {"requests": 0, "hedged": 0, "failovers": 0, "failures": 0}
+
+    def select(self, exclude: Set[str]) -> Optional[Deployment]:
+        """选择得分最低的可用部署，小概率随机探测其他部署以更新其延迟"""
+        candidates = [d for d in self.deployments if d.name not in exclude and d.breaker.available()]
+        if not candidates:
+            return None
+        if len(candidates) > 1 and self._random.random() < EXPLORE_RATE:
+            return self._random.choice(candidates)
+        return min(candidates, key=lambda d: d.score())
+
+    async def _call(self, deployment: Deployment, messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> LLMResponse:
+        deployment.breaker.on_dispatch()
+        deployment.stats["requests"] += 1
+        start = time.monotonic()
+        try:
+            response = await deployment.provider.chat(messages, model=deployment.model, **kwargs)
+        except asyncio.CancelledError:
+            # 对冲请求输掉后被取消，释放半开探测名额
+            deployment.breaker.release_probe()
+            raise
+        except Exception as e:
+            error = e if isinstance(e, ProviderError) else ProviderError(str(e))
+            deployment.record_failure(error)
+            raise error from e
+        deployment.record_success(time.monotonic() - start)
+        return response
+
+    async def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, **kwargs) -> LLMResponse:
+        """带对冲和故障转移的聊天调用 (model 参数由部署决定，此处忽略)"""
+        self.stats["requests"] += 1
+        tried: Set[str] = set()
+        pending: Dict[asyncio.Future, Deployment] = {}
+        last_error: Optional[Exception] = None
+        hedged = False
+
+        def launch() -> Optional[Deployment]:
+            deployment = self.select(tried)
+            if deployment is not None:
+                tried.add(deployment.name)
+                pending[asyncio.ensure_future(self._call(deployment, messages, kwargs))] = deployment
+            return deployment
+
+        if launch() is None:
+            self.stats["failures"] += 1
+            raise ProviderError("没有可用的部署 (全部熔断)", status_code=503)
+
+        try:
+            while pending:
+                timeout = None
+                if self.hedging and not hedged and len(pending) == 1:
+                    p95 = next(iter(pending.values())).p95()
+                    if p95 is not None:
+                        timeout = max(p95, self.hedge_min_delay)
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 首个请求已慢于 p95，向另一个部署发送对冲请求，先返回者胜出
+                    hedged = True
+                    hedge = launch()
+                    if hedge is not None:
+                        self.stats["hedged"] += 1
+                        hedge.stats["hedges"] += 1
+                    continue
+
+                for task in done:
+                    deployment = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except ProviderError as e:
+                        last_error = e
+                        if not e.retryable:
+                            raise
+                        continue
+                    deployment.stats["wins"] += 1
+                    return response
+
+                if not pending:
+                    # 可重试错误: 切换到下一个部署
+                    if launch() is None:
+                        break
+                    self.stats["failovers"] += 1
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self.stats["failures"] += 1
+        raise last_error or ProviderError("所有部署均调用失败", status_code=503)
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        **kwargs
+    ) -> AsyncGenerator[StreamChunk, None]:
+        """流式调用: 不对冲，只在首个数据块之前发生错误时切换部署"""
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+        while True:
+            deployment = self.select(tried)
+            if deployment is None:
+                raise last_error or ProviderError("没有可用的部署 (全部熔断)", status_code=503)
+            tried.add(deployment.name)
+            deployment.breaker.on_dispatch()
+            deployment.stats["requests"] += 1
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in deployment.provider.stream_chat(messages, model=deployment.model, **kwargs):
+                    if not started:
+                        started = True
+                        deployment.record_success(time.monotonic() - start)
+                    yield chunk
+                if not started:
+                    started = True
+                    deployment.record_success(time.monotonic() - start)
+                return
+            except Exception as e:
+                error = e if isinstance(e, ProviderError) else ProviderError(str(e))
+                deployment.record_failure(error)
+                if started or not error.retryable:
+                    if error is e:
+                        raise
+                    raise error from e
+                last_error = error
+                self.stats["failovers"] += 1
+            finally:
+                # 首个数据块之前被取消 (客户端断开，CancelledError/GeneratorExit)，释放半开探测名额
+                if not started:
+                    deployment.breaker.release_probe()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "deployments": {
+                d.name: {
+                    **d.stats,
+                    "ewma_latency": d.ewma_latency,
+                    "error_rate": round(d.error_rate, 4),
+                    "p95": d.p95(),
+                    "breaker": d.breaker.state
+                }
+                for d in self.deployments
+            }
+        }
@@ -0,0 +1,203 @@
+"""
+上下文构建 - 按 token 预算组装会话上下文
+最近 K 轮原样保留，更早的轮次由后台任务增量折叠进滚动摘要 (按会话缓存)，
+每轮发送给模型的上下文大小因此有上界
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Set
+
+from ..llm.embedding_batcher import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # 未安装时退回字节数估算
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 2000
+DEFAULT_RECENT_TURNS = 6
+# 未摘要的旧轮次累积到该数量才触发一次折叠，避免每轮都调用 LLM
+DEFAULT_FOLD_BATCH = 4
+# 一次折叠最多发送给摘要模型的轮次数，折叠时也只读取最近 K + 该数量的轮次
+DEFAULT_MAX_FOLD_TURNS = 16
+DEFAULT_MAX_SUMMARIES = 10000
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class TokenCounter:
+    """基于 tiktoken 的 token 计数，编码不可用 (未安装或无法下载) 时退回估算"""
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._unavailable = tiktoken is None
+
+    def _get_encoding(self):
+        if self._encoding is None and not self._unavailable:
+            try:
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken 编码 {self.encoding_name} 不可用，使用估算: {e}")
+                self._unavailable = True
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is None:
+            return estimate_tokens(text)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_turn(self, turn: Dict[str, Any]) -> int:
+        return self.count(turn.get("human", "")) + self.count(turn.get("assistant", ""))
+
+
+@dataclass
+class SessionSummary:
+    """会话的滚动摘要；covered_until 为已折叠的最后一轮的时间戳"""
+    text: str = ""
+    covered_until: str = ""
+
+
+class RollingSummarizer:
+    """
+    会话滚动摘要
+
+    每次写入后检查最近 K 轮之前是否有足够多未折叠的轮次，有则在后台用
+    "已有摘要 + 新轮次" 增量更新摘要；同一会话同时只有一个折叠任务。
+    折叠只读取最近 K + max_fold_turns 轮，更早且尚未折叠的轮次 (如摘要模型长时间失败) 不再补折
+    """
+
+    def __init__(
+        self,
+        working_memory,
+        summarizer,
+        recent_turns: int = DEFAULT_RECENT_TURNS,
+        fold_batch: int = DEFAULT_FOLD_BATCH,
+        max_summaries: int = DEFAULT_MAX_SUMMARIES,
+        max_fold_turns: int = DEFAULT_MAX_FOLD_TURNS
+    ):
+        self.working_memory = working_memory
+        self.summarizer = summarizer
+        self.recent_turns = recent_turns
+        self.fold_batch = fold_batch
+        self.max_fold_turns = max(max_fold_turns, fold_batch)
+        self.max_summaries = max_summaries
+        self._summaries: "OrderedDict[str, SessionSummary]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.stats = {"folds": 0, "folded_turns": 0, "errors": 0}
+
+    def get_summary(self, session_id: str) -> SessionSummary:
+        summary = self._summaries.get(session_id)
+        if summary is None:
+            return SessionSummary()
+        self._summaries.move_to_end(session_id)
+        return summary
+
+    def _set_summary(self, session_id: str, summary: SessionSummary):
+        self._summaries[session_id] = summary
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+
+    def split(self, history: List[Dict[str, Any]], summary: SessionSummary) -> tuple:
+        """把按时间排序的轮次分为 (尚未折叠进摘要的旧轮次, 最近 K 轮)"""
+        split = max(len(history) - self.recent_turns, 0)
+        older, recent = history[:split], history[split:]
+        if summary.covered_until:
+            older = [turn for turn in older if turn.get("timestamp", "") > summary.covered_until]
+        return older, recent
+
+    def maybe_schedule(self, session_id: str, user_id: str, history: List[Dict[str, Any]]):
+        """history 为会话最近的轮次；未折叠的旧轮次凑满 fold_batch 时在后台折叠"""
+        pending, _ = self.split(history, self.get_summary(session_id))
+        if len(pending) >= self.fold_batch:
+            self.schedule(session_id, user_id)
+
+    async def on_interaction(self, session_id: str, user_id: str):
+        """写入一轮后检查是否需要折叠 (只读取最近 K + fold_batch 轮)"""
+        history = await self.working_memory.get_session_history(
+            session_id, last_n=self.recent_turns + self.fold_batch
+        )
+        self.maybe_schedule(session_id, user_id, history)
+
+    def schedule(self, session_id: str, user_id: str):
+        """在后台折叠旧轮次 (同一会话已有任务在运行时跳过)"""
+        if session_id in self._tasks:
+            return
+        task = asyncio.create_task(self._fold(session_id, user_id))
+        self._tasks[session_id] = task
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        task.add_done_callback(lambda done: self._on_done(session_id, done))
+
+    def _on_done(self, session_id: str, task: asyncio.Task):
+        # 会话可能已被 discard 并启动了新任务，只移除自己
+        if self._tasks.get(session_id) is task:
+            del self._tasks[session_id]
+
+    async def wait(self, session_id: str):
+        """等待会话当前的折叠任务完成"""
+        task = self._tasks.get(session_id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def _fold(self, session_id: str, user_id: str):
+        try:
+            summary = self.get_summary(session_id)
+            # 只读取最近 K + max_fold_turns 轮，待折叠的旧轮次因此不超过 max_fold_turns
+            history = await self.working_memory.get_session_history(
+                session_id, last_n=self.recent_turns + self.max_fold_turns
+            )
+            pending, _ = self.split(history, summary)
+            if not pending:
+                return
+
+            text = await self.summarizer.update_summary(summary.text, pending, user_id)
+            self._set_summary(session_id, SessionSummary(
+                text=text,
+                covered_until=pending[-1].get("timestamp", "")
+            ))
+            self.stats["folds"] += 1
+            self.stats["folded_turns"] += len(pending)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"会话 {session_id} 滚动摘要更新失败: {e}")
+
+    def discard(self, session_id: str):
+        """结束会话时丢弃摘要和未完成的折叠任务"""
+        self._summaries.pop(session_id, None)
+        task = self._tasks.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "sessions": len(self._summaries), "running": len(self._tasks)}
+
+
+def fit_turns_to_budget(
+    turns: List[Dict[str, Any]],
+    budget: int,
+    counter: TokenCounter
+) -> tuple:
+    """从最新一轮往前选取能放入预算的轮次 (至少保留最新一轮)，返回 (轮次, token 数)"""
+    selected: List[Dict[str, Any]] = []
+    used = 0
+    for turn in reversed(turns):
+        tokens = counter.count_turn(turn)
+        if selected and used + tokens > budget:
+            break
+        selected.append(turn)
+        used += tokens
+    selected.reverse()
+    return selected, used
+
+
+# 全局 token 计数器
+token_counter = TokenCounter()
@@ -5,12 +5,38 @@
 import asyncio
 import json
 import time
-from typing import Dict, List, Optional, Any
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 import logging
 
+import numpy as np
+
 from ...core_infrastructure.error.exceptions import MemoryException, ErrorCode
+from ..llm.query_embedding import embed_query
+from .session_store import LocalSessionStore, DEFAULT_SESSION_TTL
+from .memory_store import LocalMemoryStore, decay_factors, DEFAULT_MEMORY_STORE_PATH
+from .context_builder import (
+    RollingSummarizer, TokenCounter, fit_turns_to_budget, token_counter,
+    DEFAULT_CONTEXT_TOKEN_BUDGET, DEFAULT_RECENT_TURNS
+)
+
+# 每个会话保留的最大轮数，更早的轮次被裁剪
+DEFAULT_MAX_SESSION_TURNS = 200
+# 构建记忆上下文时读取的最近轮数
+DEFAULT_CONTEXT_TURNS = 20
+# 长期记忆重要性的半衰期 (天)
+DEFAULT_DECAY_DAYS = 30
+# 每个用户最多保留的长期记忆条数，以及压缩时保留的最低衰减后重要性
+DEFAULT_MAX_MEMORIES_PER_USER = 1000
+DEFAULT_MIN_MEMORY_SCORE = 0.01
+# 检索时先按相似度召回 top_k 的若干倍候选，再结合时间衰减重排
+MEMORY_CANDIDATE_FACTOR = 3
+# 访问计数写回的批量间隔 (秒)
+ACCESS_FLUSH_INTERVAL = 1.0
+# 记忆存在索引缓存的用户数
+DEFAULT_PRESENCE_CACHE_SIZE = 100000
 
 
 @dataclass
@@ -20,6 +46,7 @@ class MemoryContext:
     relevant_memories: List[Dict[str, Any]]
     context_summary: str
     total_tokens: int
+    session_summary: str = ""  # 早于 session_history 的轮次的滚动摘要
 
 
 @dataclass
@@ -39,25 +66,44 @@ class MemoryItem:
 
 
 class WorkingMemory:
-    """短期记忆 (Redis/内存)"""
+    """
+    短期记忆 (Redis/内存)
     
-    def __init__(self, redis_client=None):
+    会话历史按轮追加存储: Redis 中为列表 (RPUSH + LTRIM + EXPIRE 在同一事务管道中执行)，
+    本地为有界的 LocalSessionStore (LRU + TTL 淘汰，可溢出到 SQLite 文件)；
+    每个会话最多保留 max_turns 轮，读取时可只取最近 N 轮
+    """
+    
+    def __init__(
+        self,
+        redis_client=None,
+        max_turns: int = DEFAULT_MAX_SESSION_TURNS,
+        session_ttl: int = DEFAULT_SESSION_TTL,
+        spill_path: Optional[str] = None
+    ):
         self.redis_client = redis_client
-        self.local_cache = {}  # 临时本地缓存
-        self.session_ttl = 24 * 3600  # 24小时
+        self.session_ttl = session_ttl
+        self.max_turns = max_turns
+        self.local_cache = LocalSessionStore(ttl=session_ttl, max_turns=max_turns, spill_path=spill_path)
         self.logger = logging.getLogger(__name__)
     
-    async def get_session_history(self, session_id: str) -> List[Dict[str, str]]:
-        """获取会话历史"""
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        # 与旧版整段 JSON 的 session:{id} 键区分，避免类型冲突
+        return f"session:{session_id}:turns"
+    
+    async def get_session_history(self, session_id: str, last_n: Optional[int] = None) -> List[Dict[str, str]]:
+        """获取会话历史 (last_n 不为空时只返回最近 last_n 轮)"""
         try:
+            if last_n is not None and last_n <= 0:
+                return []
+            
             if self.redis_client:
-                history_json = await self.redis_client.get(f"session:{session_id}")
-                if history_json:
-                    return json.loads(history_json)
-            else:
-                return self.local_cache.get(f"session:{session_id}", [])
+                start = -last_n if last_n else 0
+                items = await self.redis_client.lrange(self._session_key(session_id), start, -1)
+                return [json.loads(item) for item in items]
             
-            return []
+            return await self.local_cache.get(self._session_key(session_id), last_n)
             
         except Exception as e:
             self.logger.error(f"获取会话历史失败: {e}")
@@ -66,33 +112,36 @@ class WorkingMemory:
                 message=f"获取会话历史失败: {str(e)}"
             )
     
+    async def get_session_length(self, session_id: str) -> int:
+        """获取会话轮数"""
+        if self.redis_client:
+            return await self.redis_client.llen(self._session_key(session_id))
+        return await self.local_cache.length(self._session_key(session_id))
+    
     async def add_interaction(
         self, 
         session_id: str, 
         human_message: str, 
         ai_message: str
     ):
-        """添加对话交互"""
+        """添加对话交互 (只追加本轮，不重写已有历史)"""
         try:
-            history = await self.get_session_history(session_id)
-            
             # 添加新的交互
             interaction = {
                 "timestamp": datetime.now().isoformat(),
                 "human": human_message,
                 "assistant": ai_message
             }
-            history.append(interaction)
+            key = self._session_key(session_id)
             
-            # 保存更新后的历史
             if self.redis_client:
-                await self.redis_client.setex(
-                    f"session:{session_id}",
-                    self.session_ttl,
-                    json.dumps(history)
-                )
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.rpush(key, json.dumps(interaction, ensure_ascii=False))
+                pipe.ltrim(key, -self.max_turns, -1)
+                pipe.expire(key, self.session_ttl)
+                await pipe.execute()
             else:
-                self.local_cache[f"session:{session_id}"] = history
+                await self.local_cache.append(key, interaction)
                 
         except Exception as e:
             self.logger.error(f"添加交互失败: {e}")
@@ -105,26 +154,58 @@ class WorkingMemory:
         """清除会话"""
         try:
             if self.redis_client:
-                await self.redis_client.delete(f"session:{session_id}")
+                await self.redis_client.delete(self._session_key(session_id))
             else:
-                self.local_cache.pop(f"session:{session_id}", None)
+                await self.local_cache.delete(self._session_key(session_id))
                 
         except Exception as e:
             self.logger.error(f"清除会话失败: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """本地会话存储的容量与淘汰统计 (使用 Redis 时由 Redis 自行管理)"""
+        if self.redis_client:
+            return {"backend": "redis"}
+        return {"backend": "local", **self.local_cache.get_stats()}
 
 
 class LongTermMemory:
-    """长期记忆 (Milvus + MongoDB)"""
+    """
+    长期记忆 (Milvus + MongoDB)
+    
+    未同时配置 Milvus 和 MongoDB 时使用本地存储 (LocalMemoryStore)：向量按用户分区检索，
+    时间衰减以向量化方式计算，访问计数在后台批量写回，超出上限的旧记忆被压缩
+    """
     
-    def __init__(self, vector_client=None, doc_client=None):
+    def __init__(
+        self,
+        vector_client=None,
+        doc_client=None,
+        store_path: Optional[str] = None,
+        decay_days: float = DEFAULT_DECAY_DAYS,
+        max_memories_per_user: int = DEFAULT_MAX_MEMORIES_PER_USER
+    ):
         self.vector_client = vector_client  # Milvus
         self.doc_client = doc_client        # MongoDB
         self.collection_name = "user_memories"
+        self.decay_days = decay_days
+        self.max_memories_per_user = max_memories_per_user
+        self.local_store = None
+        if vector_client is None or doc_client is None:
+            self.local_store = LocalMemoryStore(store_path or DEFAULT_MEMORY_STORE_PATH)
+        # 记忆存在索引: 用户ID -> 长期记忆条数，写入和压缩时维护
+        self._memory_counts: "OrderedDict[str, int]" = OrderedDict()
+        # 待写回的访问记录: 记忆ID -> (新增次数, 最后访问时间戳)
+        self._pending_access: Dict[str, Tuple[int, float]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
         self.logger = logging.getLogger(__name__)
     
     async def store_memory(self, memory_item: MemoryItem):
         """存储长期记忆"""
         try:
+            if self.local_store is not None:
+                await asyncio.to_thread(self._store_local, memory_item)
+                return
+            
             # 存储向量到Milvus
             if self.vector_client:
                 await self._store_vector(memory_item)
@@ -140,6 +221,44 @@ class LongTermMemory:
                 message=f"存储长期记忆失败: {str(e)}"
             )
     
+    def _store_local(self, memory_item: MemoryItem):
+        """写入本地存储，超出每用户上限时压缩"""
+        record = {
+            "id": memory_item.id,
+            "user_id": memory_item.user_id,
+            "content": memory_item.content,
+            "summary": memory_item.summary,
+            "importance_score": memory_item.importance_score,
+            "created_at": memory_item.created_at.timestamp(),
+            "accessed_at": memory_item.accessed_at.timestamp(),
+            "access_count": memory_item.access_count,
+            "tags": memory_item.tags,
+            "metadata": memory_item.metadata
+        }
+        self.local_store.add(record, memory_item.embedding)
+        if self.local_store.count(memory_item.user_id) > self.max_memories_per_user:
+            self._compact_local(memory_item.user_id)
+        else:
+            self._set_memory_count(memory_item.user_id, self.local_store.count(memory_item.user_id))
+    
+    def _set_memory_count(self, user_id: str, count: int):
+        self._memory_counts[user_id] = count
+        self._memory_counts.move_to_end(user_id)
+        while len(self._memory_counts) > DEFAULT_PRESENCE_CACHE_SIZE:
+            self._memory_counts.popitem(last=False)
+    
+    async def has_memories(self, user_id: str) -> bool:
+        """用户是否有长期记忆；没有时调用方可跳过查询嵌入 (外部存储无法廉价判断，视为有)"""
+        if self.local_store is None:
+            return True
+        count = self._memory_counts.get(user_id)
+        if count is None:
+            count = await asyncio.to_thread(self.local_store.count, user_id)
+            self._set_memory_count(user_id, count)
+        else:
+            self._memory_counts.move_to_end(user_id)
+        return count > 0
+    
     async def _store_vector(self, memory_item: MemoryItem):
         """存储向量数据"""
         # TODO: 实现Milvus存储逻辑
@@ -156,17 +275,23 @@ class LongTermMemory:
         query_embedding: List[float], 
         top_k: int = 3
     ) -> List[MemoryItem]:
-        """检索相关记忆"""
+        """检索相关记忆 (按相似度召回候选，再按相似度 x 衰减后重要性排序)"""
         try:
             # 从向量数据库检索
-            similar_ids = await self._vector_search(query_embedding, top_k, user_id)
+            similar = await self._vector_search(query_embedding, top_k * MEMORY_CANDIDATE_FACTOR, user_id)
+            if not similar:
+                return []
+            similarities = dict(similar)
             
             # 从文档数据库获取详细信息
-            memories = await self._get_memory_details(similar_ids)
+            memories = await self._get_memory_details([memory_id for memory_id, _ in similar])
             
             # 应用时间衰减
-            scored_memories = self._apply_time_decay(memories)
+            scored_memories = self._apply_time_decay(
+                memories, [similarities[memory.id] for memory in memories]
+            )[:top_k]
             
+            self._record_access(scored_memories)
             return scored_memories
             
         except Exception as e:
@@ -176,32 +301,107 @@ class LongTermMemory:
                 message=f"检索记忆失败: {str(e)}"
             )
     
-    async def _vector_search(self, embedding: List[float], top_k: int, user_id: str) -> List[str]:
-        """向量搜索"""
+    async def _vector_search(self, embedding: List[float], top_k: int, user_id: str) -> List[Tuple[str, float]]:
+        """向量搜索，返回 (记忆ID, 相似度)"""
+        if self.local_store is not None:
+            return await asyncio.to_thread(self.local_store.search, user_id, embedding, top_k)
         # TODO: 实现Milvus向量搜索
         return []
     
     async def _get_memory_details(self, memory_ids: List[str]) -> List[MemoryItem]:
         """获取记忆详细信息"""
+        if self.local_store is not None:
+            records = await asyncio.to_thread(self.local_store.get_many, memory_ids)
+            return [
+                MemoryItem(
+                    id=record["id"],
+                    user_id=record["user_id"],
+                    content=record["content"],
+                    summary=record["summary"],
+                    embedding=[],
+                    importance_score=record["importance_score"],
+                    created_at=datetime.fromtimestamp(record["created_at"]),
+                    accessed_at=datetime.fromtimestamp(record["accessed_at"]),
+                    access_count=record["access_count"],
+                    tags=record["tags"],
+                    metadata=record["metadata"]
+                )
+                for record in records
+            ]
         # TODO: 从MongoDB获取记忆详细信息
         return []
     
-    def _apply_time_decay(self, memories: List[MemoryItem]) -> List[MemoryItem]:
-        """应用时间衰减"""
-        current_time = datetime.now()
+    def _apply_time_decay(
+        self,
+        memories: List[MemoryItem],
+        similarities: Optional[List[float]] = None
+    ) -> List[MemoryItem]:
+        """应用时间衰减 (向量化计算；给出相似度时按相似度 x 衰减后重要性排序)"""
+        if not memories:
+            return memories
         
-        for memory in memories:
-            # 计算时间差（天数）
-            time_diff = (current_time - memory.created_at).days
-            
-            # 应用指数衰减 (半衰期30天)
-            decay_factor = 0.5 ** (time_diff / 30)
-            memory.importance_score *= decay_factor
+        # 应用指数衰减 (默认半衰期30天)
+        created_at = np.array([memory.created_at.timestamp() for memory in memories])
+        importance = np.array([memory.importance_score for memory in memories])
+        scores = importance * decay_factors(created_at, datetime.now().timestamp(), self.decay_days)
+        for memory, score in zip(memories, scores):
+            memory.importance_score = float(score)
         
         # 按重要性分数排序
-        memories.sort(key=lambda x: x.importance_score, reverse=True)
-        
-        return memories
+        ranking = scores if similarities is None else scores * np.asarray(similarities)
+        order = np.argsort(-ranking, kind="stable")
+        return [memories[i] for i in order]
+    
+    def _record_access(self, memories: List[MemoryItem]):
+        """记录访问，在后台批量写回"""
+        if self.local_store is None or not memories:
+            return
+        now = datetime.now()
+        for memory in memories:
+            memory.access_count += 1
+            memory.accessed_at = now
+            count, _ = self._pending_access.get(memory.id, (0, 0.0))
+            self._pending_access[memory.id] = (count + 1, now.timestamp())
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after(ACCESS_FLUSH_INTERVAL))
+    
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self._write_access()
+    
+    async def flush_access(self):
+        """立即写回待更新的访问记录 (关闭时调用)"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._write_access()
+    
+    async def _write_access(self):
+        if not self._pending_access:
+            return
+        updates, self._pending_access = self._pending_access, {}
+        try:
+            await asyncio.to_thread(self.local_store.record_access, updates)
+        except Exception as e:
+            self.logger.warning(f"写回记忆访问记录失败: {e}")
+    
+    def _compact_local(self, user_id: str) -> int:
+        removed = self.local_store.compact(
+            user_id,
+            now=datetime.now().timestamp(),
+            half_life_days=self.decay_days,
+            max_memories=self.max_memories_per_user,
+            min_score=DEFAULT_MIN_MEMORY_SCORE
+        )
+        self._set_memory_count(user_id, self.local_store.count(user_id))
+        return removed
+    
+    async def compact(self, user_id: str) -> int:
+        """压缩用户的长期记忆: 删除衰减后不再重要的记忆，并保留得分最高的 max_memories_per_user 条"""
+        if self.local_store is None:
+            return 0
+        return await asyncio.to_thread(self._compact_local, user_id)
 
 
 class MemorySummarizer:
@@ -249,6 +449,34 @@ class MemorySummarizer:
                 message=f"记忆压缩失败: {str(e)}"
             )
     
+    async def update_summary(
+        self,
+        previous_summary: str,
+        new_turns: List[Dict[str, str]],
+        user_id: str
+    ) -> str:
+        """把新的对话轮次增量合并进已有摘要"""
+        history_text = self._format_history(new_turns)
+        messages = [
+            {
+                "role": "system",
+                "content": "你是一个记忆压缩助手。请把新的对话内容合并进已有摘要，输出一段更新后的简洁摘要，保留用户背景、目标和已给出的关键建议。"
+            },
+            {
+                "role": "user",
+                "content": f"已有摘要：\n{previous_summary or '无'}\n\n新的对话：\n{history_text}"
+            }
+        ]
+        
+        response = await self.llm_manager.chat(
+            tenant_id=user_id,
+            model_name="gpt-3.5-turbo",
+            messages=messages,
+            temperature=0,
+            max_tokens=300
+        )
+        return response.content or previous_summary
+    
     def _format_history(self, history: List[Dict[str, str]]) -> str:
         """格式化历史记录"""
         formatted = []
@@ -269,11 +497,23 @@ class MemoryBank:
         embedding_manager,
         redis_client=None,
         vector_client=None,
-        doc_client=None
+        doc_client=None,
+        session_ttl: int = DEFAULT_SESSION_TTL,
+        session_spill_path: Optional[str] = None,
+        recent_turns: int = DEFAULT_RECENT_TURNS,
+        token_counter: TokenCounter = token_counter,
+        memory_store_path: Optional[str] = None,
+        decay_days: float = DEFAULT_DECAY_DAYS
     ):
-        self.working_memory = WorkingMemory(redis_client)
-        self.long_term_memory = LongTermMemory(vector_client, doc_client)
+        self.working_memory = WorkingMemory(
+            redis_client, session_ttl=session_ttl, spill_path=session_spill_path
+        )
+        self.long_term_memory = LongTermMemory(
+            vector_client, doc_client, store_path=memory_store_path, decay_days=decay_days
+        )
         self.summarizer = MemorySummarizer(llm_manager)
+        self.rolling_summarizer = RollingSummarizer(self.working_memory, self.summarizer, recent_turns)
+        self.token_counter = token_counter
         self.embedding_manager = embedding_manager
         self.logger = logging.getLogger(__name__)
     
@@ -282,40 +522,64 @@ class MemoryBank:
         session_id: str, 
         user_id: str, 
         query: str, 
-        top_k: int = 3
+        top_k: int = 3,
+        history_turns: int = DEFAULT_CONTEXT_TURNS,
+        token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET
     ) -> MemoryContext:
-        """获取完整的记忆上下文"""
+        """
+        获取记忆上下文，总大小不超过 token_budget
+        
+        更早的轮次以滚动摘要代替，相关记忆其次，剩余预算从最新一轮往前填入原文
+        (最多 history_turns 轮，且至少保留最新一轮)
+        """
         try:
             # 获取短期记忆 (当前会话)
-            session_history = await self.working_memory.get_session_history(session_id)
+            recent_history = await self.working_memory.get_session_history(session_id, last_n=history_turns)
+            summary = self.rolling_summarizer.get_summary(session_id)
+            # 尚未折叠进摘要的旧轮次暂时作为原文候选
+            pending, recent = self.rolling_summarizer.split(recent_history, summary)
+            self.rolling_summarizer.maybe_schedule(session_id, user_id, recent_history)
+            candidates = pending + recent
             
-            # 获取长期记忆 (相关历史记忆)
-            query_embedding = await self.embedding_manager.embed_texts(
-                tenant_id=user_id,
-                model_name="text-embedding-ada-002",
-                texts=[query]
-            )
+            # 获取长期记忆 (相关历史记忆)；没有长期记忆的用户不计算查询嵌入
+            relevant_memories = []
+            if await self.long_term_memory.has_memories(user_id):
+                # 查询嵌入在请求作用域内与知识检索共享
+                query_embedding = await embed_query(
+                    self.embedding_manager, user_id, "text-embedding-ada-002", query
+                )
+                relevant_memories = await self.long_term_memory.retrieve_memories(
+                    user_id=user_id,
+                    query_embedding=query_embedding,
+                    top_k=top_k
+                )
             
-            relevant_memories = await self.long_term_memory.retrieve_memories(
-                user_id=user_id,
-                query_embedding=query_embedding[0],
-                top_k=top_k
+            # 按预算依次放入滚动摘要、相关记忆、最近轮次原文
+            used = self.token_counter.count(summary.text)
+            selected_memories = []
+            for memory in relevant_memories:
+                tokens = self.token_counter.count(memory.summary)
+                if used + tokens > token_budget:
+                    break
+                selected_memories.append(memory)
+                used += tokens
+            session_history, history_tokens = fit_turns_to_budget(
+                candidates, token_budget - used, self.token_counter
             )
             
             # 生成上下文摘要
             context_summary = await self._generate_context_summary(
                 session_history, 
-                relevant_memories
+                selected_memories,
+                summary.text
             )
             
-            # 估算token数量
-            total_tokens = self._estimate_tokens(session_history, relevant_memories)
-            
             return MemoryContext(
                 session_history=session_history,
-                relevant_memories=[mem.__dict__ for mem in relevant_memories],
+                relevant_memories=[mem.__dict__ for mem in selected_memories],
                 context_summary=context_summary,
-                total_tokens=total_tokens
+                total_tokens=used + history_tokens,
+                session_summary=summary.text
             )
             
         except Exception as e:
@@ -332,8 +596,12 @@ class MemoryBank:
         human_message: str, 
         ai_message: str
     ):
-        """添加对话交互"""
+        """添加对话交互，并在后台把超出最近 K 轮的旧轮次折叠进滚动摘要"""
         await self.working_memory.add_interaction(session_id, human_message, ai_message)
+        try:
+            await self.rolling_summarizer.on_interaction(session_id, user_id)
+        except Exception as e:
+            self.logger.warning(f"检查滚动摘要失败: {e}")
     
     async def end_session(self, session_id: str, user_id: str):
         """结束会话，触发记忆压缩"""
@@ -346,6 +614,7 @@ class MemoryBank:
                 asyncio.create_task(self._compress_and_store(session_history, user_id))
             
             # 清除短期记忆
+            self.rolling_summarizer.discard(session_id)
             await self.working_memory.clear_session(session_id)
             
         except Exception as e:
@@ -388,14 +657,18 @@ class MemoryBank:
     async def _generate_context_summary(
         self, 
         session_history: List[Dict], 
-        relevant_memories: List[MemoryItem]
+        relevant_memories: List[MemoryItem],
+        session_summary: str = ""
     ) -> str:
         """生成上下文摘要"""
-        if not session_history and not relevant_memories:
+        if not session_history and not relevant_memories and not session_summary:
             return "无相关历史上下文"
         
         summary_parts = []
         
+        if session_summary:
+            summary_parts.append(f"早期对话摘要: {session_summary}")
+        
         if session_history:
             summary_parts.append(f"当前会话包含 {len(session_history)} 轮对话")
         
@@ -405,18 +678,10 @@ class MemoryBank:
         return "；".join(summary_parts)
     
     def _estimate_tokens(self, session_history: List[Dict], relevant_memories: List[MemoryItem]) -> int:
-        """估算token数量"""
-        # 简单的token估算 (1个字符约等于0.75个token)
-        total_chars = 0
-        
-        for item in session_history:
-            total_chars += len(item.get("human", ""))
-            total_chars += len(item.get("assistant", ""))
-        
-        for memory in relevant_memories:
-            total_chars += len(memory.summary)
-        
-        return int(total_chars * 0.75)
+        """计算token数量"""
+        total_tokens = sum(self.token_counter.count_turn(item) for item in session_history)
+        total_tokens += sum(self.token_counter.count(memory.summary) for memory in relevant_memories)
+        return total_tokens
 
 
 # 全局记忆银行实例
@@ -0,0 +1,178 @@
+"""
+本地长期记忆存储 - 无需 Milvus/MongoDB 的单机长期记忆
+向量复用 RAG 的本地向量索引 (按用户分区，内存映射 + IVF)，
+记忆元数据存放在 SQLite 文件中，按 user_id 索引，支持访问计数批量更新与旧记忆压缩
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ...data_communication.rag.vector_index import LocalVectorIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_STORE_PATH = os.getenv("MEMORY_STORE_PATH", "vector_store/memory_store")
+
+METADATA_FILE = "memories.db"
+VECTORS_DIR = "vectors"
+
+_COLUMNS = (
+    "id", "user_id", "content", "summary", "importance_score",
+    "created_at", "accessed_at", "access_count", "tags", "metadata"
+)
+
+
+def decay_factors(created_at: np.ndarray, now: float, half_life_days: float) -> np.ndarray:
+    """按整天数计算指数衰减系数 (created_at 与 now 为秒级时间戳)"""
+    days = np.floor((now - created_at) / 86400.0)
+    return 0.5 ** (days / half_life_days)
+
+
+class LocalMemoryStore:
+    """
+    本地长期记忆存储
+
+    目录结构:
+        memories.db  记忆元数据 (SQLite，user_id 上有索引)
+        vectors/     按用户分区的本地向量索引
+    """
+
+    def __init__(self, root_path: str = DEFAULT_MEMORY_STORE_PATH):
+        self.root_path = root_path
+        self.index = LocalVectorIndex(os.path.join(root_path, VECTORS_DIR))
+        self.db_path = os.path.join(root_path, METADATA_FILE)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.root_path, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS memories (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    importance_score REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    access_count INTEGER NOT NULL,
+                    tags TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_user ON memories (user_id)")
+        return self._conn
+
+    @staticmethod
+    def _row_to_record(row: Sequence[Any]) -> Dict[str, Any]:
+        record = dict(zip(_COLUMNS, row))
+        record["tags"] = json.loads(record["tags"])
+        record["metadata"] = json.loads(record["metadata"])
+        return record
+
+    # ---------- 写入 ----------
+
+    def add(self, record: Dict[str, Any], embedding: Sequence[float]):
+        """写入一条记忆 (record 含 _COLUMNS 中的全部字段，时间为秒级时间戳)"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                f"INSERT OR REPLACE INTO memories ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                tuple(
+                    json.dumps(record[column], ensure_ascii=False) if column in ("tags", "metadata")
+                    else record[column]
+                    for column in _COLUMNS
+                )
+            )
+            conn.commit()
+        self.index.add(record["user_id"], [record["id"]], [embedding], [""], [{}])
+
+    def record_access(self, updates: Dict[str, Tuple[int, float]]):
+        """批量更新访问次数和最后访问时间: {记忆ID: (新增次数, 访问时间)}"""
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE memories SET access_count = access_count + ?, accessed_at = MAX(accessed_at, ?) WHERE id = ?",
+                [(count, accessed_at, memory_id) for memory_id, (count, accessed_at) in updates.items()]
+            )
+            conn.commit()
+
+    def delete(self, user_id: str, ids: List[str]) -> int:
+        if not ids:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                conn.execute(f"DELETE FROM memories WHERE id IN ({','.join('?' * len(batch))})", batch)
+            conn.commit()
+        return self.index.delete(user_id, ids)
+
+    # ---------- 读取 ----------
+
+    def count(self, user_id: str) -> int:
+        # 尚未写入过记忆时不创建数据库文件
+        if self._conn is None and not os.path.exists(self.db_path):
+            return 0
+        with self._lock:
+            conn = self._connection()
+            return conn.execute("SELECT COUNT(*) FROM memories WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def get_many(self, ids: List[str]) -> List[Dict[str, Any]]:
+        """按ID获取记忆，结果与输入同序 (不存在的ID跳过)"""
+        if not ids:
+            return []
+        with self._lock:
+            conn = self._connection()
+            placeholders = ",".join("?" * len(ids))
+            found = {
+                row[0]: self._row_to_record(row)
+                for row in conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM memories WHERE id IN ({placeholders})", ids)
+            }
+        return [found[memory_id] for memory_id in ids if memory_id in found]
+
+    def search(self, user_id: str, embedding: Sequence[float], top_k: int) -> List[Tuple[str, float]]:
+        """在用户自己的分区内检索，返回 (记忆ID, 余弦相似度)"""
+        return [(record["id"], score) for record, score in self.index.search(user_id, embedding, top_k)]
+
+    # ---------- 压缩 ----------
+
+    def compact(
+        self,
+        user_id: str,
+        now: float,
+        half_life_days: float,
+        max_memories: int,
+        min_score: float
+    ) -> int:
+        """删除衰减后重要性低于 min_score 的记忆，并只保留得分最高的 max_memories 条"""
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT id, importance_score, created_at FROM memories WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        if not rows:
+            return 0
+
+        ids = [row[0] for row in rows]
+        importance = np.array([row[1] for row in rows], dtype=np.float64)
+        created_at = np.array([row[2] for row in rows], dtype=np.float64)
+        scores = importance * decay_factors(created_at, now, half_life_days)
+
+        order = np.argsort(-scores, kind="stable")
+        keep = order[:max_memories]
+        keep = keep[scores[keep] >= min_score]
+        removed_rows = np.setdiff1d(np.arange(len(ids)), keep)
+        removed = [ids[row] for row in removed_rows]
+        if removed:
+            self.delete(user_id, removed)
+            logger.info(f"用户 {user_id} 的长期记忆已压缩: 删除 {len(removed)} 条, 剩余 {len(keep)} 条")
+        return len(removed)
@@ -0,0 +1,295 @@
+"""
+本地会话存储 - 未配置 Redis 时 WorkingMemory 的进程内存储
+按会话 LRU + TTL 淘汰，限制总字节数和每个会话的轮数；
+可选把被淘汰的会话溢出到本地 SQLite 文件，再次访问时加载回内存，
+溢出文件每写入一定次数清理一次过期会话，并限制总行数
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+DEFAULT_SESSION_TTL = 24 * 3600  # 24小时
+DEFAULT_MAX_TURNS = 200
+DEFAULT_SPILL_MAX_ROWS = 100000
+DEFAULT_SPILL_PURGE_INTERVAL = 1000  # 每溢出多少个会话清理一次溢出文件
+
+
+class _Session:
+    """内存中的一个会话"""
+
+    __slots__ = ("turns", "sizes", "bytes", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.turns: deque = deque()
+        self.sizes: deque = deque()
+        self.bytes = 0
+        self.expires_at = expires_at
+
+
+class SQLiteSessionSpill:
+    """被淘汰会话的 SQLite 溢出文件 (超过 max_rows 时清理会丢弃最早过期的会话)"""
+
+    def __init__(self, path: str, max_rows: int = DEFAULT_SPILL_MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, turns TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+        return self._conn
+
+    def _save(self, key: str, turns: List[Dict[str, Any]], expires_at: float):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, turns, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(turns, ensure_ascii=False), expires_at)
+            )
+            conn.commit()
+
+    def _pop(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT turns, expires_at FROM sessions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            conn.commit()
+            return json.loads(row[0]), row[1]
+
+    def _delete(self, key: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            conn.commit()
+
+    def _purge(self, now: float) -> tuple:
+        with self._lock:
+            conn = self._connection()
+            expired = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+            overflow = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_rows
+            dropped = 0
+            if overflow > 0:
+                dropped = conn.execute(
+                    "DELETE FROM sessions WHERE key IN (SELECT key FROM sessions ORDER BY expires_at LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+            conn.commit()
+            return expired, dropped
+
+    def _count(self) -> int:
+        if self._conn is None and not os.path.exists(self.path):
+            return 0
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    async def save(self, key: str, turns: List[Dict[str, Any]], expires_at: float):
+        await asyncio.to_thread(self._save, key, turns, expires_at)
+
+    async def pop(self, key: str) -> Optional[tuple]:
+        """取出并删除溢出的会话，返回 (轮次列表, 过期时间)"""
+        return await asyncio.to_thread(self._pop, key)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    async def purge(self, now: float) -> tuple:
+        """删除过期会话，并把行数压到 max_rows 以内，返回 (过期删除数, 超限丢弃数)"""
+        return await asyncio.to_thread(self._purge, now)
+
+    async def count(self) -> int:
+        return await asyncio.to_thread(self._count)
+
+
+class LocalSessionStore:
+    """
+    有界的本地会话存储
+
+    会话按最近访问排序 (读写都会续期)，超过会话数或总字节上限时淘汰最久未访问的会话；
+    配置了溢出文件时淘汰的会话写入 SQLite，否则直接丢弃；
+    每溢出 spill_purge_interval 个会话清理一次溢出文件，因此文件行数最多超出 spill_max_rows 该数量。
+    读写操作持有同一把锁: 从溢出文件加载和写入溢出文件都会 await，
+    不加锁时并发写入同一个已溢出的会话会用空会话覆盖刚加载回来的历史
+    (不配置溢出文件时临界区内没有 await，锁不会产生等待)
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_SESSION_TTL,
+        max_turns: int = DEFAULT_MAX_TURNS,
+        spill_path: Optional[str] = None,
+        spill_max_rows: int = DEFAULT_SPILL_MAX_ROWS,
+        spill_purge_interval: int = DEFAULT_SPILL_PURGE_INTERVAL
+    ):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.spill = SQLiteSessionSpill(spill_path, spill_max_rows) if spill_path else None
+        self.spill_purge_interval = spill_purge_interval
+        self._spills_since_purge = 0
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self._lock = asyncio.Lock()
+        self.stats = {
+            "evictions": 0, "expirations": 0, "spilled": 0, "spill_loads": 0, "spill_dropped": 0, "trimmed_turns": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _drop(self, key: str) -> _Session:
+        session = self._sessions.pop(key)
+        self._bytes -= session.bytes
+        return session
+
+    def _purge_expired(self, now: float):
+        # 访问会续期并移到末尾，因此过期会话都集中在头部
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if session.expires_at > now:
+                break
+            self._drop(key)
+            self.stats["expirations"] += 1
+
+    async def _evict(self, keep: str):
+        while len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes:
+            key = next(iter(self._sessions))
+            if key == keep:
+                # 单个会话超过字节上限时只保留它自己
+                break
+            session = self._drop(key)
+            self.stats["evictions"] += 1
+            if self.spill is not None:
+                try:
+                    await self.spill.save(key, list(session.turns), session.expires_at)
+                    self.stats["spilled"] += 1
+                    self._spills_since_purge += 1
+                except Exception as e:
+                    logger.warning(f"会话溢出写入失败: {e}")
+        if self.spill is not None and self._spills_since_purge >= self.spill_purge_interval:
+            await self._purge_spill(time.time())
+
+    async def _load(self, key: str, now: float) -> Optional[_Session]:
+        session = self._sessions.get(key)
+        if session is not None:
+            if session.expires_at <= now:
+                self._drop(key)
+                self.stats["expirations"] += 1
+                return None
+            session.expires_at = now + self.ttl
+            self._sessions.move_to_end(key)
+            return session
+
+        if self.spill is None:
+            return None
+        try:
+            spilled = await self.spill.pop(key)
+        except Exception as e:
+            logger.warning(f"会话溢出读取失败: {e}")
+            return None
+        if spilled is None:
+            return None
+        turns, expires_at = spilled
+        if expires_at <= now:
+            self.stats["expirations"] += 1
+            return None
+        self.stats["spill_loads"] += 1
+        session = _Session(now + self.ttl)
+        for turn in turns[-self.max_turns:]:
+            self._push(session, turn)
+        self._sessions[key] = session
+        await self._evict(keep=key)
+        return session
+
+    def _push(self, session: _Session, turn: Dict[str, Any]):
+        size = len(json.dumps(turn, ensure_ascii=False).encode("utf-8"))
+        session.turns.append(turn)
+        session.sizes.append(size)
+        session.bytes += size
+        self._bytes += size
+        while len(session.turns) > self.max_turns:
+            session.turns.popleft()
+            removed = session.sizes.popleft()
+            session.bytes -= removed
+            self._bytes -= removed
+            self.stats["trimmed_turns"] += 1
+
+    async def append(self, key: str, turn: Dict[str, Any]):
+        """追加一轮对话"""
+        async with self._lock:
+            now = time.time()
+            self._purge_expired(now)
+            session = await self._load(key, now)
+            if session is None:
+                session = self._sessions[key] = _Session(now + self.ttl)
+            self._push(session, turn)
+            await self._evict(keep=key)
+
+    async def get(self, key: str, last_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """读取会话 (last_n 不为空时只返回最近 last_n 轮)"""
+        async with self._lock:
+            session = await self._load(key, time.time())
+            if session is None:
+                return []
+            turns = session.turns
+            if last_n and last_n < len(turns):
+                return [turns[i] for i in range(len(turns) - last_n, len(turns))]
+            return list(turns)
+
+    async def length(self, key: str) -> int:
+        async with self._lock:
+            session = await self._load(key, time.time())
+            return len(session.turns) if session is not None else 0
+
+    async def delete(self, key: str):
+        async with self._lock:
+            if key in self._sessions:
+                self._drop(key)
+            if self.spill is not None:
+                await self.spill.delete(key)
+
+    async def _purge_spill(self, now: float):
+        self._spills_since_purge = 0
+        try:
+            expired, dropped = await self.spill.purge(now)
+        except Exception as e:
+            logger.warning(f"会话溢出文件清理失败: {e}")
+            return
+        self.stats["expirations"] += expired
+        self.stats["spill_dropped"] += dropped
+        if dropped:
+            logger.info(f"会话溢出文件超过 {self.spill.max_rows} 行，丢弃最早过期的 {dropped} 个会话")
+
+    async def purge(self):
+        """清理内存和溢出文件中的过期会话"""
+        async with self._lock:
+            now = time.time()
+            self._purge_expired(now)
+            if self.spill is not None:
+                await self._purge_spill(now)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "sessions": len(self._sessions), "bytes": self._bytes}
@@ -16,8 +16,11 @@ import logging
 
 from app.core.config import Settings
 from .ai_foundation.llm.manager import ModelConfig, ModelProvider, llm_manager, embedding_manager
+from .ai_foundation.llm.embedding_cache import RedisEmbeddingStore, SQLiteEmbeddingStore
+from .ai_foundation.llm.completion_cache import RedisCompletionStore
 from .ai_foundation.memory.memory_bank import memory_bank
 from .ai_foundation.agents.agent_factory import agent_factory
+from .ai_foundation.agents.response_cache import response_cache
 from .data_communication.rag.rag_manager import rag_manager
 
 
@@ -41,6 +44,11 @@ class V2Config:
     # 记忆系统配置
     memory_session_ttl: int = 24 * 3600  # 24小时
     memory_decay_days: int = 30  # 30天半衰期
+    # 未配置 Redis 时被淘汰的会话溢出到本地 SQLite 文件 (为空则直接丢弃)
+    session_spill_path: Optional[str] = None
+    
+    # 嵌入缓存配置 (未配置 Redis 时使用本地 SQLite 文件)
+    embedding_cache_path: Optional[str] = None
     
     # RAG配置
     default_chunk_size: int = 1000
@@ -66,7 +74,9 @@ class V2ConfigManager:
             milvus_host=os.getenv("MILVUS_HOST"),
             milvus_port=int(os.getenv("MILVUS_PORT", "19530")),
             mongodb_url=os.getenv("MONGODB_URL"),
-            elasticsearch_url=os.getenv("ELASTICSEARCH_URL")
+            elasticsearch_url=os.getenv("ELASTICSEARCH_URL"),
+            embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH"),
+            session_spill_path=os.getenv("SESSION_SPILL_PATH")
         )
         self.config = config
         return config
@@ -84,7 +94,9 @@ class V2ConfigManager:
             milvus_host=os.getenv("MILVUS_HOST"), 
             milvus_port=int(os.getenv("MILVUS_PORT", "19530")),
             mongodb_url=os.getenv("MONGODB_URL"),
-            elasticsearch_url=os.getenv("ELASTICSEARCH_URL")
+            elasticsearch_url=os.getenv("ELASTICSEARCH_URL"),
+            embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH"),
+            session_spill_path=os.getenv("SESSION_SPILL_PATH")
         )
         self.config = config
         return config
@@ -207,13 +219,23 @@ class V2ConfigManager:
             await llm_manager.initialize(llm_configs)
             await embedding_manager.initialize(embedding_configs)
             
+            # 嵌入与补全二级缓存: 优先 Redis (多实例共享)，其次本地 SQLite 文件
+            if clients.get('redis'):
+                embedding_manager.cache.store = RedisEmbeddingStore(clients['redis'])
+                llm_manager.completion_cache.store = RedisCompletionStore(clients['redis'])
+            elif self.config.embedding_cache_path:
+                embedding_manager.cache.store = SQLiteEmbeddingStore(self.config.embedding_cache_path)
+            
             # 初始化记忆系统
             memory_bank.__init__(
                 llm_manager=llm_manager,
                 embedding_manager=embedding_manager,
                 redis_client=clients.get('redis'),
                 vector_client=clients.get('milvus'),
-                doc_client=clients.get('mongodb')
+                doc_client=clients.get('mongodb'),
+                session_ttl=self.config.memory_session_ttl,
+                session_spill_path=self.config.session_spill_path,
+                decay_days=self.config.memory_decay_days
             )
             
             # 初始化RAG系统
@@ -223,6 +245,9 @@ class V2ConfigManager:
                 search_client=clients.get('elasticsearch')
             )
             
+            # 语义响应缓存使用同一嵌入管理器 (共享嵌入缓存)
+            response_cache.embedding_manager = embedding_manager
+            
             # 初始化智能体工厂
             agent_factory.llm_manager = llm_manager
             agent_factory.memory_bank = memory_bank
@@ -240,6 +265,14 @@ class V2ConfigManager:
             self.logger.error(f"❌ v2.0架构初始化失败: {e}")
             return False
     
+    async def shutdown_v2_architecture(self):
+        """关闭v2.0架构: 写回尚未落盘的长期记忆访问记录"""
+        try:
+            await memory_bank.long_term_memory.flush_access()
+            self.logger.info("✅ 长期记忆访问记录已写回")
+        except Exception as e:
+            self.logger.error(f"❌ 长期记忆访问记录写回失败: {e}")
+    
     def _print_config_summary(self, clients: Dict[str, Any]):
         """打印配置摘要"""
         print("\n🎯 PeerPortal AI智能体架构v2.0 配置摘要")
@@ -282,4 +315,9 @@ async def init_v2_from_settings(settings: Settings) -> bool:
 async def init_v2_from_env() -> bool:
     """从环境变量初始化v2架构"""
     config_manager.load_from_env()
-    return await config_manager.initialize_v2_architecture() 
\ No newline at end of file
+    return await config_manager.initialize_v2_architecture()
+
+
+async def shutdown_v2():
+    """关闭v2架构 (应用退出时调用)"""
+    await config_manager.shutdown_v2_architecture() 
\ No newline at end of file
@@ -0,0 +1,378 @@
+"""
+本地关键词索引 - 无需 Elasticsearch 的 BM25 倒排索引
+中文按字二元组切分、英文和数字按词切分；倒排表按文档号差值 + 词频做变长整数压缩；
+按租户分段，支持增量写入和墓碑删除，检索时使用 MaxScore 剪枝求 top-k
+"""
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .vector_index import DEFAULT_TENANT, _matches
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 墓碑占比超过该值时自动压缩
+COMPACT_TOMBSTONE_RATIO = 0.3
+
+DOCS_FILE = "docs.jsonl"
+
+_TOKEN_PATTERN = re.compile(
+    r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+|[a-z0-9]+(?:[._+-][a-z0-9]+)*'
+)
+_CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中英文混合分词
+
+    中日韩连续字符切成相邻二元组 (单字时保留单字)，其余按英文单词/数字切分并转小写，
+    例如 "申请MIT的CS硕士" -> ["申请", "mit", "的", "cs", "硕士"]
+    """
+    tokens: List[str] = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+class PostingList:
+    """
+    压缩倒排表
+
+    每个文档编码为 (文档号差值, 词频) 两个变长整数；文档号单调递增，追加写入无需重排
+    """
+
+    __slots__ = ("data", "df", "last_doc", "max_tf", "_decoded")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.df = 0
+        self.last_doc = -1
+        self.max_tf = 0
+        self._decoded: Optional[Tuple[array, array]] = None
+
+    def append(self, doc: int, tf: int):
+        _encode_varint(doc - self.last_doc - 1 if self.df else doc, self.data)
+        _encode_varint(tf, self.data)
+        self.last_doc = doc
+        self.df += 1
+        self.max_tf = max(self.max_tf, tf)
+        self._decoded = None
+
+    def decode(self) -> Tuple[array, array]:
+        """解码为文档号和词频数组 (结果缓存到下次追加)"""
+        if self._decoded is None:
+            docs, tfs = array('I'), array('I')
+            doc, value, shift, is_tf = -1, 0, 0, False
+            for byte in self.data:
+                value |= (byte & 0x7F) << shift
+                if byte & 0x80:
+                    shift += 7
+                    continue
+                if is_tf:
+                    tfs.append(value)
+                else:
+                    doc = value if doc < 0 else doc + value + 1
+                    docs.append(doc)
+                is_tf = not is_tf
+                value, shift = 0, 0
+            self._decoded = (docs, tfs)
+        return self._decoded
+
+
+class KeywordSegment:
+    """
+    单个租户的关键词分段
+
+    docs.jsonl 为追加写入的操作日志 (add / delete)，加载时重放日志重建倒排表；
+    墓碑过多时重写日志只保留活跃文档
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: List[Dict[str, Any]] = []
+        self.doc_lengths = array('I')
+        self.live = bytearray()
+        self.doc_by_id: Dict[str, int] = {}
+        self.postings: Dict[str, PostingList] = {}
+        self.total_length = 0
+        self.lock = threading.RLock()
+        self.logger = logging.getLogger(__name__)
+        if os.path.exists(self._file(DOCS_FILE)):
+            self._load()
+
+    def __len__(self) -> int:
+        """活跃文档数"""
+        return len(self.doc_by_id)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        path = self._file(DOCS_FILE)
+        valid_bytes = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的尾部记录
+                    break
+                valid_bytes += len(line)
+                if op["op"] == "add":
+                    self._index(op["id"], op["content"], op.get("metadata") or {})
+                else:
+                    self._remove(op["id"])
+        if os.path.getsize(path) > valid_bytes:
+            with open(path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+    def _append_log(self, ops: List[Dict[str, Any]]):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(DOCS_FILE), 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(op, ensure_ascii=False) + '\n' for op in ops))
+
+    # ---------- 写入 ----------
+
+    def _index(self, chunk_id: str, content: str, metadata: Dict[str, Any]):
+        self._remove(chunk_id)
+        doc = len(self.records)
+        terms = Counter(tokenize(content))
+        length = sum(terms.values())
+        self.records.append({"id": chunk_id, "content": content, "metadata": metadata})
+        self.doc_lengths.append(length)
+        self.live.append(1)
+        self.doc_by_id[chunk_id] = doc
+        self.total_length += length
+        for term, tf in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = PostingList()
+            posting.append(doc, tf)
+
+    def _remove(self, chunk_id: str) -> bool:
+        doc = self.doc_by_id.pop(chunk_id, None)
+        if doc is None:
+            return False
+        self.live[doc] = 0
+        self.total_length -= self.doc_lengths[doc]
+        return True
+
+    def add(self, ids: Sequence[str], contents: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> int:
+        """写入文档块，已存在的ID会被覆盖"""
+        with self.lock:
+            ops = [
+                {"op": "add", "id": chunk_id, "content": content, "metadata": metadata}
+                for chunk_id, content, metadata in zip(ids, contents, metadatas)
+            ]
+            self._append_log(ops)
+            for op in ops:
+                self._index(op["id"], op["content"], op["metadata"])
+            self._maybe_compact()
+            return len(ops)
+
+    def delete(self, ids: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None) -> int:
+        """按ID或元数据过滤条件删除"""
+        with self.lock:
+            targets = set(ids or [])
+            if filters:
+                targets.update(
+                    chunk_id for chunk_id, doc in self.doc_by_id.items()
+                    if _matches(self.records[doc]["metadata"], filters)
+                )
+            targets = [chunk_id for chunk_id in targets if chunk_id in self.doc_by_id]
+            if not targets:
+                return 0
+            self._append_log([{"op": "delete", "id": chunk_id} for chunk_id in targets])
+            for chunk_id in targets:
+                self._remove(chunk_id)
+            self._maybe_compact()
+            return len(targets)
+
+    def _maybe_compact(self):
+        dead = len(self.records) - len(self.doc_by_id)
+        if dead and dead > len(self.records) * COMPACT_TOMBSTONE_RATIO:
+            self.compact()
+
+    def compact(self):
+        """重写日志并重建倒排表，只保留活跃文档"""
+        with self.lock:
+            live_records = [self.records[doc] for doc in sorted(self.doc_by_id.values())]
+            tmp_path = self._file(DOCS_FILE + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in live_records:
+                    f.write(json.dumps({"op": "add", **record}, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self._file(DOCS_FILE))
+
+            self.records, self.doc_lengths, self.live = [], array('I'), bytearray()
+            self.doc_by_id, self.postings, self.total_length = {}, {}, 0
+            for record in live_records:
+                self._index(record["id"], record["content"], record["metadata"])
+            self.logger.info(f"关键词分段已压缩: {self.path} ({len(live_records)} 个文档)")
+
+    # ---------- 检索 ----------
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """BM25 检索，MaxScore 剪枝: 累计上界不足以进入 top-k 的词只在候选文档上补算"""
+        with self.lock:
+            n_docs = len(self.doc_by_id)
+            if n_docs == 0 or top_k <= 0:
+                return []
+            avg_length = max(self.total_length / n_docs, 1.0)
+            k1, b = BM25_K1, BM25_B
+
+            terms = []
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                df = min(posting.df, n_docs)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                # 文档长度为 0 时归一化因子最小 (1 - b)，由此得到该词得分上界
+                upper = idf * (k1 + 1) * posting.max_tf / (posting.max_tf + k1 * (1 - b))
+                docs, tfs = posting.decode()
+                terms.append((upper, idf, docs, tfs))
+            if not terms:
+                return []
+
+            terms.sort(key=lambda t: t[0])
+            prefix_upper = []
+            total = 0.0
+            for upper, *_ in terms:
+                total += upper
+                prefix_upper.append(total)
+            cursors = [0] * len(terms)
+            lengths, live, records = self.doc_lengths, self.live, self.records
+
+            def term_score(i: int, doc: int) -> float:
+                _, idf, docs, tfs = terms[i]
+                tf = tfs[cursors[i]]
+                norm = k1 * (1 - b + b * lengths[doc] / avg_length)
+                return idf * tf * (k1 + 1) / (tf + norm)
+
+            heap: List[Tuple[float, int]] = []
+            threshold = 0.0
+            first_essential = 0
+            while True:
+                # 必要词: 累计上界超过当前阈值的词，候选文档只从它们中产生
+                doc = min(
+                    (terms[i][2][cursors[i]] for i in range(first_essential, len(terms))
+                     if cursors[i] < len(terms[i][2])),
+                    default=None
+                )
+                if doc is None:
+                    break
+
+                score = 0.0
+                for i in range(first_essential, len(terms)):
+                    docs = terms[i][2]
+                    if cursors[i] < len(docs) and docs[cursors[i]] == doc:
+                        score += term_score(i, doc)
+                        cursors[i] += 1
+
+                # 非必要词按上界从大到小补算，上界不足时提前结束
+                for i in range(first_essential - 1, -1, -1):
+                    if score + prefix_upper[i] <= threshold:
+                        break
+                    docs = terms[i][2]
+                    cursors[i] = bisect_left(docs, doc, cursors[i])
+                    if cursors[i] < len(docs) and docs[cursors[i]] == doc:
+                        score += term_score(i, doc)
+
+                if score <= threshold or not live[doc]:
+                    continue
+                if filters and not _matches(records[doc]["metadata"], filters):
+                    continue
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (score, doc))
+                else:
+                    heapq.heappushpop(heap, (score, doc))
+                if len(heap) == top_k:
+                    threshold = heap[0][0]
+                    while first_essential < len(terms) and prefix_upper[first_essential] <= threshold:
+                        first_essential += 1
+
+            return [(records[doc], score) for score, doc in sorted(heap, reverse=True)]
+
+
+class LocalKeywordIndex:
+    """按租户分区的本地关键词索引"""
+
+    def __init__(self, root_path: str):
+        self.root_path = root_path
+        self._segments: Dict[str, KeywordSegment] = {}
+        self._lock = threading.Lock()
+
+    def _segment_path(self, tenant_id: str) -> str:
+        """租户目录名: 可读前缀 + 哈希，避免不同租户ID清洗后冲突"""
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', tenant_id)[:64]
+        digest = hashlib.sha1(tenant_id.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.root_path, f"{safe_name}_{digest}")
+
+    def segment(self, tenant_id: Optional[str]) -> KeywordSegment:
+        """获取租户分段 (懒加载)"""
+        tenant_id = tenant_id or DEFAULT_TENANT
+        segment = self._segments.get(tenant_id)
+        if segment is None:
+            with self._lock:
+                segment = self._segments.get(tenant_id)
+                if segment is None:
+                    segment = KeywordSegment(self._segment_path(tenant_id))
+                    self._segments[tenant_id] = segment
+        return segment
+
+    def add(
+        self,
+        tenant_id: Optional[str],
+        ids: Sequence[str],
+        contents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]]
+    ) -> int:
+        return self.segment(tenant_id).add(ids, contents, metadatas)
+
+    def delete(
+        self,
+        tenant_id: Optional[str],
+        ids: Optional[Iterable[str]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> int:
+        return self.segment(tenant_id).delete(ids, filters)
+
+    def search(
+        self,
+        tenant_id: Optional[str],
+        query: str,
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        return self.segment(tenant_id).search(query, top_k, filters)
@@ -2,15 +2,28 @@
 RAG管理器 - 检索增强生成系统
 提供完整的、从文档到答案的知识库解决方案
 """
+import asyncio
 import os
 import uuid
 from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 import logging
 from pathlib import Path
 
 from ...core_infrastructure.error.exceptions import RAGException, ErrorCode
+from ...ai_foundation.llm.query_embedding import embed_query
+from .keyword_index import LocalKeywordIndex
+from .vector_index import LocalVectorIndex
+
+# 本地向量索引和关键词索引默认目录
+DEFAULT_VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "vector_store/rag_index")
+DEFAULT_KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", "vector_store/keyword_index")
+
+# 混合检索各路超时 (秒) 与 RRF 平滑常数
+HYBRID_VECTOR_TIMEOUT = 2.0
+HYBRID_KEYWORD_TIMEOUT = 1.0
+RRF_K = 60
 
 
 class DocumentType(str, Enum):
@@ -238,19 +251,33 @@ class HTMLLoader(BaseLoader):
 class VectorRetriever:
     """向量检索器"""
     
-    def __init__(self, vector_client=None):
+    def __init__(self, vector_client=None, index_path: Optional[str] = None):
         self.vector_client = vector_client  # Milvus等向量数据库
         self.collection_name = "document_chunks"
+        # 本地向量索引，单机部署无需 Milvus
+        self.index = LocalVectorIndex(index_path or DEFAULT_VECTOR_INDEX_PATH)
         self.logger = logging.getLogger(__name__)
     
     async def add_chunks(self, chunks: List[DocumentChunk], embeddings: List[List[float]]):
-        """添加文档块到向量数据库"""
+        """添加文档块到向量索引 (按租户分区)"""
         try:
-            # TODO: 实现向量数据库存储
+            by_tenant: Dict[Optional[str], List[DocumentChunk]] = {}
             for chunk, embedding in zip(chunks, embeddings):
                 chunk.embedding = embedding
+                by_tenant.setdefault(chunk.metadata.get("tenant_id"), []).append(chunk)
+            
+            for tenant_id, tenant_chunks in by_tenant.items():
+                # 写文件放到线程池，避免阻塞事件循环
+                await asyncio.to_thread(
+                    self.index.add,
+                    tenant_id,
+                    [chunk.id for chunk in tenant_chunks],
+                    [chunk.embedding for chunk in tenant_chunks],
+                    [chunk.content for chunk in tenant_chunks],
+                    [chunk.metadata for chunk in tenant_chunks]
+                )
             
-            self.logger.info(f"已添加 {len(chunks)} 个文档块到向量数据库")
+            self.logger.info(f"已添加 {len(chunks)} 个文档块到向量索引")
             
         except Exception as e:
             raise RAGException(
@@ -262,75 +289,137 @@ class VectorRetriever:
         self, 
         query_embedding: List[float], 
         top_k: int = 10,
-        tenant_id: Optional[str] = None
+        tenant_id: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[DocumentChunk]:
-        """向量相似度搜索"""
+        """向量相似度搜索，只在租户自己的分区内检索，filters 为元数据等值过滤"""
         try:
-            # TODO: 实现向量搜索
-            # 这里返回模拟结果
-            mock_chunks = []
-            for i in range(min(top_k, 3)):
-                chunk = DocumentChunk(
-                    id=f"mock_chunk_{i}",
-                    content=f"模拟文档块内容 {i}",
-                    metadata={"source": "mock", "tenant_id": tenant_id},
-                    score=0.9 - i * 0.1
+            results = await asyncio.to_thread(self.index.search, tenant_id, query_embedding, top_k, filters)
+            return [
+                DocumentChunk(
+                    id=record["id"],
+                    content=record["content"],
+                    metadata=dict(record["metadata"]),
+                    score=score
                 )
-                mock_chunks.append(chunk)
-            
-            return mock_chunks
+                for record, score in results
+            ]
             
         except Exception as e:
             raise RAGException(
                 error_code=ErrorCode.RAG_RETRIEVAL_ERROR,
                 message=f"向量搜索失败: {str(e)}"
             )
+    
+    async def delete_document(self, tenant_id: str, document_id: str) -> int:
+        """删除文档的全部向量 (墓碑标记)"""
+        try:
+            return await asyncio.to_thread(
+                self.index.delete, tenant_id, None, {"document_id": document_id}
+            )
+        except Exception as e:
+            raise RAGException(
+                error_code=ErrorCode.RAG_INDEX_ERROR,
+                message=f"向量删除失败: {str(e)}"
+            )
 
 
 class KeywordRetriever:
     """关键词检索器"""
     
-    def __init__(self, search_client=None):
+    def __init__(self, search_client=None, index_path: Optional[str] = None):
         self.search_client = search_client  # Elasticsearch等搜索引擎
+        # 本地 BM25 倒排索引，单机部署无需 Elasticsearch
+        self.index = LocalKeywordIndex(index_path or DEFAULT_KEYWORD_INDEX_PATH)
         self.logger = logging.getLogger(__name__)
     
+    async def add_chunks(self, chunks: List[DocumentChunk]):
+        """添加文档块到关键词索引 (按租户分区)"""
+        try:
+            by_tenant: Dict[Optional[str], List[DocumentChunk]] = {}
+            for chunk in chunks:
+                by_tenant.setdefault(chunk.metadata.get("tenant_id"), []).append(chunk)
+            
+            for tenant_id, tenant_chunks in by_tenant.items():
+                await asyncio.to_thread(
+                    self.index.add,
+                    tenant_id,
+                    [chunk.id for chunk in tenant_chunks],
+                    [chunk.content for chunk in tenant_chunks],
+                    [chunk.metadata for chunk in tenant_chunks]
+                )
+            
+        except Exception as e:
+            raise RAGException(
+                error_code=ErrorCode.RAG_INDEX_ERROR,
+                message=f"关键词索引写入失败: {str(e)}"
+            )
+    
     async def search(
         self, 
         query: str, 
         top_k: int = 10,
-        tenant_id: Optional[str] = None
+        tenant_id: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[DocumentChunk]:
-        """关键词搜索"""
+        """关键词搜索 (BM25)"""
         try:
-            # TODO: 实现关键词搜索
-            # 这里返回模拟结果
-            mock_chunks = []
-            for i in range(min(top_k, 3)):
-                chunk = DocumentChunk(
-                    id=f"keyword_chunk_{i}",
-                    content=f"关键词搜索结果 {i}: {query}",
-                    metadata={"source": "keyword_search", "tenant_id": tenant_id},
-                    score=0.8 - i * 0.1
+            results = await asyncio.to_thread(self.index.search, tenant_id, query, top_k, filters)
+            return [
+                DocumentChunk(
+                    id=record["id"],
+                    content=record["content"],
+                    metadata=dict(record["metadata"]),
+                    score=score
                 )
-                mock_chunks.append(chunk)
-            
-            return mock_chunks
+                for record, score in results
+            ]
             
         except Exception as e:
             raise RAGException(
                 error_code=ErrorCode.RAG_RETRIEVAL_ERROR,
                 message=f"关键词搜索失败: {str(e)}"
             )
+    
+    async def delete_document(self, tenant_id: str, document_id: str) -> int:
+        """删除文档的全部关键词索引"""
+        try:
+            return await asyncio.to_thread(
+                self.index.delete, tenant_id, None, {"document_id": document_id}
+            )
+        except Exception as e:
+            raise RAGException(
+                error_code=ErrorCode.RAG_INDEX_ERROR,
+                message=f"关键词索引删除失败: {str(e)}"
+            )
 
 
 class HybridRetriever:
     """混合检索器"""
     
-    def __init__(self, vector_retriever: VectorRetriever, keyword_retriever: KeywordRetriever):
+    def __init__(
+        self,
+        vector_retriever: VectorRetriever,
+        keyword_retriever: KeywordRetriever,
+        vector_timeout: float = HYBRID_VECTOR_TIMEOUT,
+        keyword_timeout: float = HYBRID_KEYWORD_TIMEOUT
+    ):
         self.vector_retriever = vector_retriever
         self.keyword_retriever = keyword_retriever
+        self.vector_timeout = vector_timeout
+        self.keyword_timeout = keyword_timeout
         self.logger = logging.getLogger(__name__)
     
+    async def _run_retriever(self, name: str, coro, timeout: float) -> Optional[List[DocumentChunk]]:
+        """执行单路检索，超时或失败时返回 None"""
+        try:
+            return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"{name}检索超时 ({timeout}s)，使用部分结果")
+        except Exception as e:
+            self.logger.warning(f"{name}检索失败，使用部分结果: {e}")
+        return None
+    
     async def search(
         self, 
         query: str,
@@ -338,44 +427,83 @@ class HybridRetriever:
         top_k: int = 10,
         vector_weight: float = 0.7,
         keyword_weight: float = 0.3,
-        tenant_id: Optional[str] = None
+        tenant_id: Optional[str] = None,
+        fusion: str = "rrf",
+        allow_partial: bool = True
     ) -> List[DocumentChunk]:
-        """混合搜索"""
+        """
+        混合搜索
+        
+        向量检索和关键词检索并发执行，各自有独立超时；
+        fusion="rrf" 使用加权倒数排名融合，fusion="score" 使用归一化分数加权融合；
+        allow_partial 为 True 时一路失败仍返回另一路的结果
+        """
         try:
-            # 并行执行向量搜索和关键词搜索
-            vector_results = await self.vector_retriever.search(
-                query_embedding, top_k * 2, tenant_id
-            )
-            keyword_results = await self.keyword_retriever.search(
-                query, top_k * 2, tenant_id
+            # 并行执行向量搜索和关键词搜索，总耗时取两者较大值
+            vector_results, keyword_results = await asyncio.gather(
+                self._run_retriever(
+                    "向量",
+                    self.vector_retriever.search(query_embedding, top_k * 2, tenant_id),
+                    self.vector_timeout
+                ),
+                self._run_retriever(
+                    "关键词",
+                    self.keyword_retriever.search(query, top_k * 2, tenant_id),
+                    self.keyword_timeout
+                )
             )
             
-            # 合并和重新评分
-            all_chunks = {}
-            
-            # 添加向量搜索结果
-            for chunk in vector_results:
-                chunk.score = chunk.score * vector_weight
-                all_chunks[chunk.id] = chunk
-            
-            # 添加关键词搜索结果
-            for chunk in keyword_results:
-                if chunk.id in all_chunks:
-                    # 如果已存在，合并分数
-                    all_chunks[chunk.id].score += chunk.score * keyword_weight
-                else:
-                    chunk.score = chunk.score * keyword_weight
-                    all_chunks[chunk.id] = chunk
-            
-            # 按分数排序并返回top_k
-            sorted_chunks = sorted(all_chunks.values(), key=lambda x: x.score, reverse=True)
-            return sorted_chunks[:top_k]
+            if vector_results is None and keyword_results is None:
+                raise RuntimeError("向量检索和关键词检索均不可用")
+            if not allow_partial and (vector_results is None or keyword_results is None):
+                raise RuntimeError("部分检索器不可用")
+            
+            ranked_lists = [
+                (results, weight) for results, weight in (
+                    (vector_results, vector_weight),
+                    (keyword_results, keyword_weight)
+                ) if results
+            ]
+            if fusion == "score":
+                fused_scores = self._score_fusion(ranked_lists)
+            else:
+                fused_scores = self._rrf_fusion(ranked_lists)
+            
+            # 融合分数写入新的文档块副本，不修改检索器返回的对象
+            chunks_by_id: Dict[str, DocumentChunk] = {}
+            for results, _ in ranked_lists:
+                for chunk in results:
+                    chunks_by_id.setdefault(chunk.id, chunk)
+            ranked_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[:top_k]
+            return [replace(chunks_by_id[chunk_id], score=fused_scores[chunk_id]) for chunk_id in ranked_ids]
             
         except Exception as e:
             raise RAGException(
                 error_code=ErrorCode.RAG_RETRIEVAL_ERROR,
                 message=f"混合搜索失败: {str(e)}"
             )
+    
+    @staticmethod
+    def _rrf_fusion(ranked_lists, k: int = RRF_K) -> Dict[str, float]:
+        """加权倒数排名融合: score = Σ weight / (k + rank)"""
+        scores: Dict[str, float] = {}
+        for results, weight in ranked_lists:
+            for rank, chunk in enumerate(results, start=1):
+                scores[chunk.id] = scores.get(chunk.id, 0.0) + weight / (k + rank)
+        return scores
+    
+    @staticmethod
+    def _score_fusion(ranked_lists) -> Dict[str, float]:
+        """各路分数 min-max 归一化后加权求和"""
+        scores: Dict[str, float] = {}
+        for results, weight in ranked_lists:
+            raw = [chunk.score for chunk in results]
+            low, high = min(raw), max(raw)
+            span = high - low
+            for chunk in results:
+                normalized = (chunk.score - low) / span if span > 0 else 1.0
+                scores[chunk.id] = scores.get(chunk.id, 0.0) + weight * normalized
+        return scores
 
 
 class Reranker:
@@ -417,14 +545,16 @@ class RAGManager:
         oss_manager=None,
         vector_client=None,
         search_client=None,
-        rerank_model=None
+        rerank_model=None,
+        vector_index_path: Optional[str] = None,
+        keyword_index_path: Optional[str] = None
     ):
         self.embedding_manager = embedding_manager
         self.oss_manager = oss_manager
         
         # 初始化检索器
-        self.vector_retriever = VectorRetriever(vector_client)
-        self.keyword_retriever = KeywordRetriever(search_client)
+        self.vector_retriever = VectorRetriever(vector_client, vector_index_path)
+        self.keyword_retriever = KeywordRetriever(search_client, keyword_index_path)
         self.hybrid_retriever = HybridRetriever(self.vector_retriever, self.keyword_retriever)
         
         # 初始化重排序器
@@ -447,8 +577,9 @@ class RAGManager:
             loader = LoaderFactory.get_loader(file_path)
             chunks = await loader.load(file_path)
             
-            # 添加租户信息到元数据
+            # 添加租户信息到元数据，块ID加上文档ID前缀，避免同名文件的块互相覆盖
             for chunk in chunks:
+                chunk.id = f"{document_id}_{chunk.id}"
                 chunk.metadata.update({
                     "tenant_id": tenant_id,
                     "document_id": document_id,
@@ -463,8 +594,9 @@ class RAGManager:
                 texts=chunk_texts
             )
             
-            # 3. 存储到向量数据库
+            # 3. 存储到向量索引和关键词索引
             await self.vector_retriever.add_chunks(chunks, embeddings)
+            await self.keyword_retriever.add_chunks(chunks)
             
             # 4. 上传文件到OSS（可选）
             if self.oss_manager:
@@ -499,13 +631,10 @@ class RAGManager:
         start_time = time.time()
         
         try:
-            # 1. 生成查询嵌入
-            query_embeddings = await self.embedding_manager.embed_texts(
-                tenant_id=tenant_id,
-                model_name="text-embedding-ada-002",
-                texts=[query_text]
+            # 1. 生成查询嵌入 (请求作用域内与记忆检索共享)
+            query_embedding = await embed_query(
+                self.embedding_manager, tenant_id, "text-embedding-ada-002", query_text
             )
-            query_embedding = query_embeddings[0]
             
             # 2. 混合检索
             chunks = await self.hybrid_retriever.search(
@@ -545,11 +674,10 @@ class RAGManager:
     async def delete_document(self, tenant_id: str, document_id: str) -> bool:
         """删除文档"""
         try:
-            # TODO: 实现文档删除逻辑
-            # 1. 从向量数据库删除
-            # 2. 从搜索引擎删除  
-            # 3. 从OSS删除
-            self.logger.info(f"已删除文档: {document_id}")
+            # TODO: 从OSS删除
+            deleted = await self.vector_retriever.delete_document(tenant_id, document_id)
+            await self.keyword_retriever.delete_document(tenant_id, document_id)
+            self.logger.info(f"已删除文档: {document_id} ({deleted} 个文档块)")
             return True
             
         except Exception as e:
@@ -562,11 +690,11 @@ class RAGManager:
     async def get_document_stats(self, tenant_id: str) -> Dict[str, Any]:
         """获取文档统计信息"""
         try:
-            # TODO: 实现统计逻辑
+            stats = self.vector_retriever.index.stats(tenant_id)
             return {
-                "total_documents": 0,
-                "total_chunks": 0,
-                "storage_size": 0,
+                "total_documents": stats["total_documents"],
+                "total_chunks": stats["total_chunks"],
+                "storage_size": stats["storage_size"],
                 "last_updated": None
             }
             
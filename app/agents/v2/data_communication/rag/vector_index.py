@@ -0,0 +1,451 @@
+"""
+本地向量索引 - 无需 Milvus 的单机近似最近邻检索
+按租户划分分段目录 (与 vector_store/ 下 hnsw 分段相同，每个分段一个目录、头文件加定长二进制文件)，
+向量以 float32 追加写入并通过内存映射读取；删除使用墓碑标记；
+数据量较大时训练 IVF 倒排聚类，检索时只探测最相近的若干聚类
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_FORMAT_VERSION = 1
+
+# 活跃向量数低于该值时精确扫描，否则使用 IVF
+IVF_MIN_VECTORS = 4096
+# 向量数超过上次训练时的倍数后重新训练聚类
+IVF_RETRAIN_FACTOR = 2.0
+IVF_TRAIN_SAMPLE = 50000
+IVF_TRAIN_ITERATIONS = 10
+DEFAULT_NPROBE = 8
+# 墓碑占比超过该值时自动压缩
+COMPACT_TOMBSTONE_RATIO = 0.3
+
+HEADER_FILE = "header.json"
+VECTORS_FILE = "vectors.bin"
+RECORDS_FILE = "records.jsonl"
+TOMBSTONES_FILE = "tombstones.bin"
+CENTROIDS_FILE = "centroids.bin"
+ASSIGNMENTS_FILE = "assignments.bin"
+
+DEFAULT_TENANT = "default"
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行归一化，余弦相似度转为内积"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _matches(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """元数据是否满足全部等值过滤条件"""
+    return all(metadata.get(key) == value for key, value in filters.items())
+
+
+class VectorSegment:
+    """
+    单个租户的向量分段
+
+    目录结构:
+        header.json      版本、维度、行数、聚类信息
+        vectors.bin      行数 x 维度的 float32 矩阵 (已归一化)
+        records.jsonl    每行一个记录: id、内容、元数据
+        tombstones.bin   每行一个字节，1 表示已删除
+        centroids.bin    IVF 聚类中心 (训练后存在)
+        assignments.bin  每行所属聚类的 int32 编号 (训练后存在)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.records_bytes = 0
+        self.trained_count = 0
+        self.records: List[Dict[str, Any]] = []
+        self.row_by_id: Dict[str, int] = {}
+        self.tombstones = np.zeros(0, dtype=bool)
+        self.vectors: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._postings: List[np.ndarray] = []
+        self.lock = threading.RLock()
+        self.logger = logging.getLogger(__name__)
+        if os.path.exists(self._file(HEADER_FILE)):
+            self._load()
+
+    def __len__(self) -> int:
+        """活跃 (未删除) 向量数"""
+        return self.count - int(self.tombstones.sum())
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        with open(self._file(HEADER_FILE), 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        if header.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"不支持的索引版本: {header.get('version')}")
+
+        self.dim = header["dim"]
+        self.count = header["count"]
+        self.records_bytes = header["records_bytes"]
+        self.trained_count = header.get("trained_count", 0)
+
+        # 以头文件记录的行数为准，忽略崩溃时写了一半的尾部数据
+        with open(self._file(RECORDS_FILE), 'r', encoding='utf-8') as f:
+            self.records = [json.loads(line) for _, line in zip(range(self.count), f)]
+        self.row_by_id = {}
+        tombstones = np.fromfile(self._file(TOMBSTONES_FILE), dtype=np.uint8, count=self.count)
+        self.tombstones = tombstones.astype(bool)
+        for row, record in enumerate(self.records):
+            if not self.tombstones[row]:
+                self.row_by_id[record["id"]] = row
+        self._map_vectors()
+
+        if self.trained_count and os.path.exists(self._file(CENTROIDS_FILE)):
+            self.centroids = np.fromfile(self._file(CENTROIDS_FILE), dtype=np.float32).reshape(-1, self.dim)
+            self.assignments = np.fromfile(self._file(ASSIGNMENTS_FILE), dtype=np.int32, count=self.count)
+            self._build_postings()
+
+    def _write_header(self):
+        """原子写入头文件，头文件落盘后新追加的数据才对读取可见"""
+        header = {
+            "version": INDEX_FORMAT_VERSION,
+            "dim": self.dim,
+            "count": self.count,
+            "records_bytes": self.records_bytes,
+            "metric": "cosine",
+            "trained_count": self.trained_count,
+            "nlist": 0 if self.centroids is None else len(self.centroids)
+        }
+        tmp_path = self._file(HEADER_FILE + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self._file(HEADER_FILE))
+
+    def _map_vectors(self):
+        """内存映射向量文件"""
+        if self.count == 0:
+            self.vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+        else:
+            self.vectors = np.memmap(
+                self._file(VECTORS_FILE), dtype=np.float32, mode='r', shape=(self.count, self.dim)
+            )
+
+    def _truncate_to_header(self):
+        """截断上次崩溃遗留的未提交尾部数据"""
+        for name, row_bytes in ((VECTORS_FILE, 4 * self.dim), (TOMBSTONES_FILE, 1), (ASSIGNMENTS_FILE, 4)):
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > self.count * row_bytes:
+                with open(path, 'r+b') as f:
+                    f.truncate(self.count * row_bytes)
+        path = self._file(RECORDS_FILE)
+        if os.path.exists(path) and os.path.getsize(path) > self.records_bytes:
+            with open(path, 'r+b') as f:
+                f.truncate(self.records_bytes)
+
+    # ---------- 写入 ----------
+
+    def add(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        contents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]]
+    ) -> int:
+        """追加向量；已存在的ID先标记删除再写入新行"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("向量数量与ID数量不一致")
+        if len(ids) == 0:
+            return 0
+
+        with self.lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                os.makedirs(self.path, exist_ok=True)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配: 期望 {self.dim}, 实际 {vectors.shape[1]}")
+            self._truncate_to_header()
+
+            replaced = [self.row_by_id[chunk_id] for chunk_id in ids if chunk_id in self.row_by_id]
+            if replaced:
+                self._set_tombstones(replaced)
+
+            vectors = _normalize_rows(vectors)
+            start = self.count
+            with open(self._file(VECTORS_FILE), 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self._file(RECORDS_FILE), 'a', encoding='utf-8') as f:
+                for chunk_id, content, metadata in zip(ids, contents, metadatas):
+                    record = {"id": chunk_id, "content": content, "metadata": metadata or {}}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    self.records.append(record)
+            with open(self._file(TOMBSTONES_FILE), 'ab') as f:
+                f.write(bytes(len(ids)))
+
+            if self.centroids is not None:
+                new_assignments = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+                with open(self._file(ASSIGNMENTS_FILE), 'ab') as f:
+                    f.write(new_assignments.tobytes())
+                self.assignments = np.concatenate([self.assignments, new_assignments])
+
+            self.count += len(ids)
+            self.records_bytes = os.path.getsize(self._file(RECORDS_FILE))
+            self.tombstones = np.concatenate([self.tombstones, np.zeros(len(ids), dtype=bool)])
+            for offset, chunk_id in enumerate(ids):
+                self.row_by_id[chunk_id] = start + offset
+            self._write_header()
+            self._map_vectors()
+
+            live = len(self)
+            if live >= IVF_MIN_VECTORS and (
+                self.centroids is None or self.count >= self.trained_count * IVF_RETRAIN_FACTOR
+            ):
+                self.train()
+            elif self.centroids is not None:
+                self._build_postings()
+            return len(ids)
+
+    def delete(self, ids: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None) -> int:
+        """按ID或元数据过滤条件标记删除"""
+        with self.lock:
+            rows = set()
+            if ids is not None:
+                rows.update(self.row_by_id[chunk_id] for chunk_id in ids if chunk_id in self.row_by_id)
+            if filters:
+                rows.update(
+                    row for row in self.row_by_id.values() if _matches(self.records[row]["metadata"], filters)
+                )
+            if not rows:
+                return 0
+            self._set_tombstones(sorted(rows))
+            if self.count and self.tombstones.sum() / self.count > COMPACT_TOMBSTONE_RATIO:
+                self.compact()
+            return len(rows)
+
+    def _set_tombstones(self, rows: List[int]):
+        """标记删除并原地更新墓碑文件"""
+        self.tombstones[rows] = True
+        for row in rows:
+            self.row_by_id.pop(self.records[row]["id"], None)
+        with open(self._file(TOMBSTONES_FILE), 'r+b') as f:
+            for row in rows:
+                f.seek(row)
+                f.write(b'\x01')
+
+    def compact(self):
+        """重写分段，物理移除已删除的行"""
+        with self.lock:
+            live_rows = np.flatnonzero(~self.tombstones)
+            vectors = np.array(self.vectors[live_rows]) if len(live_rows) else np.zeros((0, self.dim), np.float32)
+            records = [self.records[row] for row in live_rows]
+
+            tmp_vectors = self._file(VECTORS_FILE + ".tmp")
+            tmp_records = self._file(RECORDS_FILE + ".tmp")
+            vectors.tofile(tmp_vectors)
+            with open(tmp_records, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+            # 先释放内存映射再替换文件
+            self.vectors = None
+            os.replace(tmp_vectors, self._file(VECTORS_FILE))
+            os.replace(tmp_records, self._file(RECORDS_FILE))
+            np.zeros(len(records), dtype=np.uint8).tofile(self._file(TOMBSTONES_FILE))
+
+            self.records = records
+            self.count = len(records)
+            self.records_bytes = os.path.getsize(self._file(RECORDS_FILE))
+            self.tombstones = np.zeros(self.count, dtype=bool)
+            self.row_by_id = {record["id"]: row for row, record in enumerate(records)}
+            if self.centroids is not None:
+                self.assignments = self.assignments[live_rows]
+                self.assignments.tofile(self._file(ASSIGNMENTS_FILE))
+            self._write_header()
+            self._map_vectors()
+            if self.centroids is not None:
+                self._build_postings()
+            self.logger.info(f"向量分段已压缩: {self.path}, 剩余 {self.count} 行")
+
+    # ---------- IVF ----------
+
+    def train(self, nlist: Optional[int] = None):
+        """在活跃向量上训练球面 k-means 聚类并重新分配所有行"""
+        with self.lock:
+            live_rows = np.flatnonzero(~self.tombstones)
+            if len(live_rows) == 0:
+                return
+            nlist = nlist or int(np.clip(np.sqrt(len(live_rows)), 16, 1024))
+            nlist = min(nlist, len(live_rows))
+
+            rng = np.random.default_rng(0)
+            sample_rows = live_rows
+            if len(live_rows) > IVF_TRAIN_SAMPLE:
+                sample_rows = np.sort(rng.choice(live_rows, IVF_TRAIN_SAMPLE, replace=False))
+            sample = np.array(self.vectors[sample_rows])
+
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+            for _ in range(IVF_TRAIN_ITERATIONS):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = np.bincount(labels, minlength=nlist) == 0
+                sums[empty] = centroids[empty]
+                centroids = _normalize_rows(sums)
+
+            self.centroids = centroids.astype(np.float32)
+            self.assignments = self._assign(self.vectors)
+            self.trained_count = self.count
+            self.centroids.tofile(self._file(CENTROIDS_FILE))
+            self.assignments.tofile(self._file(ASSIGNMENTS_FILE))
+            self._write_header()
+            self._build_postings()
+            self.logger.info(f"IVF聚类已训练: {self.path}, {nlist} 个聚类, {self.count} 行")
+
+    def _assign(self, vectors: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        """分批计算每行最近的聚类中心"""
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[start:start + batch_size])
+            assignments[start:start + batch_size] = np.argmax(batch @ self.centroids.T, axis=1)
+        return assignments
+
+    def _build_postings(self):
+        """由行聚类编号构建倒排列表"""
+        order = np.argsort(self.assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self._postings = np.split(order, np.cumsum(counts)[:-1])
+
+    # ---------- 检索 ----------
+
+    def search(
+        self,
+        query: Sequence[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        nprobe: int = DEFAULT_NPROBE
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """返回 (记录, 余弦相似度) 列表，按相似度降序"""
+        if self.count == 0 or top_k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        if query.shape != (self.dim,):
+            raise ValueError(f"查询向量维度不匹配: 期望 {self.dim}, 实际 {query.shape}")
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        with self.lock:
+            candidates = None
+            if self.centroids is not None and len(self.centroids) > nprobe:
+                probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+                candidates = np.concatenate([self._postings[c] for c in probe])
+                candidates = self._filter_rows(candidates, filters)
+                # 探测的聚类内候选不足时退化为精确扫描
+                if len(candidates) < top_k:
+                    candidates = None
+            if candidates is None:
+                candidates = self._filter_rows(np.arange(self.count), filters)
+            if len(candidates) == 0:
+                return []
+
+            candidates = np.sort(candidates)
+            if len(candidates) * 4 > self.count:
+                # 候选占多数时整块矩阵乘法比花式索引复制更快
+                scores = np.asarray(self.vectors @ query)[candidates]
+            else:
+                scores = np.asarray(self.vectors[candidates] @ query)
+            k = min(top_k, len(candidates))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(self.records[candidates[i]], float(scores[i])) for i in best]
+
+    def _filter_rows(self, rows: np.ndarray, filters: Optional[Dict[str, Any]]) -> np.ndarray:
+        """去掉已删除和不满足元数据过滤的行"""
+        rows = rows[~self.tombstones[rows]]
+        if filters:
+            rows = np.fromiter(
+                (row for row in rows if _matches(self.records[row]["metadata"], filters)), dtype=np.int64
+            )
+        return rows
+
+
+class LocalVectorIndex:
+    """按租户分区的本地向量索引"""
+
+    def __init__(self, root_path: str):
+        self.root_path = root_path
+        self._segments: Dict[str, VectorSegment] = {}
+        self._lock = threading.Lock()
+
+    def _segment_path(self, tenant_id: str) -> str:
+        """租户目录名: 可读前缀 + 哈希，避免不同租户ID清洗后冲突"""
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', tenant_id)[:64]
+        digest = hashlib.sha1(tenant_id.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.root_path, f"{safe_name}_{digest}")
+
+    def segment(self, tenant_id: Optional[str]) -> VectorSegment:
+        """获取租户分段 (懒加载)"""
+        tenant_id = tenant_id or DEFAULT_TENANT
+        segment = self._segments.get(tenant_id)
+        if segment is None:
+            with self._lock:
+                segment = self._segments.get(tenant_id)
+                if segment is None:
+                    segment = VectorSegment(self._segment_path(tenant_id))
+                    self._segments[tenant_id] = segment
+        return segment
+
+    def add(
+        self,
+        tenant_id: Optional[str],
+        ids: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        contents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]]
+    ) -> int:
+        return self.segment(tenant_id).add(ids, np.asarray(vectors, dtype=np.float32), contents, metadatas)
+
+    def delete(
+        self,
+        tenant_id: Optional[str],
+        ids: Optional[Iterable[str]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> int:
+        return self.segment(tenant_id).delete(ids, filters)
+
+    def search(
+        self,
+        tenant_id: Optional[str],
+        query: Sequence[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        return self.segment(tenant_id).search(query, top_k, filters)
+
+    def stats(self, tenant_id: Optional[str]) -> Dict[str, Any]:
+        """租户分段统计"""
+        segment = self.segment(tenant_id)
+        live_rows = segment.row_by_id.values()
+        documents = {segment.records[row]["metadata"].get("document_id") for row in live_rows}
+        documents.discard(None)
+        storage_size = 0
+        if os.path.isdir(segment.path):
+            storage_size = sum(
+                os.path.getsize(os.path.join(segment.path, name)) for name in os.listdir(segment.path)
+            )
+        return {
+            "total_documents": len(documents),
+            "total_chunks": len(segment),
+            "storage_size": storage_size,
+            "ivf_lists": 0 if segment.centroids is None else len(segment.centroids)
+        }
@@ -3,11 +3,91 @@
 融合并改进了原有agents的工具功能
 """
 import logging
-from typing import List, Dict, Any, Optional
+from itertools import combinations
+from typing import List, Dict, Any, Optional, Tuple
 from langchain.tools import tool
 
+from ..ai_foundation.agents.tool_executor import tool_executor
+
 logger = logging.getLogger(__name__)
 
+# 引路人查询
+# 内连接 users 表 (按 mentor_id 外键)，只返回角色为 mentor 且仍活跃的用户的资料
+MENTOR_PROFILE_COLUMNS = (
+    "id,mentor_id,title,description,learning_goals,hourly_rate,currency,status,"
+    "mentor:users!mentor_id!inner(username)"
+)
+MENTOR_SEARCH_COLUMNS = ("description", "learning_goals")
+# 匹配分数: 资料 (简介 + 学习目标) 中出现学校 +3、专业 +3、学位 +2
+UNIVERSITY_WEIGHT = 3
+MAJOR_WEIGHT = 3
+DEGREE_WEIGHT = 2
+MENTOR_RESULT_LIMIT = 5
+MENTOR_PAGE_SIZE = 200
+
+
+def _term_filter(columns, term: str) -> str:
+    """构建嵌套过滤: 任一列包含关键词 (不区分大小写)"""
+    # 关键词加双引号，避免逗号、括号等 PostgREST 保留字符破坏过滤表达式
+    pattern = '"*' + term.replace('\\', '').replace('"', '') + '*"'
+    return "or(" + ",".join(f"{column}.ilike.{pattern}" for column in columns) + ")"
+
+
+def _match_score(profile: Dict[str, Any], weighted_terms: List[Tuple[str, int]]) -> int:
+    text = ((profile.get('description') or '') + ' ' + (profile.get('learning_goals') or '')).lower()
+    return sum(weight for term, weight in weighted_terms if term.lower() in text)
+
+
+async def _fetch_ranked_mentors(
+    supabase_client,
+    weighted_terms: List[Tuple[str, int]],
+    limit: int = MENTOR_RESULT_LIMIT
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    按匹配分数取前 limit 位活跃引路人，返回 [(分数, 资料)]
+
+    按分数从高到低枚举关键词组合，每个组合一次 (分页) 查询，要求资料同时包含组合内全部关键词，
+    因此结果分数不低于组合权重之和；每个组合只补足 limit 位中还缺的人数，
+    已找到 limit 位不低于下一组合权重的引路人时停止，
+    不会漏掉分数更高的引路人。每位引路人只保留其最高分组合中的第一条资料
+    """
+    tiers = sorted(
+        (tier for size in range(len(weighted_terms), 0, -1) for tier in combinations(weighted_terms, size)),
+        key=lambda tier: -sum(weight for _, weight in tier)
+    ) or [()]
+    found: Dict[Any, Tuple[int, Dict[str, Any]]] = {}
+    for tier in tiers:
+        bound = sum(weight for _, weight in tier)
+        needed = limit - sum(1 for score, _ in found.values() if score >= bound)
+        if needed <= 0:
+            break
+        
+        new_mentors = 0
+        start = 0
+        while new_mentors < needed:
+            query = (
+                supabase_client.table("mentorship_relationships").select(MENTOR_PROFILE_COLUMNS)
+                .eq("mentor.role", "mentor").eq("mentor.is_active", True)
+            )
+            if tier:
+                query = query.and_(",".join(_term_filter(MENTOR_SEARCH_COLUMNS, term) for term, _ in tier))
+            response = await query.order("mentor_id").order("id").range(start, start + MENTOR_PAGE_SIZE - 1).execute()
+            
+            for profile in response.data:
+                if profile['mentor_id'] in found:
+                    continue
+                found[profile['mentor_id']] = (_match_score(profile, weighted_terms), profile)
+                new_mentors += 1
+                if new_mentors >= needed:
+                    break
+            if len(response.data) < MENTOR_PAGE_SIZE:
+                break
+            start += MENTOR_PAGE_SIZE
+    
+    ranked = sorted(found.values(), key=lambda item: item[0], reverse=True)
+    return ranked[:limit]
+
+
 @tool
 async def find_mentors_tool(university: str = None, major: str = None, degree_level: str = None) -> str:
     """
@@ -32,71 +112,35 @@ async def find_mentors_tool(university: str = None, major: str = None, degree_le
         
         supabase_client = await get_supabase_client()
         
-        # 查询引路人用户
-        users_query = {
-            "role": "mentor",
-            "is_active": True
-        }
-        
-        users_response = await supabase_client.select(
-            table="users",
-            columns="id,username,email",
-            filters=users_query
-        )
+        # 查询引路人资料: 学校/专业/学位条件下推为 ilike 过滤，角色与活跃状态通过内连接 users 过滤
+        weighted_terms = [
+            (term, weight)
+            for term, weight in ((university, UNIVERSITY_WEIGHT), (major, MAJOR_WEIGHT), (degree_level, DEGREE_WEIGHT))
+            if term
+        ]
+        ranked = await _fetch_ranked_mentors(supabase_client, weighted_terms)
         
-        if not users_response:
+        if not ranked and not weighted_terms:
             return "🔍 未在平台上找到任何引路人。建议您稍后再试或联系平台客服。"
         
-        mentor_ids = [user['id'] for user in users_response]
-        
-        # 查询引路人详细资料
         mentors_data = []
-        for mentor_id in mentor_ids:
-            mentor_profile = await supabase_client.select(
-                table="mentorship_relationships",
-                columns="*",
-                filters={"mentor_id": mentor_id}
-            )
-            
-            if mentor_profile:
-                profile = mentor_profile[0]
-                user_info = next((u for u in users_response if u['id'] == mentor_id), {})
-                
-                mentor_info = {
-                    "mentor_id": mentor_id,
-                    "username": user_info.get('username', '未知'),
-                    "title": profile.get('title', '留学指导'),
-                    "description": profile.get('description', ''),
-                    "learning_goals": profile.get('learning_goals', ''),
-                    "hourly_rate": profile.get('hourly_rate', 0),
-                    "currency": profile.get('currency', 'CNY'),
-                    "status": profile.get('status', 'unknown')
-                }
-                
-                # 匹配算法
-                match_score = 0
-                description_text = (profile.get('description', '') + ' ' + profile.get('learning_goals', '')).lower()
-                
-                if university and university.lower() in description_text:
-                    match_score += 3
-                if major and major.lower() in description_text:
-                    match_score += 3
-                if degree_level and degree_level.lower() in description_text:
-                    match_score += 2
-                
-                if not any([university, major, degree_level]) or match_score > 0:
-                    mentor_info['match_score'] = match_score
-                    mentors_data.append(mentor_info)
-        
-        # 按匹配分数排序
-        mentors_data.sort(key=lambda x: x.get('match_score', 0), reverse=True)
+        for match_score, profile in ranked:
+            user_info = profile.get('mentor') or {}
+            mentors_data.append({
+                "mentor_id": profile['mentor_id'],
+                "username": user_info.get('username') or '未知',
+                "title": profile.get('title') or '留学指导',
+                "description": profile.get('description') or '',
+                "learning_goals": profile.get('learning_goals') or '',
+                "hourly_rate": profile.get('hourly_rate') or 0,
+                "currency": profile.get('currency') or 'CNY',
+                "status": profile.get('status') or 'unknown',
+                "match_score": match_score
+            })
         
         if not mentors_data:
             return f"❌ 未找到符合条件的引路人。\n搜索条件 - 学校: {university}, 专业: {major}, 学位: {degree_level}\n\n💡 建议：\n- 尝试更宽泛的搜索条件\n- 使用英文学校名称\n- 联系平台客服获取帮助"
         
-        # 限制返回数量
-        mentors_data = mentors_data[:5]
-        
         # 格式化结果
         result = f"🎯 找到 {len(mentors_data)} 位符合条件的引路人：\n\n"
         for i, mentor in enumerate(mentors_data, 1):
@@ -190,44 +234,20 @@ async def get_platform_stats_tool() -> str:
         logger.info("📊 获取平台统计信息")
         
         try:
-            from app.core.supabase_client import get_supabase_client
+            from app.core.platform_stats import platform_stats_cache
         except ImportError:
-            logger.warning("Supabase客户端不可用，返回模拟数据")
+            logger.warning("平台统计模块不可用，返回模拟数据")
             return _get_mock_platform_stats()
         
-        supabase_client = await get_supabase_client()
-        
-        # 统计引路人数量
-        mentors_response = await supabase_client.select(
-            table="users",
-            columns="id",
-            filters={"role": "mentor", "is_active": True}
-        )
-        mentor_count = len(mentors_response) if mentors_response else 0
-        
-        # 统计学生数量
-        students_response = await supabase_client.select(
-            table="users", 
-            columns="id",
-            filters={"role": "student", "is_active": True}
-        )
-        student_count = len(students_response) if students_response else 0
-        
-        # 统计服务数量
-        services_response = await supabase_client.select(
-            table="services",
-            columns="id,category",
-            filters={"is_active": True}
-        )
-        service_count = len(services_response) if services_response else 0
+        # 计数在数据库端完成，结果在进程内缓存，多个会话共享同一快照
+        stats = await platform_stats_cache.get()
+        mentor_count = stats.mentor_count
+        student_count = stats.student_count
+        service_count = stats.service_count
         
         # 服务分类统计
-        if services_response:
-            categories = {}
-            for service in services_response:
-                cat = service.get('category', '其他')
-                categories[cat] = categories.get(cat, 0) + 1
-            category_stats = ", ".join([f"{k}: {v}个" for k, v in categories.items()])
+        if stats.service_categories:
+            category_stats = ", ".join([f"{k}: {v}个" for k, v in stats.service_categories.items()])
         else:
             category_stats = "暂无服务分类统计"
         
@@ -299,7 +319,8 @@ async def web_search_tool(query: str, max_results: int = 3) -> str:
         try:
             from langchain_community.tools.ddg_search import DuckDuckGoSearchRun
             search_tool = DuckDuckGoSearchRun()
-            results = search_tool.run(query)
+            # DuckDuckGo 只有同步接口，放入工具线程池执行，避免阻塞事件循环
+            results = await tool_executor.run_in_pool(search_tool.run, query)
             return _format_search_results(results, "DuckDuckGo")
         except ImportError:
             logger.warning("DuckDuckGo搜索包未安装")
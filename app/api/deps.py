@@ -8,10 +8,10 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import ValidationError
 from typing import Optional, Union
-from supabase import create_client
 
 from app.core.config import settings
 from app.core.db import get_db_connection
+from app.core.supabase_client import get_supabase_client
 from app.schemas.token_schema import TokenPayload, AuthenticatedUser
 
 # OAuth2 方案，用于从请求头中提取 Bearer Token
@@ -20,14 +20,11 @@ oauth2_scheme = OAuth2PasswordBearer(
     description="使用用户名和密码获取访问令牌"
 )
 
-# 创建 Supabase 客户端作为备用
-supabase_client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-
 # 数据库连接依赖（支持降级模式）
 async def get_db_or_supabase():
     """
     获取数据库连接或Supabase客户端
-    优先使用连接池，失败时降级到Supabase客户端
+    优先使用连接池，失败时降级到异步 Supabase REST 客户端 (共享连接池)
     """
     try:
         async for conn in get_db_connection():
@@ -35,7 +32,7 @@ async def get_db_or_supabase():
             return
     except RuntimeError:
         # 连接池未初始化，使用Supabase客户端
-        yield {"type": "supabase", "connection": supabase_client}
+        yield {"type": "supabase", "connection": await get_supabase_client()}
 
 async def get_user_by_username(
     username: str, 
@@ -57,7 +54,7 @@ async def get_user_by_username(
         else:
             # 使用Supabase客户端
             client = db_conn["connection"]
-            result = client.table('users').select(
+            result = await client.table('users').select(
                 'id, username, email, password_hash, role, is_active'
             ).eq('username', username).execute()
             
@@ -7,7 +7,6 @@ from pydantic import BaseModel, Field
 from fastapi.responses import StreamingResponse
 from typing import Optional
 import json
-import asyncio
 from datetime import datetime
 
 from app.api.deps import get_current_user
@@ -20,6 +19,7 @@ class PlannerRequest(BaseModel):
     input: str = Field(..., min_length=1, max_length=2000, description="用户的留学咨询问题")
     session_id: Optional[str] = Field(None, description="会话ID，用于支持多轮对话")
     stream: bool = Field(True, description="是否使用流式响应")
+    use_cache: bool = Field(False, description="是否复用相似问题的缓存回答")
 
 class PlannerResponse(BaseModel):
     """AI规划师响应模型（非流式）"""
@@ -63,7 +63,7 @@ async def invoke_planner(
         if request.stream:
             # 流式响应
             return StreamingResponse(
-                stream_generator(agent, request.input, request.session_id),
+                stream_generator(agent, request.input, request.session_id, request.use_cache),
                 media_type="text/event-stream",
                 headers={
                     "Cache-Control": "no-cache",
@@ -73,7 +73,7 @@ async def invoke_planner(
             )
         else:
             # 非流式响应
-            result = await agent.execute(request.input)
+            result = await agent.execute(request.input, use_cache=request.use_cache)
             return PlannerResponse(
                 output=result,
                 session_id=request.session_id
@@ -83,30 +83,33 @@ async def invoke_planner(
         print(f"❌ AI规划师调用失败: {e}")
         raise HTTPException(status_code=500, detail=f"AI服务调用失败: {str(e)}")
 
-async def stream_generator(agent: StudyPlannerAgent, user_input: str, session_id: Optional[str] = None):
-    """生成流式响应"""
+def _sse(data: dict) -> str:
+    """编码一条 SSE 事件"""
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_generator(
+    agent: StudyPlannerAgent,
+    user_input: str,
+    session_id: Optional[str] = None,
+    use_cache: bool = False
+):
+    """生成流式响应: 逐 token 转发智能体输出，并转发工具调用和用量事件"""
     try:
         # 发送开始事件
-        yield f"data: {json.dumps({'type': 'start', 'content': 'AI留学规划师启动中...'}, ensure_ascii=False)}\n\n"
-        
-        # 发送思考状态
-        yield f"data: {json.dumps({'type': 'thinking', 'content': '🤔 正在分析您的问题...'}, ensure_ascii=False)}\n\n"
+        yield _sse({'type': 'start', 'content': 'AI留学规划师启动中...'})
         
-        # 新架构中执行agent并获取结果
-        # 注意：v2架构可能不支持完全相同的事件流，所以我们简化处理
-        result = await agent.execute(user_input)
-        
-        # 发送最终回答
-        data = {
-            "type": "final_answer",
-            "content": result,
-            "session_id": session_id,
-            "timestamp": datetime.now().isoformat()
-        }
-        yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        async for event in agent.stream(user_input, use_cache=use_cache):
+            if event["type"] == "final_answer":
+                # 发送最终回答
+                event = {
+                    **event,
+                    "session_id": session_id,
+                    "timestamp": datetime.now().isoformat()
+                }
+            yield _sse(event)
         
         # 发送结束事件
-        yield f"data: {json.dumps({'type': 'end', 'content': '咨询完成'}, ensure_ascii=False)}\n\n"
+        yield _sse({'type': 'end', 'content': '咨询完成'})
         
     except Exception as e:
         # 发送错误事件
@@ -114,7 +117,7 @@ async def stream_generator(agent: StudyPlannerAgent, user_input: str, session_id
             "type": "error",
             "content": f"抱歉，处理您的问题时遇到了错误: {str(e)}"
         }
-        yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+        yield _sse(error_data)
 
 @router.get("/health", summary="AI服务健康检查")
 async def health_check():
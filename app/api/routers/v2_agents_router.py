@@ -2,9 +2,11 @@
 PeerPortal AI智能体系统 v2.0 API路由
 专注于留学规划和咨询的智能体服务
 """
+import json
 import logging
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.agents.v2 import (
@@ -12,9 +14,11 @@ from app.agents.v2 import (
     create_study_consultant,
     get_architecture_info,
     AgentException,
-    PlatformException
+    PlatformException,
+    memory_bank
 )
 from app.agents.v2.config import config_manager
+from app.agents.v2.ai_foundation.agents.response_cache import response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +30,7 @@ class ChatRequest(BaseModel):
     message: str = Field(..., description="用户消息", min_length=1, max_length=2000)
     user_id: str = Field(..., description="用户ID")
     session_id: Optional[str] = Field(None, description="会话ID（可选）")
+    use_cache: bool = Field(False, description="是否复用相似问题的缓存回答")
 
 class ChatResponse(BaseModel):
     """智能体对话响应"""
@@ -116,7 +121,7 @@ async def chat_with_planner(
         planner = create_study_planner(request.user_id)
         
         # 执行对话
-        response = await planner.execute(request.message)
+        response = await planner.execute(request.message, use_cache=request.use_cache)
         
         return ChatResponse(
             response=response,
@@ -154,7 +159,7 @@ async def chat_with_consultant(
         consultant = create_study_consultant(request.user_id)
         
         # 执行对话
-        response = await consultant.execute(request.message)
+        response = await consultant.execute(request.message, use_cache=request.use_cache)
         
         return ChatResponse(
             response=response,
@@ -198,7 +203,7 @@ async def chat_with_auto_agent(
             )
         
         # 执行对话
-        response = await agent.execute(request.message)
+        response = await agent.execute(request.message, use_cache=request.use_cache)
         
         return ChatResponse(
             response=response,
@@ -219,6 +224,56 @@ async def chat_with_auto_agent(
         logger.error(f"智能体对话异常: {e}")
         raise HTTPException(status_code=500, detail="对话服务暂时不可用")
 
+@router.post("/chat/stream", summary="智能体流式对话")
+async def stream_chat_with_agent(
+    request: ChatRequest = Body(...),
+    agent_type: str = Body("study_planner", description="智能体类型: study_planner 或 study_consultant"),
+    _: None = Depends(verify_system_ready)
+):
+    """
+    以 SSE 流式返回智能体回答
+    
+    事件类型：
+    - token: 回答的增量文本
+    - tool_call / tool_result: 工具调用及结果
+    - usage: token 用量
+    - final_answer: 完整回答
+    - error: 执行失败
+    """
+    try:
+        if agent_type == "study_planner":
+            agent = create_study_planner(request.user_id)
+        elif agent_type == "study_consultant":
+            agent = create_study_consultant(request.user_id)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的智能体类型: {agent_type}。支持的类型: study_planner, study_consultant"
+            )
+    except AgentException as e:
+        logger.error(f"智能体创建失败: {e}")
+        raise HTTPException(status_code=400, detail=f"智能体错误: {e.message}")
+    
+    async def event_stream():
+        try:
+            async for event in agent.stream(request.message, use_cache=request.use_cache):
+                if event["type"] == "final_answer":
+                    event = {**event, "agent_type": agent_type, "session_id": request.session_id}
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"智能体流式对话异常: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'content': '对话服务暂时不可用'}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"  # 禁用nginx缓冲
+        }
+    )
+
 # 兼容旧API的路由
 @router.post("/planner/invoke", response_model=ChatResponse, summary="留学规划师调用（兼容接口）")
 async def invoke_planner(
@@ -232,6 +287,16 @@ async def invoke_planner(
     """
     return await chat_with_planner(request)
 
+@router.get("/cache/stats", summary="响应缓存统计")
+async def get_cache_stats():
+    """获取智能体语义响应缓存的命中统计"""
+    return response_cache.get_stats()
+
+@router.get("/memory/stats", summary="会话存储统计")
+async def get_memory_stats():
+    """获取短期记忆会话存储的容量与淘汰统计"""
+    return memory_bank.working_memory.get_stats()
+
 # 健康检查路由
 @router.get("/health", summary="智能体系统健康检查")
 async def health_check():
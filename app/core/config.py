@@ -22,11 +22,20 @@ class Settings(BaseSettings):
     DB_POOL_MIN_SIZE: int = Field(default=1)
     DB_POOL_MAX_SIZE: int = Field(default=10)
     
+    # 匹配相似度图 (由 scripts/database/build_matching_similarity.py 生成)
+    MATCHING_SIMILARITY_PATH: str = Field(default="data/matching_similarity.json")
+    
     # Supabase 配置
     SUPABASE_URL: str = Field(...)
     SUPABASE_KEY: str = Field(...)
     SUPABASE_JWT_SECRET: Optional[str] = Field(default=None)
     SUPABASE_DB_PASSWORD: Optional[str] = Field(default=None)  # 添加缺失的字段
+    # Supabase REST 客户端连接池
+    SUPABASE_HTTP2: bool = Field(default=True)
+    SUPABASE_TIMEOUT: float = Field(default=30.0)
+    SUPABASE_MAX_CONNECTIONS: int = Field(default=100)
+    SUPABASE_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=20)
+    SUPABASE_KEEPALIVE_EXPIRY: float = Field(default=30.0)
     
     # JWT 配置
     SECRET_KEY: str = Field(default="your-secret-key-change-in-production")
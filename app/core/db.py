@@ -67,6 +67,13 @@ async def lifespan(app: FastAPI):
         logger.info("回退到 Supabase REST API")
         db_pool = None
     
+    # 加载预构建的大学/专业相似度图
+    try:
+        from app.core.matching_similarity import load_similarity_graph
+        load_similarity_graph(settings.MATCHING_SIMILARITY_PATH)
+    except Exception as e:
+        logger.error(f"相似度图加载失败: {e}")
+    
     # 初始化AI智能体系统 v2.0
     logger.info("🤖 正在初始化AI智能体系统 v2.0...")
     try:
@@ -100,6 +107,12 @@ async def lifespan(app: FastAPI):
     yield
     
     # 清理资源
+    try:
+        from app.agents.v2.config import shutdown_v2
+        await shutdown_v2()
+    except Exception as e:
+        logger.error(f"❌ AI智能体系统 v2.0 关闭异常: {e}")
+    
     if db_pool:
         logger.info("关闭数据库连接池...")
         await db_pool.close()
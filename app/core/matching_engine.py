@@ -0,0 +1,338 @@
+"""
+指导者匹配引擎模块
+在进程内维护已认证指导者的列式快照，使用 NumPy 向量化计算匹配分数
+替代每次请求都在数据库中逐行计算 CASE/EXISTS 表达式的方式
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.matching_similarity import SimilarityGraph, get_similarity_graph
+
+logger = logging.getLogger(__name__)
+
+# 各维度的匹配权重 (大学/专业分数见 matching_similarity)
+RATING_WEIGHT = 0.15
+LANGUAGE_FULL_SCORE = 0.1
+LANGUAGE_PARTIAL_SCORE = 0.08
+SPECIALTY_BONUS = 0.05
+
+# 学位编码: 0=bachelor, 1=master, 2=phd, 3=未知
+DEGREE_CODES = {"bachelor": 0, "master": 1, "phd": 2}
+UNKNOWN_DEGREE = 3
+# DEGREE_SCORES[申请学位][指导者学位]
+DEGREE_SCORES = np.array([
+    [0.2, 0.05, 0.0, 0.0],
+    [0.05, 0.2, 0.1, 0.0],
+    [0.0, 0.1, 0.2, 0.0],
+    [0.0, 0.0, 0.0, 0.0],
+], dtype=np.float32)
+
+# 经验加分阈值 (会话数, 分数)，按阈值从高到低排列
+EXPERIENCE_TIERS = ((50, 0.05), (20, 0.03), (5, 0.01))
+
+MENTOR_SELECT_SQL = """
+    SELECT mr.*, u.username, p.full_name, p.avatar_url
+    FROM mentorship_relationships mr
+    JOIN users u ON mr.user_id = u.id
+    LEFT JOIN profiles p ON u.id = p.user_id
+"""
+SUPABASE_MENTOR_COLUMNS = '*, users:user_id(username), profiles:user_id(full_name, avatar_url)'
+SUPABASE_PAGE_SIZE = 1000
+
+
+class _Interner:
+    """字符串驻留表 - 将取值映射为连续的整数ID"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def intern(self, value: Optional[str]) -> int:
+        """返回取值的ID，空值返回 -1"""
+        if not value:
+            return -1
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+    def lookup(self, values: Optional[Iterable[str]]) -> List[int]:
+        """查找已知取值的ID，未知取值被忽略"""
+        if not values:
+            return []
+        return sorted({self.ids[v] for v in values if v in self.ids})
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+@dataclass
+class MentorSnapshot:
+    """已认证指导者的列式快照"""
+    rows: List[Dict[str, Any]]
+    university_ids: np.ndarray
+    major_ids: np.ndarray
+    degree_codes: np.ndarray
+    ratings: np.ndarray
+    sessions: np.ndarray
+    language_matrix: np.ndarray
+    specialty_matrix: np.ndarray
+    similarity: SimilarityGraph
+    languages: _Interner
+    specialties: _Interner
+    built_at: float = field(default_factory=time.time)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+def _membership_matrix(rows: Sequence[Dict[str, Any]], column: str, interner: _Interner) -> np.ndarray:
+    """构建 (指导者 x 取值) 的布尔成员矩阵"""
+    id_lists = [[interner.intern(v) for v in (row.get(column) or []) if v] for row in rows]
+    matrix = np.zeros((len(rows), len(interner)), dtype=bool)
+    for index, ids in enumerate(id_lists):
+        if ids:
+            matrix[index, ids] = True
+    return matrix
+
+
+def build_snapshot(rows: Sequence[Dict[str, Any]], similarity: Optional[SimilarityGraph] = None) -> MentorSnapshot:
+    """根据指导者记录构建列式快照，大学/专业ID取自相似度图"""
+    rows = list(rows)
+    similarity = similarity or get_similarity_graph()
+    languages, specialties = _Interner(), _Interner()
+
+    university_ids = np.fromiter(
+        (similarity.universities.add(row.get('university')) for row in rows), dtype=np.int32, count=len(rows)
+    )
+    major_ids = np.fromiter(
+        (similarity.majors.add(row.get('major')) for row in rows), dtype=np.int32, count=len(rows)
+    )
+    degree_codes = np.fromiter(
+        (DEGREE_CODES.get((row.get('degree_level') or '').lower(), UNKNOWN_DEGREE) for row in rows),
+        dtype=np.int8, count=len(rows)
+    )
+    ratings = np.fromiter(
+        (float(row.get('rating') or 0.0) for row in rows), dtype=np.float32, count=len(rows)
+    )
+    sessions = np.fromiter(
+        (int(row.get('total_sessions') or 0) for row in rows), dtype=np.int32, count=len(rows)
+    )
+
+    return MentorSnapshot(
+        rows=rows,
+        university_ids=university_ids,
+        major_ids=major_ids,
+        degree_codes=degree_codes,
+        ratings=ratings,
+        sessions=sessions,
+        language_matrix=_membership_matrix(rows, 'languages', languages),
+        specialty_matrix=_membership_matrix(rows, 'specialties', specialties),
+        similarity=similarity,
+        languages=languages,
+        specialties=specialties
+    )
+
+
+def score_snapshot(snapshot: MentorSnapshot, request, limit: int = 50) -> List[Dict[str, Any]]:
+    """对快照中的全部指导者进行向量化打分并返回前 limit 个"""
+    count = len(snapshot)
+    if count == 0 or limit <= 0:
+        return []
+
+    # 1. 大学/专业匹配度: 从相似度图取出目标所在行，再按ID聚集
+    university_scores = snapshot.similarity.universities.scores_for(
+        request.target_universities or []
+    )[snapshot.university_ids]
+    major_scores = snapshot.similarity.majors.scores_for(
+        request.target_majors or []
+    )[snapshot.major_ids]
+
+    # 2. 学位匹配度
+    request_degree = DEGREE_CODES.get((request.degree_level or '').lower(), UNKNOWN_DEGREE)
+    degree_scores = DEGREE_SCORES[request_degree][snapshot.degree_codes]
+
+    # 3. 评分权重
+    rating_scores = snapshot.ratings / 5.0 * RATING_WEIGHT
+
+    # 4. 语言匹配度
+    preferred_languages = set(request.preferred_languages or [])
+    if not preferred_languages:
+        language_scores = np.full(count, LANGUAGE_FULL_SCORE, dtype=np.float32)
+    else:
+        language_ids = snapshot.languages.lookup(preferred_languages)
+        common = snapshot.language_matrix[:, language_ids].sum(axis=1) if language_ids else np.zeros(count)
+        language_scores = np.where(
+            common == len(preferred_languages), LANGUAGE_FULL_SCORE,
+            np.where(common > 0, LANGUAGE_PARTIAL_SCORE, 0.0)
+        ).astype(np.float32)
+
+    # 5. 经验加分
+    experience_bonus = np.select(
+        [snapshot.sessions >= threshold for threshold, _ in EXPERIENCE_TIERS],
+        [bonus for _, bonus in EXPERIENCE_TIERS],
+        default=0.0
+    ).astype(np.float32)
+
+    # 6. 专业化服务加分
+    specialty_ids = snapshot.specialties.lookup(request.service_categories)
+    if specialty_ids:
+        specialty_bonus = np.where(
+            snapshot.specialty_matrix[:, specialty_ids].any(axis=1), SPECIALTY_BONUS, 0.0
+        ).astype(np.float32)
+    else:
+        specialty_bonus = np.zeros(count, dtype=np.float32)
+
+    total_scores = (university_scores + major_scores + degree_scores + rating_scores +
+                    language_scores + experience_bonus + specialty_bonus)
+
+    # 选出前 limit 个候选，再按 (总分, 评分, 会话数) 排序
+    if count > limit:
+        candidates = np.argpartition(-total_scores, limit - 1)[:limit]
+    else:
+        candidates = np.arange(count)
+    order = np.lexsort((
+        -snapshot.sessions[candidates], -snapshot.ratings[candidates], -total_scores[candidates]
+    ))
+
+    matches = []
+    for index in candidates[order]:
+        mentor = dict(snapshot.rows[index])
+        mentor.update({
+            'university_match': float(university_scores[index]),
+            'major_match': float(major_scores[index]),
+            'degree_match': float(degree_scores[index]),
+            'rating_score': float(rating_scores[index]),
+            'language_match': float(language_scores[index]),
+            'experience_bonus': float(experience_bonus[index]),
+            'specialty_bonus': float(specialty_bonus[index]),
+            'total_score': float(total_scores[index])
+        })
+        matches.append(mentor)
+    return matches
+
+
+class MentorMatchingEngine:
+    """
+    指导者匹配引擎
+
+    首次使用时全量加载已认证指导者，此后按 updated_at 水位线增量拉取变更，
+    并定期全量重载以清理被物理删除的记录。刷新由锁保护，同一时刻只有一个协程访问数据库。
+    """
+
+    def __init__(self, refresh_interval: float = 60.0, full_reload_interval: float = 1800.0):
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._rows: Dict[Any, Dict[str, Any]] = {}
+        self._snapshot: Optional[MentorSnapshot] = None
+        self._watermark: Any = None
+        self._checked_at = 0.0
+        self._full_loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def snapshot(self) -> Optional[MentorSnapshot]:
+        """当前快照"""
+        return self._snapshot
+
+    def mark_stale(self):
+        """标记快照过期，下一次匹配请求将触发增量刷新"""
+        self._checked_at = 0.0
+
+    def load_rows(self, rows: Iterable[Dict[str, Any]]):
+        """用给定的指导者记录替换整个快照"""
+        self._rows = {row['id']: row for row in rows}
+        self._watermark = self._max_updated_at(self._rows.values(), None)
+        self._rebuild()
+        now = time.monotonic()
+        self._checked_at = now
+        self._full_loaded_at = now
+
+    def apply_changes(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """合并增量变更：已认证的记录写入快照，其余记录从快照移除"""
+        changed = 0
+        for row in rows:
+            if row.get('verification_status') == 'verified':
+                self._rows[row['id']] = row
+            elif self._rows.pop(row['id'], None) is None:
+                continue
+            changed += 1
+            self._watermark = self._max_updated_at([row], self._watermark)
+        if changed:
+            self._rebuild()
+        return changed
+
+    async def ensure_fresh(self, db_conn: Dict[str, Any]):
+        """确保快照在刷新间隔内是最新的"""
+        if self._snapshot is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now - self._checked_at < self.refresh_interval:
+                return
+
+            if self._snapshot is None or now - self._full_loaded_at >= self.full_reload_interval:
+                rows = await self._fetch_rows(db_conn, since=None)
+                self.load_rows(rows)
+                logger.info(f"指导者匹配快照已全量加载: {len(self._snapshot)} 位指导者")
+            else:
+                rows = await self._fetch_rows(db_conn, since=self._watermark)
+                changed = self.apply_changes(rows)
+                self._checked_at = now
+                if changed:
+                    logger.info(f"指导者匹配快照已增量刷新: {changed} 条变更")
+
+    async def match(self, db_conn: Dict[str, Any], request, limit: int = 50) -> List[Dict[str, Any]]:
+        """计算匹配结果"""
+        await self.ensure_fresh(db_conn)
+        return score_snapshot(self._snapshot, request, limit)
+
+    def _rebuild(self):
+        """由记录表重建列式快照并原子替换"""
+        self._snapshot = build_snapshot(self._rows.values())
+
+    @staticmethod
+    def _max_updated_at(rows: Iterable[Dict[str, Any]], current: Any) -> Any:
+        """计算记录集合的 updated_at 最大值"""
+        for row in rows:
+            updated_at = row.get('updated_at')
+            if updated_at is not None and (current is None or updated_at > current):
+                current = updated_at
+        return current
+
+    async def _fetch_rows(self, db_conn: Dict[str, Any], since: Any) -> List[Dict[str, Any]]:
+        """从数据库拉取指导者记录；since 为空时全量拉取已认证记录"""
+        if db_conn["type"] == "asyncpg":
+            conn = db_conn["connection"]
+            if since is None:
+                results = await conn.fetch(MENTOR_SELECT_SQL + " WHERE mr.verification_status = 'verified'")
+            else:
+                results = await conn.fetch(MENTOR_SELECT_SQL + " WHERE mr.updated_at > $1", since)
+            return [dict(row) for row in results]
+
+        client = db_conn["connection"]
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            query = client.table('mentorship_relationships').select(SUPABASE_MENTOR_COLUMNS)
+            if since is None:
+                query = query.eq('verification_status', 'verified')
+            else:
+                query = query.gt('updated_at', since)
+            result = await query.order('id').range(offset, offset + SUPABASE_PAGE_SIZE - 1).execute()
+            rows.extend(result.data)
+            if len(result.data) < SUPABASE_PAGE_SIZE:
+                return rows
+            offset += SUPABASE_PAGE_SIZE
+
+
+# 全局匹配引擎实例
+matching_engine = MentorMatchingEngine()
@@ -0,0 +1,407 @@
+"""
+大学/专业相似度图模块
+构建步骤将大学和专业名称规范化后驻留为整数ID，物化别名表与稀疏相似度矩阵，
+运行时每对取值的相似度只需一次数组读取，不再依赖 LIKE 模糊扫描和 difflib
+"""
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_FORMAT_VERSION = 1
+
+# 大学相似度分数
+UNIVERSITY_EXACT_SCORE = 0.3
+UNIVERSITY_TOKEN_SCORE = 0.2
+UNIVERSITY_TIER_SCORE = 0.15
+UNIVERSITY_TIER_RANK_DISTANCE = 50
+
+# 专业相似度分数
+MAJOR_EXACT_SCORE = 0.25
+MAJOR_RELATED_SCORE = 0.18
+MAJOR_CATEGORY_SCORE = 0.12
+MAJOR_TOKEN_SCORE = 0.08
+
+# 名称分词时忽略的通用词
+UNIVERSITY_STOPWORDS = frozenset({'university', 'college', 'institute', 'school', 'of', 'the', 'and', 'at', 'in'})
+MAJOR_STOPWORDS = frozenset({'of', 'the', 'and', 'in', 'studies'})
+
+# 内置种子数据，与 scripts/database/create_matching_tables.sql 中的示例数据保持一致
+SEED_UNIVERSITY_RANKINGS = [
+    ('Stanford University', 2), ('MIT', 1), ('Harvard University', 3), ('UC Berkeley', 15),
+    ('Carnegie Mellon University', 25), ('University of Toronto', 35), ('ETH Zurich', 8),
+    ('Tsinghua University', 20), ('Peking University', 18), ('National University of Singapore', 30),
+]
+
+SEED_UNIVERSITY_ALIASES = [
+    ('Massachusetts Institute of Technology', 'MIT'),
+    ('University of California, Berkeley', 'UC Berkeley'),
+    ('UCB', 'UC Berkeley'),
+    ('CMU', 'Carnegie Mellon University'),
+    ('NUS', 'National University of Singapore'),
+    ('ETH', 'ETH Zurich'),
+    ('UofT', 'University of Toronto'),
+    ('斯坦福大学', 'Stanford University'),
+    ('麻省理工学院', 'MIT'),
+    ('哈佛大学', 'Harvard University'),
+    ('清华大学', 'Tsinghua University'),
+    ('北京大学', 'Peking University'),
+    ('多伦多大学', 'University of Toronto'),
+    ('新加坡国立大学', 'National University of Singapore'),
+]
+
+SEED_MAJOR_ALIASES = [
+    ('CS', 'Computer Science'),
+    ('AI', 'Artificial Intelligence'),
+    ('EE', 'Electrical Engineering'),
+    ('MBA', 'Business Administration'),
+    ('计算机科学', 'Computer Science'),
+    ('软件工程', 'Software Engineering'),
+    ('数据科学', 'Data Science'),
+    ('人工智能', 'Artificial Intelligence'),
+    ('电子工程', 'Electrical Engineering'),
+    ('工商管理', 'Business Administration'),
+    ('金融', 'Finance'),
+    ('心理学', 'Psychology'),
+]
+
+# 相关专业分组: 基础专业与组内专业两两相关
+SEED_RELATED_MAJORS = {
+    'Computer Science': ['Software Engineering', 'Information Technology', 'Data Science', 'Artificial Intelligence'],
+    'Business Administration': ['Management', 'Marketing', 'Finance', 'Economics'],
+    'Electrical Engineering': ['Computer Engineering', 'Electronics', 'Telecommunications'],
+    'Mechanical Engineering': ['Aerospace Engineering', 'Automotive Engineering', 'Robotics'],
+    'Psychology': ['Cognitive Science', 'Behavioral Science', 'Neuroscience'],
+    'Biology': ['Biotechnology', 'Biochemistry', 'Bioinformatics', 'Molecular Biology'],
+    'Chemistry': ['Chemical Engineering', 'Materials Science', 'Pharmaceutical Science'],
+    'Mathematics': ['Statistics', 'Actuarial Science', 'Applied Mathematics', 'Data Science'],
+    'Physics': ['Astronomy', 'Astrophysics', 'Engineering Physics', 'Materials Science'],
+}
+
+SEED_MAJOR_CATEGORIES = [
+    ('Computer Science', 'STEM'), ('Software Engineering', 'STEM'), ('Data Science', 'STEM'),
+    ('Electrical Engineering', 'STEM'), ('Mechanical Engineering', 'STEM'),
+    ('Business Administration', 'Business'), ('Marketing', 'Business'), ('Finance', 'Business'),
+    ('Psychology', 'Social Sciences'), ('Biology', 'STEM'), ('Chemistry', 'STEM'),
+    ('Mathematics', 'STEM'), ('Physics', 'STEM'), ('Economics', 'Social Sciences'),
+]
+
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """规范化名称: 小写、去标点、合并空白"""
+    if not name:
+        return ''
+    normalized = name.lower().replace('&', ' and ')
+    normalized = _PUNCTUATION.sub(' ', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+
+class SimilarityVocabulary:
+    """
+    单一维度 (大学或专业) 的驻留表
+
+    包含规范名称、别名表 (规范化名称 -> ID) 和对称的稀疏相似度矩阵，
+    矩阵按行存储为 {ID: 分数}，相同ID视为完全匹配
+    """
+
+    def __init__(self, exact_score: float, token_score: float, stopwords: FrozenSet[str]):
+        self.exact_score = exact_score
+        self.token_score = token_score
+        self.stopwords = stopwords
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.rows: List[Dict[int, float]] = []
+        self._tokens: List[FrozenSet[str]] = []
+        self._token_index: Dict[str, Set[int]] = {}
+        self._row_arrays: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def tokenize(self, name: str) -> FrozenSet[str]:
+        """提取名称中的有效词"""
+        return frozenset(t for t in normalize_name(name).split() if t not in self.stopwords)
+
+    def resolve(self, name: Optional[str]) -> int:
+        """按规范化名称或别名查找ID，未知或空值返回 -1"""
+        return self.ids.get(normalize_name(name), -1)
+
+    def add(self, name: Optional[str]) -> int:
+        """登记名称并返回ID；新名称会按词重叠与已有名称建立边"""
+        key = normalize_name(name)
+        if not key:
+            return -1
+        value_id = self.ids.get(key)
+        if value_id is not None:
+            return value_id
+
+        value_id = len(self.names)
+        tokens = self.tokenize(name)
+        self.names.append(name)
+        self.ids[key] = value_id
+        self.rows.append({})
+        self._tokens.append(tokens)
+        for other_id in self._token_neighbors(tokens):
+            self.link(value_id, other_id, self.token_score)
+        for token in tokens:
+            self._token_index.setdefault(token, set()).add(value_id)
+        return value_id
+
+    def add_alias(self, alias: str, name: str) -> int:
+        """将别名指向规范名称的ID"""
+        value_id = self.add(name)
+        key = normalize_name(alias)
+        if key and value_id >= 0:
+            self.ids.setdefault(key, value_id)
+        return value_id
+
+    def link(self, a: int, b: int, score: float):
+        """建立对称边，已有边保留较高分数"""
+        if a < 0 or b < 0 or a == b:
+            return
+        if score > self.rows[a].get(b, 0.0):
+            self.rows[a][b] = score
+            self.rows[b][a] = score
+            self._row_arrays.pop(a, None)
+            self._row_arrays.pop(b, None)
+
+    def score(self, a: Optional[str], b: Optional[str]) -> float:
+        """两个名称之间的相似度"""
+        a_id, b_id = self.resolve(a), self.resolve(b)
+        if a_id < 0 or b_id < 0:
+            return 0.0
+        if a_id == b_id:
+            return self.exact_score
+        return self.rows[a_id].get(b_id, 0.0)
+
+    def scores_for(self, targets: Sequence[str]) -> np.ndarray:
+        """
+        计算每个已登记名称对目标列表的最高分数
+
+        返回数组末尾多出一个 0 分槽位，供空值 (ID 为 -1) 索引使用。
+        未登记的目标只按词重叠临时计算邻居，不写入驻留表
+        """
+        scores = np.zeros(len(self.names) + 1, dtype=np.float32)
+        for target in targets or []:
+            target_id = self.resolve(target)
+            if target_id >= 0:
+                indices, values = self._row_array(target_id)
+                np.maximum.at(scores, indices, values)
+                scores[target_id] = self.exact_score
+            else:
+                neighbors = self._token_neighbors(self.tokenize(target or ''))
+                if neighbors:
+                    indices = np.fromiter(neighbors, dtype=np.int32, count=len(neighbors))
+                    np.maximum.at(scores, indices, np.float32(self.token_score))
+        return scores
+
+    def _row_array(self, value_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """行的数组形式 (列ID, 分数)，按需缓存"""
+        arrays = self._row_arrays.get(value_id)
+        if arrays is None:
+            row = self.rows[value_id]
+            arrays = (
+                np.fromiter(row.keys(), dtype=np.int32, count=len(row)),
+                np.fromiter(row.values(), dtype=np.float32, count=len(row)),
+            )
+            self._row_arrays[value_id] = arrays
+        return arrays
+
+    def _token_neighbors(self, tokens: FrozenSet[str]) -> Set[int]:
+        """通过倒排索引查找词重叠的名称: 一方包含另一方，或 Jaccard 系数不低于 0.5"""
+        if not tokens:
+            return set()
+        candidates: Set[int] = set()
+        for token in tokens:
+            candidates |= self._token_index.get(token, set())
+        neighbors = set()
+        for candidate in candidates:
+            other = self._tokens[candidate]
+            common = len(tokens & other)
+            if common == len(tokens) or common == len(other) or common * 2 >= len(tokens | other):
+                neighbors.add(candidate)
+        return neighbors
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为可持久化的字典，边只保存上三角部分"""
+        return {
+            'names': self.names,
+            'aliases': {key: value_id for key, value_id in self.ids.items()
+                        if key != normalize_name(self.names[value_id])},
+            'edges': [[a, b, score] for a, row in enumerate(self.rows) for b, score in row.items() if a < b],
+        }
+
+    def load_dict(self, data: Dict[str, Any]):
+        """从持久化的字典恢复"""
+        for name in data.get('names', []):
+            self.add(name)
+        for key, value_id in data.get('aliases', {}).items():
+            self.ids.setdefault(key, value_id)
+        for a, b, score in data.get('edges', []):
+            self.link(a, b, score)
+
+
+class SimilarityGraph:
+    """大学与专业相似度图"""
+
+    def __init__(self):
+        self.universities = SimilarityVocabulary(UNIVERSITY_EXACT_SCORE, UNIVERSITY_TOKEN_SCORE, UNIVERSITY_STOPWORDS)
+        self.majors = SimilarityVocabulary(MAJOR_EXACT_SCORE, MAJOR_TOKEN_SCORE, MAJOR_STOPWORDS)
+        self.built_at = time.time()
+
+    def is_related_major(self, major1: Optional[str], major2: Optional[str]) -> bool:
+        """两个不同专业是否属于相关专业"""
+        major1_id, major2_id = self.majors.resolve(major1), self.majors.resolve(major2)
+        if major1_id < 0 or major2_id < 0 or major1_id == major2_id:
+            return False
+        return self.majors.rows[major1_id].get(major2_id, 0.0) >= MAJOR_RELATED_SCORE
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': SIMILARITY_FORMAT_VERSION,
+            'built_at': self.built_at,
+            'universities': self.universities.to_dict(),
+            'majors': self.majors.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SimilarityGraph':
+        if data.get('version') != SIMILARITY_FORMAT_VERSION:
+            raise ValueError(f"不支持的相似度图版本: {data.get('version')}")
+        graph = cls()
+        graph.universities.load_dict(data['universities'])
+        graph.majors.load_dict(data['majors'])
+        graph.built_at = data.get('built_at', graph.built_at)
+        return graph
+
+    def save(self, path: str):
+        """写入JSON文件 (先写临时文件再原子替换)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SimilarityGraph':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def build_similarity_graph(
+    university_rankings: Iterable[Tuple[str, Optional[int]]] = (),
+    university_aliases: Iterable[Tuple[str, str]] = (),
+    major_relations: Iterable[Tuple[str, str]] = (),
+    major_categories: Iterable[Tuple[str, str]] = (),
+    major_aliases: Iterable[Tuple[str, str]] = (),
+    universities: Iterable[str] = (),
+    majors: Iterable[str] = (),
+    include_seed: bool = True
+) -> SimilarityGraph:
+    """
+    物化相似度图
+
+    Args:
+        university_rankings: (大学, 排名) 列表，排名相差不超过50的大学视为同档
+        university_aliases: (别名, 大学) 列表
+        major_relations: (专业1, 专业2) 相关专业对
+        major_categories: (专业, 大类) 列表，同大类专业互相连边
+        major_aliases: (别名, 专业) 列表
+        universities: 额外登记的大学名称 (如现有指导者的大学)
+        majors: 额外登记的专业名称
+        include_seed: 是否合并内置种子数据
+    """
+    university_rankings = list(university_rankings)
+    university_aliases = list(university_aliases)
+    major_relations = list(major_relations)
+    major_categories = list(major_categories)
+    major_aliases = list(major_aliases)
+    if include_seed:
+        university_rankings = SEED_UNIVERSITY_RANKINGS + university_rankings
+        university_aliases = SEED_UNIVERSITY_ALIASES + university_aliases
+        major_categories = SEED_MAJOR_CATEGORIES + major_categories
+        major_aliases = SEED_MAJOR_ALIASES + major_aliases
+        for base, related in SEED_RELATED_MAJORS.items():
+            group = [base] + related
+            major_relations += [(a, b) for i, a in enumerate(group) for b in group[i + 1:]]
+
+    graph = SimilarityGraph()
+
+    # 1. 大学: 别名、同档排名
+    for alias, name in university_aliases:
+        graph.universities.add_alias(alias, name)
+    ranked: Dict[int, int] = {}
+    for name, ranking in university_rankings:
+        university_id = graph.universities.add(name)
+        if university_id >= 0 and ranking is not None:
+            ranked[university_id] = int(ranking)
+    ranked_items = sorted(ranked.items(), key=lambda item: item[1])
+    for i, (a, rank_a) in enumerate(ranked_items):
+        for b, rank_b in ranked_items[i + 1:]:
+            if rank_b - rank_a > UNIVERSITY_TIER_RANK_DISTANCE:
+                break
+            graph.universities.link(a, b, UNIVERSITY_TIER_SCORE)
+    for name in universities:
+        graph.universities.add(name)
+
+    # 2. 专业: 别名、相关专业、同大类
+    for alias, name in major_aliases:
+        graph.majors.add_alias(alias, name)
+    for major1, major2 in major_relations:
+        graph.majors.link(graph.majors.add(major1), graph.majors.add(major2), MAJOR_RELATED_SCORE)
+    categories: Dict[str, Set[int]] = {}
+    for name, category in major_categories:
+        major_id = graph.majors.add(name)
+        if major_id >= 0 and category:
+            categories.setdefault(category, set()).add(major_id)
+    for members in categories.values():
+        members = sorted(members)
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                graph.majors.link(a, b, MAJOR_CATEGORY_SCORE)
+    for name in majors:
+        graph.majors.add(name)
+
+    return graph
+
+
+# 全局相似度图实例
+_similarity_graph: Optional[SimilarityGraph] = None
+
+
+def load_similarity_graph(path: Optional[str] = None) -> SimilarityGraph:
+    """
+    加载相似度图 (应用启动时调用一次)
+
+    预构建文件不存在或无法读取时，使用内置种子数据构建
+    """
+    global _similarity_graph
+    graph = None
+    if path and os.path.exists(path):
+        try:
+            graph = SimilarityGraph.load(path)
+            logger.info(f"相似度图已加载: {len(graph.universities)} 所大学, {len(graph.majors)} 个专业")
+        except Exception as e:
+            logger.error(f"加载相似度图失败，使用内置种子数据: {e}")
+    if graph is None:
+        graph = build_similarity_graph()
+    _similarity_graph = graph
+    return graph
+
+
+def get_similarity_graph() -> SimilarityGraph:
+    """获取全局相似度图，未加载时使用内置种子数据构建"""
+    if _similarity_graph is None:
+        return load_similarity_graph()
+    return _similarity_graph
@@ -0,0 +1,166 @@
+"""
+平台统计缓存模块
+在数据库端完成计数与分组统计，结果在进程内按 TTL 缓存并以单飞方式刷新，
+供智能体的平台统计工具和匹配筛选选项接口共享
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# PostgREST 单次响应最多返回的行数 (Supabase 默认 max-rows 为 1000)，超过时需分页读取
+SUPABASE_PAGE_SIZE = 1000
+
+PLATFORM_STATS_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM users WHERE role = 'mentor' AND is_active) AS mentor_count,
+        (SELECT COUNT(*) FROM users WHERE role = 'student' AND is_active) AS student_count,
+        ARRAY(SELECT DISTINCT university FROM mentorship_relationships
+              WHERE verification_status = 'verified' AND university IS NOT NULL ORDER BY university) AS universities,
+        ARRAY(SELECT DISTINCT major FROM mentorship_relationships
+              WHERE verification_status = 'verified' AND major IS NOT NULL ORDER BY major) AS majors,
+        ARRAY(SELECT DISTINCT degree_level FROM mentorship_relationships
+              WHERE verification_status = 'verified' AND degree_level IS NOT NULL ORDER BY degree_level) AS degree_levels
+"""
+SERVICE_CATEGORY_SQL = """
+    SELECT COALESCE(category, '其他') AS category, COUNT(*) AS count
+    FROM services WHERE is_active GROUP BY 1 ORDER BY 2 DESC
+"""
+
+
+@dataclass
+class PlatformStats:
+    """平台统计快照"""
+    mentor_count: int = 0
+    student_count: int = 0
+    service_count: int = 0
+    service_categories: Dict[str, int] = field(default_factory=dict)
+    universities: List[str] = field(default_factory=list)
+    majors: List[str] = field(default_factory=list)
+    degree_levels: List[str] = field(default_factory=list)
+    computed_at: float = field(default_factory=time.time)
+
+
+class PlatformStatsCache:
+    """
+    平台统计 TTL 缓存
+
+    缓存过期后只有一个协程访问数据库，其余协程等待同一次刷新的结果；
+    刷新失败时若有旧快照则继续返回旧快照
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._stats: Optional[PlatformStats] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """使缓存失效，下一次访问时重新统计"""
+        self._expires_at = 0.0
+
+    async def get(self, db_conn: Optional[Dict[str, Any]] = None) -> PlatformStats:
+        """
+        获取平台统计
+
+        Args:
+            db_conn: get_db_or_supabase 提供的连接；为空时自动选择连接池或 Supabase 客户端
+        """
+        if self._stats is not None and time.monotonic() < self._expires_at:
+            return self._stats
+
+        async with self._lock:
+            if self._stats is not None and time.monotonic() < self._expires_at:
+                return self._stats
+            try:
+                if db_conn is None:
+                    async with _default_connection() as conn:
+                        stats = await self._compute(conn)
+                else:
+                    stats = await self._compute(db_conn)
+            except Exception as e:
+                if self._stats is None:
+                    raise
+                logger.warning(f"刷新平台统计失败，继续使用旧数据: {e}")
+                # 短暂退避，避免每个请求都重试失败的统计
+                self._expires_at = time.monotonic() + min(self.ttl, 30.0)
+                return self._stats
+
+            self._stats = stats
+            self._expires_at = time.monotonic() + self.ttl
+            return stats
+
+    async def _compute(self, db_conn: Dict[str, Any]) -> PlatformStats:
+        """在数据库端完成统计"""
+        if db_conn["type"] == "asyncpg":
+            conn = db_conn["connection"]
+            row = await conn.fetchrow(PLATFORM_STATS_SQL)
+            categories = await conn.fetch(SERVICE_CATEGORY_SQL)
+            service_categories = {r['category']: r['count'] for r in categories}
+            return PlatformStats(
+                mentor_count=row['mentor_count'],
+                student_count=row['student_count'],
+                service_count=sum(service_categories.values()),
+                service_categories=service_categories,
+                universities=list(row['universities']),
+                majors=list(row['majors']),
+                degree_levels=list(row['degree_levels'])
+            )
+
+        client = db_conn["connection"]
+        # 计数使用 count=exact 的 HEAD 请求，不传输任何行；各请求并发发出
+        mentors, students, services, service_rows, mentor_fields = await asyncio.gather(
+            client.table('users').select('id', count='exact', head=True)
+                .eq('role', 'mentor').eq('is_active', True).execute(),
+            client.table('users').select('id', count='exact', head=True)
+                .eq('role', 'student').eq('is_active', True).execute(),
+            client.table('services').select('id', count='exact', head=True).eq('is_active', True).execute(),
+            # PostgREST 默认不开放 GROUP BY/DISTINCT，分类与筛选项只拉取所需列并分页读取，避免被 max-rows 截断
+            _fetch_all(lambda: client.table('services').select('category').eq('is_active', True)),
+            _fetch_all(lambda: client.table('mentorship_relationships').select('university,major,degree_level')
+                       .eq('verification_status', 'verified'))
+        )
+        service_categories = dict(Counter(s.get('category') or '其他' for s in service_rows).most_common())
+        return PlatformStats(
+            mentor_count=mentors.count or 0,
+            student_count=students.count or 0,
+            service_count=services.count or 0,
+            service_categories=service_categories,
+            universities=sorted({m['university'] for m in mentor_fields if m.get('university')}),
+            majors=sorted({m['major'] for m in mentor_fields if m.get('major')}),
+            degree_levels=sorted({m['degree_level'] for m in mentor_fields if m.get('degree_level')})
+        )
+
+
+async def _fetch_all(make_query: Callable[[], Any]) -> List[Dict[str, Any]]:
+    """按 id 排序分页读取查询的全部行 (make_query 每次返回一个新的查询构建器)"""
+    rows: List[Dict[str, Any]] = []
+    offset = 0
+    while True:
+        result = await make_query().order('id').range(offset, offset + SUPABASE_PAGE_SIZE - 1).execute()
+        rows.extend(result.data)
+        if len(result.data) < SUPABASE_PAGE_SIZE:
+            return rows
+        offset += SUPABASE_PAGE_SIZE
+
+
+@asynccontextmanager
+async def _default_connection() -> AsyncIterator[Dict[str, Any]]:
+    """优先使用数据库连接池，不可用时使用 Supabase REST 客户端"""
+    from app.core import db
+    from app.core.supabase_client import get_supabase_client
+
+    if db.db_pool is not None:
+        async with db.db_pool.acquire() as connection:
+            yield {"type": "asyncpg", "connection": connection}
+    else:
+        yield {"type": "supabase", "connection": await get_supabase_client()}
+
+
+# 全局平台统计缓存实例
+platform_stats_cache = PlatformStatsCache()
@@ -3,13 +3,270 @@ Supabase REST API 客户端模块
 当直接数据库连接不可用时使用此模块
 """
 import httpx
-from typing import Optional, Dict, List, Any
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Any, Iterable, Tuple, Union
 from fastapi import HTTPException
 from app.core.config import settings
 import logging
 
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖
+except ImportError:
+    h2 = None
+
 logger = logging.getLogger(__name__)
 
+# PostgREST 过滤值中需要加引号的保留字符
+_RESERVED_CHARS = set(',.:()" ')
+
+
+def _format_value(value: Any) -> str:
+    """格式化过滤值"""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _format_list(values: Iterable[Any]) -> str:
+    """格式化 in. 过滤的取值列表，含保留字符的取值加双引号"""
+    items = []
+    for value in values:
+        text = _format_value(value)
+        if any(c in _RESERVED_CHARS for c in text):
+            text = '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        items.append(text)
+    return f"({','.join(items)})"
+
+
+@dataclass
+class SupabaseResponse:
+    """查询结果，与 supabase-py 的 APIResponse 保持相同的 data/count 属性"""
+    data: List[Dict[str, Any]]
+    count: Optional[int] = None
+
+
+class SupabaseQuery:
+    """
+    异步链式查询构建器
+
+    接口与 supabase-py 的 table() 查询保持一致，过滤/排序方法同步返回自身，
+    只有 execute() 需要 await，请求通过共享的 httpx.AsyncClient 连接池发出
+    """
+    
+    def __init__(self, client: "SupabaseClient", table: str):
+        self._client = client
+        self._table = table
+        self._method = "GET"
+        self._params: List[Tuple[str, str]] = []
+        self._order: List[str] = []
+        self._prefer: List[str] = []
+        self._json: Any = None
+        self._range: Optional[Tuple[int, int]] = None
+        self._limit: Optional[int] = None
+        self._single = False
+        self._negate = False
+    
+    # ---------- 操作 ----------
+    
+    def select(self, columns: str = "*", count: Optional[str] = None, head: bool = False) -> "SupabaseQuery":
+        """查询指定列，count 可为 exact/planned/estimated；head=True 时只返回计数不传输数据"""
+        self._method = "HEAD" if head else "GET"
+        self._params.append(("select", "".join(columns.split())))
+        if count:
+            self._prefer.append(f"count={count}")
+        return self
+    
+    def insert(self, data: Union[Dict[str, Any], List[Dict[str, Any]]], count: Optional[str] = None) -> "SupabaseQuery":
+        """插入单行或批量插入"""
+        self._method = "POST"
+        self._json = data
+        self._prefer.append("return=representation")
+        if count:
+            self._prefer.append(f"count={count}")
+        return self
+    
+    def upsert(
+        self,
+        data: Union[Dict[str, Any], List[Dict[str, Any]]],
+        on_conflict: str = "",
+        ignore_duplicates: bool = False
+    ) -> "SupabaseQuery":
+        """插入或更新 (单行或批量)"""
+        self.insert(data)
+        self._prefer.append(
+            "resolution=ignore-duplicates" if ignore_duplicates else "resolution=merge-duplicates"
+        )
+        if on_conflict:
+            self._params.append(("on_conflict", on_conflict))
+        return self
+    
+    def update(self, data: Dict[str, Any]) -> "SupabaseQuery":
+        """更新匹配过滤条件的行"""
+        self._method = "PATCH"
+        self._json = data
+        self._prefer.append("return=representation")
+        return self
+    
+    def delete(self) -> "SupabaseQuery":
+        """删除匹配过滤条件的行"""
+        self._method = "DELETE"
+        self._prefer.append("return=representation")
+        return self
+    
+    # ---------- 过滤 ----------
+    
+    @property
+    def not_(self) -> "SupabaseQuery":
+        """对下一个过滤条件取反，如 query.not_.in_('id', ids)"""
+        self._negate = True
+        return self
+    
+    def filter(self, column: str, operator: str, value: Any) -> "SupabaseQuery":
+        """通用过滤: column=operator.value"""
+        if self._negate:
+            operator = f"not.{operator}"
+            self._negate = False
+        self._params.append((column, f"{operator}.{value}"))
+        return self
+    
+    def eq(self, column: str, value: Any) -> "SupabaseQuery":
+        return self.filter(column, "eq", _format_value(value))
+    
+    def neq(self, column: str, value: Any) -> "SupabaseQuery":
+        return self.filter(column, "neq", _format_value(value))
+    
+    def gt(self, column: str, value: Any) -> "SupabaseQuery":
+        return self.filter(column, "gt", _format_value(value))
+    
+    def gte(self, column: str, value: Any) -> "SupabaseQuery":
+        return self.filter(column, "gte", _format_value(value))
+    
+    def lt(self, column: str, value: Any) -> "SupabaseQuery":
+        return self.filter(column, "lt", _format_value(value))
+    
+    def lte(self, column: str, value: Any) -> "SupabaseQuery":
+        return self.filter(column, "lte", _format_value(value))
+    
+    def like(self, column: str, pattern: str) -> "SupabaseQuery":
+        return self.filter(column, "like", pattern)
+    
+    def ilike(self, column: str, pattern: str) -> "SupabaseQuery":
+        return self.filter(column, "ilike", pattern)
+    
+    def is_(self, column: str, value: Any) -> "SupabaseQuery":
+        return self.filter(column, "is", _format_value(value))
+    
+    def in_(self, column: str, values: Iterable[Any]) -> "SupabaseQuery":
+        return self.filter(column, "in", _format_list(values))
+    
+    def contains(self, column: str, values: Iterable[Any]) -> "SupabaseQuery":
+        """数组列包含全部取值"""
+        return self.filter(column, "cs", "{" + ",".join(_format_value(v) for v in values) + "}")
+    
+    def overlaps(self, column: str, values: Iterable[Any]) -> "SupabaseQuery":
+        """数组列与取值有交集"""
+        return self.filter(column, "ov", "{" + ",".join(_format_value(v) for v in values) + "}")
+    
+    def or_(self, filters: str) -> "SupabaseQuery":
+        """OR 组合过滤，如 'sender_id.eq.1,recipient_id.eq.1'"""
+        self._params.append(("or", f"({filters})"))
+        return self
+    
+    def and_(self, filters: str) -> "SupabaseQuery":
+        """AND 组合过滤，可嵌套 or()，如 'or(a.eq.1,b.eq.1),or(c.eq.2,d.eq.2)'"""
+        self._params.append(("and", f"({filters})"))
+        return self
+    
+    def match(self, query: Dict[str, Any]) -> "SupabaseQuery":
+        """多列相等过滤"""
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+    
+    # ---------- 排序与分页 ----------
+    
+    def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None) -> "SupabaseQuery":
+        clause = f"{column}.{'desc' if desc else 'asc'}"
+        if nullsfirst is not None:
+            clause += ".nullsfirst" if nullsfirst else ".nullslast"
+        self._order.append(clause)
+        return self
+    
+    def limit(self, size: int) -> "SupabaseQuery":
+        self._limit = size
+        return self
+    
+    def range(self, start: int, end: int) -> "SupabaseQuery":
+        """返回第 start 到第 end 行 (闭区间)"""
+        self._range = (start, end)
+        return self
+    
+    def single(self) -> "SupabaseQuery":
+        """只返回一行，data 为字典"""
+        self._single = True
+        self._limit = 1
+        return self
+    
+    # ---------- 执行 ----------
+    
+    def build_params(self) -> List[Tuple[str, str]]:
+        """组装查询参数"""
+        params = list(self._params)
+        if self._order:
+            params.append(("order", ",".join(self._order)))
+        if self._range is not None:
+            start, end = self._range
+            params.append(("offset", str(start)))
+            params.append(("limit", str(end - start + 1)))
+        elif self._limit is not None:
+            params.append(("limit", str(self._limit)))
+        return params
+    
+    async def execute(self) -> SupabaseResponse:
+        """发送请求"""
+        headers = dict(self._client.headers)
+        if self._prefer:
+            headers["Prefer"] = ",".join(self._prefer)
+        
+        try:
+            response = await self._client.client.request(
+                self._method,
+                f"{self._client.base_url}/{self._table}",
+                params=self.build_params(),
+                headers=headers,
+                json=self._json
+            )
+            response.raise_for_status()
+        except httpx.HTTPStatusError as http_err:
+            logger.error(
+                f"Supabase {self._method} {self._table} HTTP错误: "
+                f"{http_err.response.status_code} - {http_err.response.text}"
+            )
+            raise HTTPException(
+                status_code=http_err.response.status_code,
+                detail=f"数据库请求失败: {http_err.response.text}"
+            )
+        except Exception as e:
+            logger.error(f"Supabase {self._method} {self._table} 错误: {e}")
+            raise HTTPException(status_code=500, detail=f"数据库请求失败: {str(e)}")
+        
+        data = response.json() if response.content and self._method != "HEAD" else []
+        if not isinstance(data, list):
+            data = [data]
+        if self._single:
+            data = data[0] if data else None
+        return SupabaseResponse(data=data, count=self._parse_count(response))
+    
+    @staticmethod
+    def _parse_count(response: httpx.Response) -> Optional[int]:
+        """从 Content-Range 头 (如 0-24/3573) 解析总行数"""
+        content_range = response.headers.get("content-range", "")
+        total = content_range.rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+
+
 class SupabaseClient:
     """Supabase REST API 客户端"""
     
@@ -20,7 +277,20 @@ class SupabaseClient:
             "Authorization": f"Bearer {settings.SUPABASE_KEY}",
             "Content-Type": "application/json"
         }
-        self.client = httpx.AsyncClient(timeout=30)
+        # 所有请求共享一个连接池，HTTP/2 下多个并发请求复用同一连接
+        self.client = httpx.AsyncClient(
+            timeout=settings.SUPABASE_TIMEOUT,
+            http2=settings.SUPABASE_HTTP2 and h2 is not None,
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.SUPABASE_KEEPALIVE_EXPIRY
+            )
+        )
+    
+    def table(self, table: str) -> SupabaseQuery:
+        """创建链式查询"""
+        return SupabaseQuery(self, table)
     
     async def close(self):
         """关闭客户端"""
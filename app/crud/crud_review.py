@@ -1,7 +1,6 @@
 from typing import Optional, List, Dict, Any
 from app.schemas.review_schema import ServiceReviewCreate, MentorReviewCreate, ReviewUpdate, ReviewFilter, ReviewInteraction, ReviewResponse
 import asyncpg
-from supabase import Client
 
 async def create_service_review(db_conn: Dict[str, Any], reviewer_user_id: int, review_data: ServiceReviewCreate) -> Optional[Dict]:
     """创建服务评价"""
@@ -34,13 +33,13 @@ async def create_service_review(db_conn: Dict[str, Any], reviewer_user_id: int,
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 验证订单权限
-            order = client.table('orders').select('mentor_id').eq('id', review_data.order_id).eq('student_id', reviewer_user_id).eq('status', 'completed').execute()
+            order = await client.table('orders').select('mentor_id').eq('id', review_data.order_id).eq('student_id', reviewer_user_id).eq('status', 'completed').execute()
             if not order.data:
                 return None
                 
-            result = client.table('reviews').insert({
+            result = await client.table('reviews').insert({
                 'reviewer_id': reviewer_user_id,
                 'reviewee_id': order.data[0]['mentor_id'],
                 'review_type': 'service',
@@ -98,8 +97,8 @@ async def create_mentor_review(db_conn: Dict[str, Any], reviewer_user_id: int, r
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('reviews').insert({
+            client = db_conn["connection"]
+            result = await client.table('reviews').insert({
                 'reviewer_id': reviewer_user_id,
                 'reviewee_id': review_data.mentor_id,
                 'review_type': 'mentor',
@@ -188,7 +187,7 @@ async def get_reviews_by_target(db_conn: Dict[str, Any], target_type: str, targe
             results = await conn.fetch(query, *params, limit, offset)
             return [dict(row) for row in results]
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             query = client.table('reviews').select('*').eq('review_type', target_type).eq('target_id', target_id).eq('is_public', True).eq('status', 'active')
             
             if filters:
@@ -206,7 +205,7 @@ async def get_reviews_by_target(db_conn: Dict[str, Any], target_type: str, targe
             sort_column = filters.sort_by if filters and filters.sort_by else 'created_at'
             sort_desc = filters.sort_order == 'desc' if filters and filters.sort_order else True
             
-            result = query.order(sort_column, desc=sort_desc).range(offset, offset + limit - 1).execute()
+            result = await query.order(sort_column, desc=sort_desc).range(offset, offset + limit - 1).execute()
             return result.data
     except Exception as e:
         print(f"获取评价列表失败: {e}")
@@ -272,8 +271,8 @@ async def get_review_summary(db_conn: Dict[str, Any], target_type: str, target_i
                 'recent_reviews': [dict(row) for row in recent_reviews]
             }
         else:
-            client: Client = db_conn["connection"]
-            reviews = client.table('reviews').select('*').eq('review_type', target_type).eq('target_id', target_id).eq('is_public', True).eq('status', 'active').execute()
+            client = db_conn["connection"]
+            reviews = await client.table('reviews').select('*').eq('review_type', target_type).eq('target_id', target_id).eq('is_public', True).eq('status', 'active').execute()
             
             if not reviews.data:
                 return {
@@ -332,8 +331,8 @@ async def update_review(db_conn: Dict[str, Any], review_id: int, reviewer_id: in
             result = await conn.fetchrow(query, review_id, reviewer_id, *update_data.values())
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('reviews').update(update_data).eq('id', review_id).eq('reviewer_id', reviewer_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('reviews').update(update_data).eq('id', review_id).eq('reviewer_id', reviewer_id).execute()
             return result.data[0] if result.data else None
     except Exception as e:
         print(f"更新评价失败: {e}")
@@ -350,8 +349,8 @@ async def delete_review(db_conn: Dict[str, Any], review_id: int, reviewer_id: in
             )
             return result is not None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('reviews').update({'status': 'deleted'}).eq('id', review_id).eq('reviewer_id', reviewer_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('reviews').update({'status': 'deleted'}).eq('id', review_id).eq('reviewer_id', reviewer_id).execute()
             return len(result.data) > 0
     except Exception as e:
         print(f"删除评价失败: {e}")
@@ -393,12 +392,12 @@ async def interact_with_review(db_conn: Dict[str, Any], user_id: int, interactio
                 )
             return True
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 简化版互动
             if interaction.action == "helpful":
-                client.table('reviews').update({'helpful_count': 1}).eq('id', interaction.review_id).execute()
+                await client.table('reviews').update({'helpful_count': 1}).eq('id', interaction.review_id).execute()
             elif interaction.action == "report":
-                client.table('reviews').update({'reported_count': 1}).eq('id', interaction.review_id).execute()
+                await client.table('reviews').update({'reported_count': 1}).eq('id', interaction.review_id).execute()
             return True
     except Exception as e:
         print(f"评价互动失败: {e}")
@@ -420,8 +419,8 @@ async def create_review_response(db_conn: Dict[str, Any], responder_id: int, res
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('review_responses').insert({
+            client = db_conn["connection"]
+            result = await client.table('review_responses').insert({
                 'review_id': response.review_id,
                 'responder_id': responder_id,
                 'response_content': response.response_content,
@@ -449,8 +448,8 @@ async def get_review_responses(db_conn: Dict[str, Any], review_id: int) -> List[
             )
             return [dict(row) for row in results]
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('review_responses').select('*').eq('review_id', review_id).order('created_at').execute()
+            client = db_conn["connection"]
+            result = await client.table('review_responses').select('*').eq('review_id', review_id).order('created_at').execute()
             return result.data
     except Exception as e:
         print(f"获取评价回复失败: {e}")
@@ -483,11 +482,11 @@ async def get_reviews_by_user(db_conn: Dict[str, Any], user_id: int, review_type
             results = await conn.fetch(query, *params, limit)
             return [dict(row) for row in results]
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             query = client.table('reviews').select('*').eq('reviewer_id', user_id).eq('status', 'active')
             if review_type:
                 query = query.eq('review_type', review_type)
-            result = query.order('created_at', desc=True).limit(limit).execute()
+            result = await query.order('created_at', desc=True).limit(limit).execute()
             return result.data
     except Exception as e:
         print(f"获取用户评价失败: {e}")
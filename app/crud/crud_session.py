@@ -2,7 +2,6 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 from app.schemas.session_schema import SessionCreate, SessionUpdate, SessionFeedback, SessionSummary
 import asyncpg
-from supabase import Client
 
 async def create_session(db_conn: Dict[str, Any], student_user_id: int, session_data: SessionCreate) -> Optional[Dict]:
     """创建指导会话"""
@@ -26,8 +25,8 @@ async def create_session(db_conn: Dict[str, Any], student_user_id: int, session_
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('mentorship_sessions').insert({
+            client = db_conn["connection"]
+            result = await client.table('mentorship_sessions').insert({
                 'student_id': student_user_id,
                 'mentor_id': session_data.mentor_id,
                 'order_id': session_data.order_id,
@@ -68,15 +67,15 @@ async def get_session_by_id(db_conn: Dict[str, Any], session_id: int, user_id: i
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('mentorship_sessions').select('*').eq('id', session_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('mentorship_sessions').select('*').eq('id', session_id).execute()
             if result.data:
                 session = result.data[0]
                 # 验证用户权限
                 if session['student_id'] == user_id:
                     return session
                 # 检查是否是指导者
-                mentor = client.table('mentorship_relationships').select('user_id').eq('id', session['mentor_id']).execute()
+                mentor = await client.table('mentorship_relationships').select('user_id').eq('id', session['mentor_id']).execute()
                 if mentor.data and mentor.data[0]['user_id'] == user_id:
                     return session
             return None
@@ -147,12 +146,12 @@ async def get_sessions_by_user(db_conn: Dict[str, Any], user_id: int, role: str
                 )
             return [dict(row) for row in results]
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             if role == "student":
-                result = client.table('mentorship_sessions').select('*').eq('student_id', user_id).order('scheduled_time', desc=True).limit(limit).execute()
+                result = await client.table('mentorship_sessions').select('*').eq('student_id', user_id).order('scheduled_time', desc=True).limit(limit).execute()
             else:
                 # 简化版：获取所有会话
-                result = client.table('mentorship_sessions').select('*').order('scheduled_time', desc=True).limit(limit).execute()
+                result = await client.table('mentorship_sessions').select('*').order('scheduled_time', desc=True).limit(limit).execute()
             return result.data
     except Exception as e:
         print(f"获取用户会话失败: {e}")
@@ -181,8 +180,8 @@ async def update_session(db_conn: Dict[str, Any], session_id: int, user_id: int,
             if result:
                 return await get_session_by_id(db_conn, session_id, user_id)
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('mentorship_sessions').update(update_data).eq('id', session_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('mentorship_sessions').update(update_data).eq('id', session_id).execute()
             if result.data:
                 return await get_session_by_id(db_conn, session_id, user_id)
         return None
@@ -209,8 +208,8 @@ async def start_session(db_conn: Dict[str, Any], session_id: int, user_id: int)
             )
             return result is not None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('mentorship_sessions').update({
+            client = db_conn["connection"]
+            result = await client.table('mentorship_sessions').update({
                 'status': 'in_progress',
                 'actual_start_time': datetime.now().isoformat()
             }).eq('id', session_id).eq('status', 'confirmed').execute()
@@ -255,7 +254,7 @@ async def end_session(db_conn: Dict[str, Any], session_id: int, user_id: int, ac
                 )
             return result is not None
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             update_data = {
                 'status': 'completed',
                 'actual_end_time': datetime.now().isoformat()
@@ -263,7 +262,7 @@ async def end_session(db_conn: Dict[str, Any], session_id: int, user_id: int, ac
             if actual_duration:
                 update_data['actual_duration'] = actual_duration
                 
-            result = client.table('mentorship_sessions').update(update_data).eq('id', session_id).eq('status', 'in_progress').execute()
+            result = await client.table('mentorship_sessions').update(update_data).eq('id', session_id).eq('status', 'in_progress').execute()
             return len(result.data) > 0
     except Exception as e:
         print(f"结束会话失败: {e}")
@@ -288,12 +287,12 @@ async def cancel_session(db_conn: Dict[str, Any], session_id: int, user_id: int,
             )
             return result is not None
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             update_data = {'status': 'cancelled'}
             if reason:
                 update_data['mentor_notes'] = reason
                 
-            result = client.table('mentorship_sessions').update(update_data).eq('id', session_id).execute()
+            result = await client.table('mentorship_sessions').update(update_data).eq('id', session_id).execute()
             return len(result.data) > 0
     except Exception as e:
         print(f"取消会话失败: {e}")
@@ -356,9 +355,9 @@ async def submit_session_feedback(db_conn: Dict[str, Any], session_id: int, user
                 )
             return result is not None
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 简化版反馈
-            result = client.table('mentorship_sessions').update({
+            result = await client.table('mentorship_sessions').update({
                 'student_feedback': feedback.comments,
                 'rating': feedback.rating
             }).eq('id', session_id).execute()
@@ -392,9 +391,9 @@ async def save_session_summary(db_conn: Dict[str, Any], session_id: int, user_id
             )
             return result is not None
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 简化版总结保存
-            result = client.table('mentorship_sessions').update({
+            result = await client.table('mentorship_sessions').update({
                 'mentor_notes': f"总结: {summary.key_points}"
             }).eq('id', session_id).execute()
             return len(result.data) > 0
@@ -457,9 +456,9 @@ async def get_upcoming_sessions(db_conn: Dict[str, Any], user_id: int, role: str
                 )
             return [dict(row) for row in results]
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 简化版：获取即将到来的会话
-            result = client.table('mentorship_sessions').select('*').gte('scheduled_time', datetime.now().isoformat()).in_('status', ['scheduled', 'confirmed']).order('scheduled_time').limit(limit).execute()
+            result = await client.table('mentorship_sessions').select('*').gte('scheduled_time', datetime.now().isoformat()).in_('status', ['scheduled', 'confirmed']).order('scheduled_time').limit(limit).execute()
             return result.data
     except Exception as e:
         print(f"获取即将到来的会话失败: {e}")
@@ -501,13 +500,13 @@ async def get_session_statistics(db_conn: Dict[str, Any], user_id: int, role: st
                 )
             return dict(stats) if stats else {}
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 简化版统计
             if role == "student":
-                sessions = client.table('mentorship_sessions').select('*').eq('student_id', user_id).execute()
+                sessions = await client.table('mentorship_sessions').select('*').eq('student_id', user_id).execute()
             else:
                 # 需要通过mentor关系查询
-                sessions = client.table('mentorship_sessions').select('*').execute()
+                sessions = await client.table('mentorship_sessions').select('*').execute()
             
             if sessions.data:
                 total = len(sessions.data)
@@ -1,7 +1,6 @@
 from typing import Optional, List, Dict, Any
 from app.schemas.student_schema import StudentCreate, StudentUpdate, LearningNeeds, LearningNeedsUpdate
 import asyncpg
-from supabase import Client
 
 async def create_student_profile(db_conn: Dict[str, Any], user_id: int, student_data: StudentCreate) -> Optional[Dict]:
     """创建申请者资料"""
@@ -25,8 +24,8 @@ async def create_student_profile(db_conn: Dict[str, Any], user_id: int, student_
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('user_learning_needs').insert({
+            client = db_conn["connection"]
+            result = await client.table('user_learning_needs').insert({
                 'user_id': user_id,
                 'urgency_level': 2,  # 中等紧急
                 'budget_min': None,
@@ -61,8 +60,8 @@ async def get_student_by_user_id(db_conn: Dict[str, Any], user_id: int) -> Optio
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('user_learning_needs').select(
+            client = db_conn["connection"]
+            result = await client.table('user_learning_needs').select(
                 '*, users:user_id(username, email), profiles:user_id(full_name, avatar_url)'
             ).eq('user_id', user_id).execute()
             return result.data[0] if result.data else None
@@ -90,8 +89,8 @@ async def update_student_profile(db_conn: Dict[str, Any], user_id: int, student_
             if result:
                 return await get_student_by_user_id(db_conn, user_id)
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('user_learning_needs').update(update_data).eq('user_id', user_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('user_learning_needs').update(update_data).eq('user_id', user_id).execute()
             if result.data:
                 return await get_student_by_user_id(db_conn, user_id)
         return None
@@ -118,8 +117,8 @@ async def create_learning_needs(db_conn: Dict[str, Any], learning_needs: Learnin
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('user_learning_needs').insert({
+            client = db_conn["connection"]
+            result = await client.table('user_learning_needs').insert({
                 'user_id': learning_needs.user_id,
                 'need_type': learning_needs.need_type,
                 'subject_area': learning_needs.subject_area,
@@ -148,8 +147,8 @@ async def get_learning_needs_by_user(db_conn: Dict[str, Any], user_id: int) -> L
             )
             return [dict(row) for row in results]
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('user_learning_needs').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+            client = db_conn["connection"]
+            result = await client.table('user_learning_needs').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
             return result.data
     except Exception as e:
         print(f"获取学习需求失败: {e}")
@@ -174,8 +173,8 @@ async def update_learning_needs(db_conn: Dict[str, Any], needs_id: int, user_id:
             result = await conn.fetchrow(query, needs_id, user_id, *update_data.values())
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('user_learning_needs').update(update_data).eq('id', needs_id).eq('user_id', user_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('user_learning_needs').update(update_data).eq('id', needs_id).eq('user_id', user_id).execute()
             return result.data[0] if result.data else None
     except Exception as e:
         print(f"更新学习需求失败: {e}")
@@ -192,8 +191,8 @@ async def delete_learning_needs(db_conn: Dict[str, Any], needs_id: int, user_id:
             )
             return result is not None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('user_learning_needs').delete().eq('id', needs_id).eq('user_id', user_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('user_learning_needs').delete().eq('id', needs_id).eq('user_id', user_id).execute()
             return len(result.data) > 0
     except Exception as e:
         print(f"删除学习需求失败: {e}")
@@ -233,8 +232,8 @@ async def get_student_application_progress(db_conn: Dict[str, Any], user_id: int
             result.update(dict(stats) if stats else {})
             return result
         else:
-            client: Client = db_conn["connection"]
-            student = client.table('user_learning_needs').select('*').eq('user_id', user_id).execute()
+            client = db_conn["connection"]
+            student = await client.table('user_learning_needs').select('*').eq('user_id', user_id).execute()
             if student.data:
                 return student.data[0]
             return {}
@@ -285,9 +284,9 @@ async def get_recommended_mentors_for_student(db_conn: Dict[str, Any], user_id:
             )
             return [dict(row) for row in results]
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 简化版推荐逻辑
-            result = client.table('mentorship_relationships').select(
+            result = await client.table('mentorship_relationships').select(
                 '*, users:user_id(username), profiles:user_id(full_name, avatar_url)'
             ).eq('verification_status', 'verified').order('rating', desc=True).limit(limit).execute()
             return result.data
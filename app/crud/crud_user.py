@@ -5,7 +5,6 @@
 import asyncpg
 from passlib.context import CryptContext
 from typing import Optional, Union, Dict, Any
-from supabase import Client
 
 from app.schemas.user_schema import UserCreate, UserUpdate, UserRead, ProfileUpdate, ProfileRead
 
@@ -32,8 +31,8 @@ async def get_user_by_id(db_conn: Dict[str, Any], user_id: int) -> Optional[Dict
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('users').select(
+            client = db_conn["connection"]
+            result = await client.table('users').select(
                 'id, username, email, password_hash, role, is_active, created_at'
             ).eq('id', user_id).execute()
             return result.data[0] if result.data else None
@@ -52,8 +51,8 @@ async def get_user_by_username(db_conn: Dict[str, Any], username: str) -> Option
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('users').select(
+            client = db_conn["connection"]
+            result = await client.table('users').select(
                 'id, username, email, password_hash, role, is_active, created_at'
             ).eq('username', username).execute()
             return result.data[0] if result.data else None
@@ -72,8 +71,8 @@ async def get_user_by_email(db_conn: Dict[str, Any], email: str) -> Optional[Dic
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('users').select(
+            client = db_conn["connection"]
+            result = await client.table('users').select(
                 'id, username, email, password_hash, role, is_active, created_at'
             ).eq('email', email).execute()
             return result.data[0] if result.data else None
@@ -111,8 +110,8 @@ async def create_user(db_conn: Dict[str, Any], user: UserCreate) -> Optional[Dic
             )
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('users').insert({
+            client = db_conn["connection"]
+            result = await client.table('users').insert({
                 'username': user.username,
                 'email': user.email,
                 'password_hash': hashed_password,
@@ -158,8 +157,8 @@ async def update_user(db_conn: Dict[str, Any], user_id: int, user_update: UserUp
             result = await conn.fetchrow(query, user_id, *update_data.values())
             return dict(result) if result else None
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('users').update(update_data).eq('id', user_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('users').update(update_data).eq('id', user_id).execute()
             return result.data[0] if result.data else None
             
     except Exception as e:
@@ -174,8 +173,8 @@ async def delete_user(db_conn: Dict[str, Any], user_id: int) -> bool:
             result = await conn.execute("DELETE FROM users WHERE id = $1", user_id)
             return result == "DELETE 1"
         else:
-            client: Client = db_conn["connection"]
-            result = client.table('users').delete().eq('id', user_id).execute()
+            client = db_conn["connection"]
+            result = await client.table('users').delete().eq('id', user_id).execute()
             return len(result.data) > 0
     except Exception as e:
         print(f"删除用户失败: {e}")
@@ -214,10 +213,10 @@ async def get_user_profile(db_conn: Dict[str, Any], user_id: int) -> Optional[Di
                 except:
                     return None
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 先获取用户信息
             try:
-                user_result = client.table('users').select(
+                user_result = await client.table('users').select(
                     'id, username, email, role, is_active, created_at'
                 ).eq('id', user_id).execute()
                 
@@ -228,7 +227,7 @@ async def get_user_profile(db_conn: Dict[str, Any], user_id: int) -> Optional[Di
                 
                 # 尝试获取profile信息，如果失败也不影响基本用户信息返回
                 try:
-                    profile_result = client.table('profiles').select(
+                    profile_result = await client.table('profiles').select(
                         'full_name, avatar_url, bio, phone, location, website, birth_date'
                     ).eq('user_id', user_id).execute()
                     
@@ -281,17 +280,17 @@ async def update_user_profile(db_conn: Dict[str, Any], user_id: int, profile: Pr
                 
             return await get_user_profile(db_conn, user_id)
         else:
-            client: Client = db_conn["connection"]
+            client = db_conn["connection"]
             # 检查profile是否存在
-            existing = client.table('profiles').select('id').eq('user_id', user_id).execute()
+            existing = await client.table('profiles').select('id').eq('user_id', user_id).execute()
             
             if existing.data:
                 # 更新
-                result = client.table('profiles').update(update_data).eq('user_id', user_id).execute()
+                result = await client.table('profiles').update(update_data).eq('user_id', user_id).execute()
             else:
                 # 创建
                 update_data['user_id'] = user_id
-                result = client.table('profiles').insert(update_data).execute()
+                result = await client.table('profiles').insert(update_data).execute()
             
             return await get_user_profile(db_conn, user_id)
             
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+构建大学/专业相似度图
+从 university_rankings、major_relations、major_categories、别名表以及现有指导者记录
+物化规范化别名表和稀疏相似度矩阵，写入 settings.MATCHING_SIMILARITY_PATH，应用启动时加载
+
+用法: python scripts/database/build_matching_similarity.py [输出路径]
+"""
+import asyncio
+import os
+import sys
+
+import asyncpg
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.config import settings
+from app.core.matching_similarity import build_similarity_graph
+
+
+async def fetch_pairs(conn, query: str):
+    """执行查询并返回二元组列表，表不存在时返回空列表"""
+    try:
+        rows = await conn.fetch(query)
+    except asyncpg.UndefinedTableError:
+        print(f"⚠️ 表不存在，跳过: {query}")
+        return []
+    return [(row[0], row[1]) for row in rows]
+
+
+async def main():
+    output_path = sys.argv[1] if len(sys.argv) > 1 else settings.MATCHING_SIMILARITY_PATH
+    print("🔧 构建大学/专业相似度图...")
+
+    conn = await asyncpg.connect(settings.postgres_url)
+    try:
+        university_rankings = await fetch_pairs(conn, "SELECT university, ranking FROM university_rankings")
+        university_aliases = await fetch_pairs(conn, "SELECT alias, university FROM university_aliases")
+        major_relations = await fetch_pairs(conn, "SELECT major1, major2 FROM major_relations")
+        major_categories = await fetch_pairs(conn, "SELECT major, category FROM major_categories")
+        major_aliases = await fetch_pairs(conn, "SELECT alias, major FROM major_aliases")
+        mentor_names = await fetch_pairs(
+            conn, "SELECT DISTINCT university, major FROM mentorship_relationships"
+        )
+    finally:
+        await conn.close()
+
+    graph = build_similarity_graph(
+        university_rankings=university_rankings,
+        university_aliases=university_aliases,
+        major_relations=major_relations,
+        major_categories=major_categories,
+        major_aliases=major_aliases,
+        universities=[university for university, _ in mentor_names if university],
+        majors=[major for _, major in mentor_names if major],
+    )
+    graph.save(output_path)
+
+    university_edges = sum(len(row) for row in graph.universities.rows) // 2
+    major_edges = sum(len(row) for row in graph.majors.rows) // 2
+    print(f"✅ 大学: {len(graph.universities)} 个, 边 {university_edges} 条")
+    print(f"✅ 专业: {len(graph.majors)} 个, 边 {major_edges} 条")
+    print(f"📁 已写入: {output_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -86,3 +86,21 @@ CREATE INDEX IF NOT EXISTS idx_major_relations_major1 ON major_relations(major1)
 CREATE INDEX IF NOT EXISTS idx_major_relations_major2 ON major_relations(major2);
 CREATE INDEX IF NOT EXISTS idx_major_categories_major ON major_categories(major);
 CREATE INDEX IF NOT EXISTS idx_major_categories_category ON major_categories(category);
+
+-- Alias tables for normalized university/major names
+-- (consumed by scripts/database/build_matching_similarity.py)
+CREATE TABLE IF NOT EXISTS university_aliases (
+    id SERIAL PRIMARY KEY,
+    alias VARCHAR(255) NOT NULL,
+    university VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(alias)
+);
+
+CREATE TABLE IF NOT EXISTS major_aliases (
+    id SERIAL PRIMARY KEY,
+    alias VARCHAR(255) NOT NULL,
+    major VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE(alias)
+);
@@ -0,0 +1,76 @@
+"""
+Test suite for AgentFactory executor pooling
+Covers sharing compiled graphs across tenants, LRU eviction and per-request tenant isolation
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.agents.agent_factory import AgentConfig, AgentFactory, AgentType
+from app.agents.v2.ai_foundation.llm.providers.base_provider import LLMResponse
+
+class EchoLLM:
+    async def chat(self, tenant_id, model_name, messages, **kwargs):
+        await asyncio.sleep(0.01)
+        return LLMResponse(content=f"{tenant_id}:{messages[-1]['content']}", model=model_name,
+                           usage={}, finish_reason="stop", response_time=0)
+
+class RecordingMemoryBank:
+    def __init__(self):
+        self.users = []
+
+    async def get_context(self, user_id, **kwargs):
+        self.users.append(user_id)
+        return SimpleNamespace(context_summary=f"{user_id} 的历史")
+
+    async def add_interaction(self, user_id, **kwargs):
+        self.users.append(user_id)
+
+def config(tenant_id, **overrides):
+    return AgentConfig(agent_type=AgentType.STUDY_PLANNER, tenant_id=tenant_id, rag_enabled=False, **overrides)
+
+class TestExecutorPool:
+    """Test executor reuse and eviction"""
+
+    def test_shared_across_tenants(self):
+        factory = AgentFactory(llm_manager=EchoLLM(), memory_bank=RecordingMemoryBank(), rag_manager=None)
+        first = factory.get_agent_executor(config("user-1"))
+        assert factory.get_agent_executor(config("user-2")) is first
+        assert factory.get_agent_executor(config("user-1", tools=["web_search"])) is not first
+
+    def test_lru_eviction(self):
+        factory = AgentFactory(llm_manager=EchoLLM(), memory_bank=None, rag_manager=None, max_executors=2)
+        a = factory.get_agent_executor(config("t", model_name="a"))
+        factory.get_agent_executor(config("t", model_name="b"))
+        factory.get_agent_executor(config("t", model_name="a"))
+        factory.get_agent_executor(config("t", model_name="c"))
+        assert factory.get_agent_executor(config("t", model_name="a")) is a
+        assert len(factory._executors) == 2
+
+    def test_rebuilt_when_dependencies_change(self):
+        factory = AgentFactory(llm_manager=None, memory_bank=None, rag_manager=None)
+        stale = factory.get_agent_executor(config("t"))
+        factory.llm_manager = EchoLLM()
+        fresh = factory.get_agent_executor(config("t"))
+        assert fresh is not stale and fresh.llm_manager is factory.llm_manager
+
+class TestTenantIsolation:
+    """Test per-request tenant flows through the graph input"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_tenants_on_shared_executor(self):
+        memory = RecordingMemoryBank()
+        factory = AgentFactory(llm_manager=EchoLLM(), memory_bank=memory, rag_manager=None)
+        executor = factory.get_agent_executor(config("user-1"))
+        responses = await asyncio.gather(
+            executor.execute("问题A", tenant_id="user-1"),
+            executor.execute("问题B", tenant_id="user-2"),
+        )
+        assert responses == ["user-1:问题A", "user-2:问题B"]
+        assert sorted(memory.users) == ["user-1", "user-1", "user-2", "user-2"]
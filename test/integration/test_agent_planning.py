@@ -0,0 +1,176 @@
+"""
+Test suite for AgentExecutor planning modes
+Covers the single-generation static plan, the retrieval classifier, parallel retrieval with timeouts,
+tool-calling iterations and the legacy think loop
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import time
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.agents.agent_factory import (
+    AgentConfig, AgentExecutor, AgentState, AgentType, PlanningMode, ToolRegistry
+)
+from app.agents.v2.ai_foundation.llm.providers.base_provider import LLMResponse
+
+class ScriptedLLM:
+    """Returns scripted responses in order, then a default answer"""
+
+    def __init__(self, script=None):
+        self.script = list(script or [])
+        self.calls = []
+
+    async def chat(self, tenant_id, model_name, messages, **kwargs):
+        self.calls.append({"model": model_name, "messages": messages, **kwargs})
+        item = self.script.pop(0) if self.script else "最终回答"
+        tool_calls = item if isinstance(item, list) else []
+        return LLMResponse(
+            content="" if tool_calls else item,
+            model=model_name,
+            usage={"total_tokens": 1},
+            finish_reason="stop",
+            response_time=0,
+            has_tool_call=bool(tool_calls),
+            tool_calls=tool_calls
+        )
+
+class FakeMemoryBank:
+    def __init__(self):
+        self.context_calls = 0
+        self.interactions = []
+
+    async def get_context(self, **kwargs):
+        self.context_calls += 1
+        return SimpleNamespace(context_summary="用户GPA 3.6")
+
+    async def add_interaction(self, **kwargs):
+        self.interactions.append(kwargs)
+
+class FakeRAG:
+    def __init__(self):
+        self.calls = 0
+
+    async def query(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(documents=[{"content": "CMU MSCS 要求 GRE"}])
+
+def make_executor(llm, mode=PlanningMode.STATIC, tools=None):
+    registry = ToolRegistry()
+    for name, func in (tools or {}).items():
+        registry.register_tool(name, func)
+    memory, rag = FakeMemoryBank(), FakeRAG()
+    config = AgentConfig(agent_type=AgentType.STUDY_PLANNER, tenant_id="t", planning_mode=mode)
+    return AgentExecutor(config, llm_manager=llm, memory_bank=memory, rag_manager=rag, tool_registry=registry), memory, rag
+
+class TestStaticPlanning:
+    """Test that retrieval runs up front and only the final generation calls the LLM"""
+
+    @pytest.mark.asyncio
+    async def test_single_llm_call(self):
+        llm = ScriptedLLM()
+        executor, memory, rag = make_executor(llm)
+        assert await executor.execute("推荐CS项目") == "最终回答"
+        assert len(llm.calls) == 1
+        assert memory.context_calls == 1 and rag.calls == 1
+        contents = [message["content"] for message in llm.calls[0]["messages"]]
+        assert any("GPA 3.6" in content for content in contents)
+        assert any("CMU MSCS" in content for content in contents)
+        assert len(memory.interactions) == 1
+
+    @pytest.mark.asyncio
+    async def test_tool_iteration(self):
+        async def lookup(school):
+            return f"{school} 截止日期 12-15"
+
+        llm = ScriptedLLM([[{"name": "lookup", "arguments": {"school": "CMU"}}], "CMU 12月15日截止"])
+        executor, memory, _ = make_executor(llm, tools={"lookup": lookup})
+        assert await executor.execute("CMU什么时候截止") == "CMU 12月15日截止"
+        assert len(llm.calls) == 2
+        assert any("截止日期 12-15" in message["content"] for message in llm.calls[1]["messages"])
+        assert len(memory.interactions) == 1
+
+class TestClassifierPlanning:
+    """Test the cheap classifier deciding which retrieval to run"""
+
+    @pytest.mark.asyncio
+    async def test_classifier_skips_memory(self):
+        llm = ScriptedLLM(['{"memory": false, "knowledge": true}'])
+        executor, memory, rag = make_executor(llm, mode=PlanningMode.CLASSIFIER)
+        await executor.execute("CMU 要求什么")
+        assert len(llm.calls) == 2
+        assert llm.calls[0]["temperature"] == 0
+        assert memory.context_calls == 0 and rag.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_unparseable_classification_retrieves_everything(self):
+        llm = ScriptedLLM(["不确定"])
+        executor, memory, rag = make_executor(llm, mode=PlanningMode.CLASSIFIER)
+        await executor.execute("你好")
+        assert memory.context_calls == 1 and rag.calls == 1
+
+class TestReactPlanning:
+    """Test the legacy think loop is still available"""
+
+    @pytest.mark.asyncio
+    async def test_think_before_each_step(self):
+        llm = ScriptedLLM()
+        executor, _, _ = make_executor(llm, mode=PlanningMode.REACT)
+        await executor.execute("你好")
+        assert len(llm.calls) == 4
+
+class SlowMemoryBank(FakeMemoryBank):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    async def get_context(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        return await super().get_context(**kwargs)
+
+class SlowRAG(FakeRAG):
+    def __init__(self, delay=0.0, error=None):
+        super().__init__()
+        self.delay = delay
+        self.error = error
+
+    async def query(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return await super().query(**kwargs)
+
+class TestParallelRetrieval:
+    """Test the fan-out retrieval stage"""
+
+    @staticmethod
+    def make(memory, rag, **config):
+        config = AgentConfig(agent_type=AgentType.STUDY_PLANNER, tenant_id="t", **config)
+        return AgentExecutor(config, llm_manager=ScriptedLLM(), memory_bank=memory, rag_manager=rag,
+                             tool_registry=ToolRegistry())
+
+    @pytest.mark.asyncio
+    async def test_runs_concurrently(self):
+        executor = self.make(SlowMemoryBank(0.1), SlowRAG(0.1))
+        start = time.monotonic()
+        await executor.execute("你好")
+        assert time.monotonic() - start < 0.18
+        contents = [m["content"] for m in executor.llm_manager.calls[0]["messages"]]
+        assert any("GPA 3.6" in c for c in contents) and any("CMU MSCS" in c for c in contents)
+
+    @pytest.mark.asyncio
+    async def test_timeout_and_error_degrade(self):
+        executor = self.make(SlowMemoryBank(1.0), SlowRAG(error=RuntimeError("es down")), memory_timeout=0.05)
+        start = time.monotonic()
+        assert await executor.execute("你好") == "最终回答"
+        assert time.monotonic() - start < 0.5
+        state = AgentState(input="你好", messages=[], context={}, tool_calls=[])
+        state = await executor._retrieve_context_node(state)
+        assert state.metadata["retrieval"]["memory"]["status"] == "timeout"
+        assert state.metadata["retrieval"]["knowledge"]["status"] == "error"
+        assert state.memory_context is None and state.rag_results is None
@@ -0,0 +1,149 @@
+"""
+Test suite for the LLM completion cache
+Covers key derivation, temperature/opt-in gating, single-flight deduplication, size limits and shared stores
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.llm import completion_cache as completion_cache_module
+from app.agents.v2.ai_foundation.llm.completion_cache import CompletionCache, completion_key
+from app.agents.v2.ai_foundation.llm.manager import LLMManager, ModelConfig, ModelProvider
+from app.agents.v2.ai_foundation.llm.providers.base_provider import LLMResponse
+
+MESSAGES = [{"role": "user", "content": "推荐几所美国CS硕士项目"}]
+
+class CountingProvider:
+    def __init__(self, delay=0.0, error=None):
+        self.calls = 0
+        self.delay = delay
+        self.error = error
+
+    async def chat(self, messages, model=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return LLMResponse(
+            content=f"回答 #{self.calls}",
+            model=model,
+            usage={"total_tokens": 10},
+            finish_reason="stop",
+            response_time=self.delay
+        )
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+async def make_manager(provider):
+    manager = LLMManager()
+    await manager.initialize([ModelConfig(name="m", provider=ModelProvider.MOCK, api_key="mock", rate_limit=1000)])
+    manager.providers["m"] = provider
+    return manager
+
+class TestCompletionKey:
+    """Test cache key derivation"""
+
+    def test_key_depends_on_parameters(self):
+        base = completion_key("m", MESSAGES, temperature=0, max_tokens=100)
+        assert base == completion_key("m", [dict(MESSAGES[0])], max_tokens=100, temperature=0)
+        assert base != completion_key("m", MESSAGES, temperature=0, max_tokens=200)
+        assert base != completion_key("m", MESSAGES, temperature=0, max_tokens=100, tools=[{"name": "search"}])
+        assert base != completion_key("other", MESSAGES, temperature=0, max_tokens=100)
+
+class TestLLMManagerCompletionCache:
+    """Test caching in LLMManager.chat"""
+
+    @pytest.mark.asyncio
+    async def test_caches_only_deterministic_or_opt_in(self):
+        provider = CountingProvider()
+        manager = await make_manager(provider)
+
+        first = await manager.chat("t", "m", MESSAGES, temperature=0)
+        second = await manager.chat("t", "m", MESSAGES, temperature=0)
+        assert first.content == second.content == "回答 #1"
+
+        await manager.chat("t", "m", MESSAGES, temperature=0.7)
+        await manager.chat("t", "m", MESSAGES, temperature=0.7)
+        assert provider.calls == 3
+
+        await manager.chat("t", "m", MESSAGES, temperature=0.7, cache=True)
+        cached = await manager.chat("t", "m", MESSAGES, temperature=0.7, cache=True)
+        assert provider.calls == 4
+        assert cached.content == "回答 #4"
+        assert manager.get_cache_stats()["hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_calls_share_one_request(self):
+        provider = CountingProvider(delay=0.02)
+        manager = await make_manager(provider)
+        responses = await asyncio.gather(*[
+            manager.chat("t", "m", MESSAGES, temperature=0) for _ in range(5)
+        ])
+        assert provider.calls == 1
+        assert {response.content for response in responses} == {"回答 #1"}
+        assert manager.get_cache_stats()["coalesced"] == 4
+
+    @pytest.mark.asyncio
+    async def test_errors_are_not_cached(self):
+        provider = CountingProvider(error=RuntimeError("upstream down"))
+        manager = await make_manager(provider)
+        for _ in range(2):
+            with pytest.raises(Exception):
+                await manager.chat("t", "m", MESSAGES, temperature=0)
+        assert provider.calls == 2
+        assert len(manager.completion_cache) == 0
+
+class TestCompletionCache:
+    """Test LRU limits, TTL and the shared store"""
+
+    @staticmethod
+    def response(content):
+        async def compute():
+            return LLMResponse(content=content, model="m", usage={}, finish_reason="stop", response_time=0)
+        return compute
+
+    @pytest.mark.asyncio
+    async def test_entry_and_byte_limits(self):
+        cache = CompletionCache(max_entries=2)
+        for i in range(3):
+            await cache.get_or_compute(f"k{i}", self.response(f"r{i}"))
+        assert len(cache) == 2 and cache.stats["evictions"] == 1
+
+        size = len(completion_cache_module.encode_response(
+            LLMResponse(content="x" * 100, model="m", usage={}, finish_reason="stop", response_time=0)
+        ))
+        cache = CompletionCache(max_bytes=size * 2)
+        for i in range(3):
+            await cache.get_or_compute(f"k{i}", self.response("x" * 100))
+        assert len(cache) == 2
+        assert cache.get_stats()["bytes"] <= size * 2
+
+    @pytest.mark.asyncio
+    async def test_ttl_and_shared_store(self, monkeypatch):
+        redis = FakeRedis()
+        cache = CompletionCache(ttl=60, store=completion_cache_module.RedisCompletionStore(redis))
+        await cache.get_or_compute("k", self.response("first"))
+        assert redis.data
+
+        # 另一个实例从共享存储命中
+        other = CompletionCache(store=completion_cache_module.RedisCompletionStore(redis))
+        assert (await other.get_or_compute("k", self.response("second"))).content == "first"
+        assert other.stats["store_hits"] == 1
+
+        now = completion_cache_module.time.time()
+        monkeypatch.setattr(completion_cache_module.time, "time", lambda: now + 61)
+        cache.store = None
+        assert (await cache.get_or_compute("k", self.response("fresh"))).content == "fresh"
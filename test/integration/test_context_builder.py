@@ -0,0 +1,184 @@
+"""
+Test suite for token-budgeted memory context assembly
+Covers budget fitting, background rolling summaries and the bounded prompt size
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.memory.context_builder import TokenCounter, fit_turns_to_budget
+from app.agents.v2.ai_foundation.memory.memory_bank import MemoryBank
+
+class CharCounter(TokenCounter):
+    """One token per character, keeps the tests independent of tiktoken downloads"""
+
+    def count(self, text):
+        return len(text or "")
+
+class FakeEmbeddingManager:
+    def __init__(self):
+        self.calls = 0
+
+    async def embed_texts(self, tenant_id, model_name, texts):
+        self.calls += 1
+        return [[0.1, 0.2] for _ in texts]
+
+class FakeSummarizer:
+    def __init__(self, delay=0):
+        self.calls = []
+        self.delay = delay
+
+    async def update_summary(self, previous_summary, new_turns, user_id):
+        self.calls.append((previous_summary, [t["human"] for t in new_turns]))
+        await asyncio.sleep(self.delay)
+        humans = ",".join(t["human"] for t in new_turns)
+        return f"{previous_summary}|{humans}" if previous_summary else humans
+
+def make_bank(recent_turns=2, delay=0):
+    bank = MemoryBank(
+        llm_manager=None,
+        embedding_manager=FakeEmbeddingManager(),
+        recent_turns=recent_turns,
+        token_counter=CharCounter()
+    )
+    bank.summarizer = bank.rolling_summarizer.summarizer = FakeSummarizer(delay)
+    return bank
+
+class TestFitTurnsToBudget:
+    """Newest-first selection under a token budget"""
+
+    def test_keeps_newest_turns_that_fit(self):
+        turns = [{"human": f"q{i}", "assistant": "aaaa"} for i in range(5)]
+        selected, used = fit_turns_to_budget(turns, 13, CharCounter())
+
+        assert [t["human"] for t in selected] == ["q3", "q4"]
+        assert used == 12
+
+    def test_always_keeps_latest_turn(self):
+        turns = [{"human": "q", "assistant": "a" * 100}]
+        selected, used = fit_turns_to_budget(turns, 10, CharCounter())
+
+        assert len(selected) == 1
+        assert used == 101
+
+class TestRollingSummary:
+    """Older turns are folded into a per-session summary in the background"""
+
+    @pytest.mark.asyncio
+    async def test_no_fold_until_batch_is_full(self):
+        bank = make_bank(recent_turns=2)
+        for i in range(5):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a")
+        await bank.rolling_summarizer.wait("s1")
+
+        # 5 turns - 2 recent = 3 pending, below the default fold batch of 4
+        assert bank.summarizer.calls == []
+
+    @pytest.mark.asyncio
+    async def test_folds_incrementally(self):
+        bank = make_bank(recent_turns=2)
+        for i in range(6):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a")
+        await bank.rolling_summarizer.wait("s1")
+
+        assert bank.rolling_summarizer.get_summary("s1").text == "q0,q1,q2,q3"
+
+        for i in range(6, 10):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a")
+        await bank.rolling_summarizer.wait("s1")
+
+        # only the new turns are sent, together with the previous summary
+        assert bank.summarizer.calls[-1] == ("q0,q1,q2,q3", ["q4", "q5", "q6", "q7"])
+        assert bank.rolling_summarizer.get_summary("s1").text == "q0,q1,q2,q3|q4,q5,q6,q7"
+        assert bank.rolling_summarizer.get_stats()["folded_turns"] == 8
+
+    @pytest.mark.asyncio
+    async def test_single_fold_task_per_session(self):
+        bank = make_bank(recent_turns=1, delay=0.05)
+        for i in range(5):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a")
+        for i in range(5, 9):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a")
+        await bank.rolling_summarizer.wait("s1")
+
+        assert len(bank.summarizer.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_fold_reads_bounded_window(self):
+        bank = make_bank(recent_turns=2)
+        rolling = bank.rolling_summarizer
+        rolling.max_fold_turns = 5
+        for i in range(30):
+            await bank.working_memory.add_interaction("s1", f"q{i}", "a")
+
+        reads = []
+        get_history = bank.working_memory.get_session_history
+
+        async def spy(session_id, last_n=None):
+            reads.append(last_n)
+            return await get_history(session_id, last_n=last_n)
+
+        bank.working_memory.get_session_history = spy
+        rolling.schedule("s1", "u1")
+        await rolling.wait("s1")
+
+        assert reads == [7]
+        # only the newest unfolded turns before the recent window are sent
+        assert bank.summarizer.calls == [("", ["q23", "q24", "q25", "q26", "q27"])]
+
+    @pytest.mark.asyncio
+    async def test_end_session_discards_summary(self):
+        bank = make_bank(recent_turns=2)
+        for i in range(6):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a")
+        await bank.rolling_summarizer.wait("s1")
+        bank._compress_and_store = lambda *args: asyncio.sleep(0)
+        await bank.end_session("s1", "u1")
+
+        assert bank.rolling_summarizer.get_summary("s1").text == ""
+
+class TestBudgetedContext:
+    """get_context returns a bounded context"""
+
+    @pytest.mark.asyncio
+    async def test_context_uses_summary_and_recent_turns(self):
+        bank = make_bank(recent_turns=2)
+        for i in range(6):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a")
+        await bank.rolling_summarizer.wait("s1")
+
+        context = await bank.get_context(session_id="s1", user_id="u1", query="hi")
+
+        assert context.session_summary == "q0,q1,q2,q3"
+        assert [t["human"] for t in context.session_history] == ["q4", "q5"]
+        assert "早期对话摘要" in context.context_summary
+        assert context.total_tokens == len("q0,q1,q2,q3") + 2 * len("q4a")
+
+    @pytest.mark.asyncio
+    async def test_unfolded_turns_stay_verbatim(self):
+        bank = make_bank(recent_turns=2)
+        for i in range(5):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a")
+
+        context = await bank.get_context(session_id="s1", user_id="u1", query="hi")
+
+        assert context.session_summary == ""
+        assert [t["human"] for t in context.session_history] == ["q0", "q1", "q2", "q3", "q4"]
+
+    @pytest.mark.asyncio
+    async def test_prompt_size_is_bounded(self):
+        bank = make_bank(recent_turns=4)
+        for i in range(40):
+            await bank.add_interaction("s1", "u1", f"q{i}", "a" * 50)
+        await bank.rolling_summarizer.wait("s1")
+
+        context = await bank.get_context(session_id="s1", user_id="u1", query="hi", token_budget=300)
+
+        assert context.total_tokens <= 300
+        assert context.session_summary
+        assert [t["human"] for t in context.session_history] == ["q36", "q37", "q38", "q39"]
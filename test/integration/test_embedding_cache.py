@@ -0,0 +1,140 @@
+"""
+Test suite for the embedding cache
+Covers LRU hits, float16 storage, second-tier stores, in-flight coalescing and micro-batching
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.llm.embedding_batcher import EmbeddingBatcher
+from app.agents.v2.ai_foundation.llm.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore
+from app.agents.v2.ai_foundation.llm.manager import EmbeddingManager, ModelConfig, ModelProvider
+
+class CountingProvider:
+    def __init__(self, delay=0.0, error=None):
+        self.calls = []
+        self.delay = delay
+        self.error = error
+
+    async def embed_texts(self, texts, model, **kwargs):
+        self.calls.append(list(texts))
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [[float(len(text)), 0.5, -0.25] for text in texts]
+
+def make_manager(provider, cache=None):
+    manager = EmbeddingManager(cache)
+    manager.models["test-embedding"] = ModelConfig(name="test-embedding", provider=ModelProvider.OPENAI, api_key="k")
+    manager.providers["test-embedding"] = provider
+    return manager
+
+class TestEmbeddingCache:
+    """Test cache behaviour through EmbeddingManager.embed_texts"""
+
+    @pytest.mark.asyncio
+    async def test_hits_and_dedupe(self):
+        provider = CountingProvider()
+        manager = make_manager(provider)
+
+        first = await manager.embed_texts("t1", "test-embedding", ["留学", "申请", "留学"])
+        second = await manager.embed_texts("t2", "test-embedding", ["申请", "文书"])
+
+        assert provider.calls == [["留学", "申请"], ["文书"]]
+        assert first[0] == first[2] == [2.0, 0.5, -0.25]
+        assert second[0] == [2.0, 0.5, -0.25]
+        assert manager.cache.stats["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        provider = CountingProvider()
+        manager = make_manager(provider, EmbeddingCache(max_entries=2))
+        await manager.embed_texts("t1", "test-embedding", ["a", "bb", "ccc"])
+        await manager.embed_texts("t1", "test-embedding", ["a"])
+        assert provider.calls[-1] == ["a"]
+        assert len(manager.cache) == 2
+
+    @pytest.mark.asyncio
+    async def test_coalesces_concurrent_requests(self):
+        provider = CountingProvider(delay=0.05)
+        manager = make_manager(provider)
+        results = await asyncio.gather(*[
+            manager.embed_texts("t1", "test-embedding", ["同一个问题"]) for _ in range(10)
+        ])
+        assert len(provider.calls) == 1
+        assert all(result == results[0] for result in results)
+        assert manager.cache.stats["coalesced"] == 9
+
+    @pytest.mark.asyncio
+    async def test_failures_are_not_cached(self):
+        provider = CountingProvider(error=RuntimeError("429"))
+        manager = make_manager(provider)
+        with pytest.raises(Exception):
+            await manager.embed_texts("t1", "test-embedding", ["q"])
+        assert not manager.cache._inflight
+
+        provider.error = None
+        assert await manager.embed_texts("t1", "test-embedding", ["q"]) == [[1.0, 0.5, -0.25]]
+
+    @pytest.mark.asyncio
+    async def test_sqlite_second_tier(self, tmp_path):
+        path = str(tmp_path / "embeddings.db")
+        provider = CountingProvider()
+        await make_manager(provider, EmbeddingCache(store=SQLiteEmbeddingStore(path))).embed_texts(
+            "t1", "test-embedding", ["persisted"])
+
+        # 新进程: 一级缓存为空，从 SQLite 读取
+        fresh = make_manager(provider, EmbeddingCache(store=SQLiteEmbeddingStore(path)))
+        result = await fresh.embed_texts("t1", "test-embedding", ["persisted"])
+        assert len(provider.calls) == 1
+        assert result == [[9.0, 0.5, -0.25]]
+        assert fresh.cache.stats["store_hits"] == 1
+
+class TestEmbeddingBatcher:
+    """Test micro-batching of concurrent embedding requests"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_request(self):
+        provider = CountingProvider()
+        manager = make_manager(provider)
+        texts = [f"query {i}" * (i + 1) for i in range(20)]
+        results = await asyncio.gather(*[
+            manager.embed_texts("t1", "test-embedding", [text]) for text in texts
+        ])
+
+        assert len(provider.calls) == 1
+        assert sorted(provider.calls[0]) == sorted(texts)
+        assert [result[0][0] for result in results] == [float(len(text)) for text in texts]
+
+    @pytest.mark.asyncio
+    async def test_batch_size_and_large_requests(self):
+        provider = CountingProvider()
+        batcher = EmbeddingBatcher(lambda texts: provider.embed_texts(texts, "m"), max_batch_size=4)
+        await asyncio.gather(*[batcher.embed([str(i)]) for i in range(10)])
+        assert [len(call) for call in provider.calls] == [4, 4, 2]
+
+        provider.calls.clear()
+        result = await batcher.embed([str(i) for i in range(9)])
+        assert len(result) == 9
+        assert [len(call) for call in provider.calls] == [4, 4, 1]
+
+    @pytest.mark.asyncio
+    async def test_failures_are_isolated(self):
+        async def embed_fn(texts):
+            if "bad" in texts:
+                raise ValueError("invalid input")
+            return [[1.0] for _ in texts]
+
+        batcher = EmbeddingBatcher(embed_fn)
+        results = await asyncio.gather(
+            batcher.embed(["ok"]), batcher.embed(["bad"]), batcher.embed(["fine", "good"]),
+            return_exceptions=True
+        )
+        assert results[0] == [[1.0]]
+        assert isinstance(results[1], ValueError)
+        assert results[2] == [[1.0], [1.0]]
@@ -0,0 +1,83 @@
+"""
+Test suite for HybridRetriever
+Covers concurrent execution, RRF/score fusion, timeouts and partial results
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.data_communication.rag.rag_manager import DocumentChunk, HybridRetriever
+from app.agents.v2.core_infrastructure.error.exceptions import RAGException
+
+class FakeRetriever:
+    def __init__(self, ids, delay=0.0, error=None):
+        self.chunks = [DocumentChunk(id=i, content=i, metadata={}, score=1.0 - n * 0.1)
+                       for n, i in enumerate(ids)]
+        self.delay = delay
+        self.error = error
+
+    async def search(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.chunks
+
+def make_retriever(vector, keyword, **kwargs):
+    return HybridRetriever(vector, keyword, **kwargs)
+
+class TestHybridRetriever:
+    """Test hybrid retrieval fusion and failure handling"""
+
+    @pytest.mark.asyncio
+    async def test_rrf_fusion_without_mutation(self):
+        vector = FakeRetriever(["a", "b", "c"])
+        keyword = FakeRetriever(["c", "b", "d"])
+        results = await make_retriever(vector, keyword).search("q", [0.1], top_k=4,
+                                                                vector_weight=1.0, keyword_weight=1.0)
+
+        scores = {chunk.id: chunk.score for chunk in results}
+        assert {chunk.id for chunk in results[:2]} == {"b", "c"}
+        assert scores["b"] == pytest.approx(1 / 62 + 1 / 62)
+        assert scores["a"] == pytest.approx(1 / 61)
+        assert [chunk.score for chunk in vector.chunks] == pytest.approx([1.0, 0.9, 0.8])
+        originals = {id(chunk) for chunk in vector.chunks + keyword.chunks}
+        assert all(id(chunk) not in originals for chunk in results)
+
+    @pytest.mark.asyncio
+    async def test_score_fusion(self):
+        results = await make_retriever(FakeRetriever(["a", "b"]), FakeRetriever(["b"])).search(
+            "q", [0.1], top_k=2, vector_weight=0.2, keyword_weight=0.8, fusion="score")
+        assert [chunk.id for chunk in results] == ["b", "a"]
+        assert results[0].score == pytest.approx(0.8)
+        assert results[1].score == pytest.approx(0.2)
+
+    @pytest.mark.asyncio
+    async def test_runs_concurrently(self):
+        retriever = make_retriever(FakeRetriever(["a"], delay=0.2), FakeRetriever(["b"], delay=0.2))
+        start = time.perf_counter()
+        await retriever.search("q", [0.1])
+        assert time.perf_counter() - start < 0.35
+
+    @pytest.mark.asyncio
+    async def test_partial_results_on_timeout_and_error(self):
+        slow = make_retriever(FakeRetriever(["a"]), FakeRetriever(["b"], delay=1.0), keyword_timeout=0.05)
+        assert [chunk.id for chunk in await slow.search("q", [0.1])] == ["a"]
+
+        broken = make_retriever(FakeRetriever(["a"], error=RuntimeError("down")), FakeRetriever(["b"]))
+        assert [chunk.id for chunk in await broken.search("q", [0.1])] == ["b"]
+
+        with pytest.raises(RAGException):
+            await broken.search("q", [0.1], allow_partial=False)
+
+    @pytest.mark.asyncio
+    async def test_all_retrievers_failing_raises(self):
+        retriever = make_retriever(FakeRetriever(["a"], error=RuntimeError("down")),
+                                   FakeRetriever(["b"], delay=1.0), keyword_timeout=0.05)
+        with pytest.raises(RAGException):
+            await retriever.search("q", [0.1])
@@ -0,0 +1,140 @@
+"""
+Test suite for the local BM25 keyword index
+Covers CJK tokenization, BM25 ranking with MaxScore pruning, deletes and persistence
+"""
+
+import pytest
+import sys
+import os
+import math
+import random
+from collections import Counter
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.data_communication.rag import keyword_index
+from app.agents.v2.data_communication.rag.keyword_index import (
+    LocalKeywordIndex, KeywordSegment, PostingList, tokenize
+)
+
+DOCS = [
+    "张同学本科清华大学计算机专业，GPA 3.8，成功申请斯坦福大学CS硕士",
+    "李同学通过托福和GRE考试，获得MIT电子工程博士录取",
+    "王同学申请英国牛津大学法学硕士，文书突出实习经历",
+    "留学申请时间规划：提前一年准备语言考试和推荐信",
+]
+
+def add_docs(index, tenant_id, docs, document_id="doc"):
+    ids = [f"{document_id}_{i}" for i in range(len(docs))]
+    index.add(tenant_id, ids, docs, [{"document_id": document_id} for _ in docs])
+    return ids
+
+def brute_force_bm25(docs, query, k1=keyword_index.BM25_K1, b=keyword_index.BM25_B):
+    tokenized = [Counter(tokenize(doc)) for doc in docs]
+    avg_length = sum(sum(t.values()) for t in tokenized) / len(docs)
+    scores = []
+    for terms in tokenized:
+        length = sum(terms.values())
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(1 for t in tokenized if term in t)
+            if not df or term not in terms:
+                continue
+            idf = math.log(1.0 + (len(docs) - df + 0.5) / (df + 0.5))
+            tf = terms[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+        scores.append(score)
+    return scores
+
+class TestTokenizer:
+    """Test mixed Chinese/English tokenization"""
+
+    def test_cjk_bigrams_and_words(self):
+        assert tokenize("申请MIT的CS硕士") == ["申请", "mit", "的", "cs", "硕士"]
+        assert tokenize("斯坦福大学") == ["斯坦", "坦福", "福大", "大学"]
+        assert tokenize("GPA 3.8, GRE-320") == ["gpa", "3.8", "gre-320"]
+
+    def test_posting_round_trip(self):
+        posting = PostingList()
+        for doc, tf in [(0, 1), (5, 3), (300, 200), (70000, 1)]:
+            posting.append(doc, tf)
+        docs, tfs = posting.decode()
+        assert list(docs) == [0, 5, 300, 70000]
+        assert list(tfs) == [1, 3, 200, 1]
+        assert posting.max_tf == 200
+
+class TestSearch:
+    """Test BM25 ranking"""
+
+    def test_matches_chinese_text(self, tmp_path):
+        index = LocalKeywordIndex(str(tmp_path))
+        ids = add_docs(index, "t1", DOCS)
+
+        results = index.search("t1", "斯坦福计算机硕士", top_k=2)
+        assert results[0][0]["id"] == ids[0]
+        assert index.search("t1", "牛津法学")[0][0]["id"] == ids[2]
+        assert index.search("t1", "量子物理") == []
+
+    def test_scores_match_exhaustive_bm25(self, tmp_path):
+        rng = random.Random(7)
+        vocabulary = ["留学", "申请", "硕士", "博士", "托福", "雅思", "gre", "gpa", "文书", "推荐信",
+                      "计算机", "金融", "法学", "斯坦福", "牛津", "实习"]
+        docs = [" ".join(rng.choices(vocabulary, k=rng.randint(3, 30))) for _ in range(300)]
+        index = LocalKeywordIndex(str(tmp_path))
+        add_docs(index, "t1", docs)
+
+        for query in ["留学申请 硕士", "gre 托福 雅思 推荐信", "金融 实习 文书 斯坦福 牛津"]:
+            expected = brute_force_bm25(docs, query)
+            results = index.search("t1", query, top_k=10)
+            top_expected = sorted(expected, reverse=True)[:10]
+            assert [score for _, score in results] == pytest.approx(top_expected)
+
+    def test_tenant_isolation_and_filters(self, tmp_path):
+        index = LocalKeywordIndex(str(tmp_path))
+        add_docs(index, "t1", DOCS[:2], document_id="a")
+        add_docs(index, "t1", DOCS[2:], document_id="b")
+        add_docs(index, "t2", DOCS, document_id="c")
+
+        results = index.search("t1", "申请", top_k=10, filters={"document_id": "b"})
+        assert results and all(r["metadata"]["document_id"] == "b" for r, _ in results)
+        assert index.search("t3", "申请") == []
+
+class TestMutations:
+    """Test deletes, upserts, compaction and persistence"""
+
+    def test_delete_and_upsert(self, tmp_path):
+        index = LocalKeywordIndex(str(tmp_path))
+        ids = add_docs(index, "t1", DOCS)
+
+        assert index.delete("t1", [ids[2]]) == 1
+        assert index.search("t1", "牛津法学") == []
+
+        index.add("t1", [ids[3]], ["牛津大学法学院"], [{"document_id": "doc"}])
+        results = index.search("t1", "牛津法学")
+        assert [r["id"] for r, _ in results] == [ids[3]]
+        assert index.search("t1", "推荐信") == []
+
+    def test_delete_by_filter_compacts(self, tmp_path):
+        index = LocalKeywordIndex(str(tmp_path))
+        add_docs(index, "t1", DOCS, document_id="a")
+        add_docs(index, "t1", DOCS[:1], document_id="b")
+
+        assert index.delete("t1", filters={"document_id": "a"}) == 4
+        segment = index.segment("t1")
+        assert len(segment.records) == 1
+        assert index.search("t1", "斯坦福")[0][0]["id"] == "b_0"
+
+    def test_reload_and_torn_tail(self, tmp_path):
+        index = LocalKeywordIndex(str(tmp_path))
+        ids = add_docs(index, "t1", DOCS)
+        index.delete("t1", [ids[1]])
+        path = index.segment("t1").path
+        with open(os.path.join(path, keyword_index.DOCS_FILE), "a", encoding="utf-8") as f:
+            f.write('{"op": "add", "id": "partial"')
+
+        reloaded = KeywordSegment(path)
+        assert len(reloaded) == 3
+        assert "partial" not in reloaded.doc_by_id
+        assert reloaded.search("托福GRE") == []
+        assert reloaded.search("斯坦福")[0][0]["id"] == ids[0]
@@ -0,0 +1,144 @@
+"""
+Test suite for the local long-term memory store
+Covers per-user top-k search, vectorized time decay, batched access updates, compaction and the shutdown flush
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.memory.memory_bank import LongTermMemory, MemoryItem
+
+def make_item(memory_id, user_id, embedding, importance=1.0, age_days=0, summary=None):
+    created_at = datetime.now() - timedelta(days=age_days)
+    return MemoryItem(
+        id=memory_id,
+        user_id=user_id,
+        content="[]",
+        summary=summary or f"summary of {memory_id}",
+        embedding=embedding,
+        importance_score=importance,
+        created_at=created_at,
+        accessed_at=created_at,
+        access_count=0,
+        tags=["gpa"],
+        metadata={"session_length": 2}
+    )
+
+class TestLocalLongTermMemory:
+    """LongTermMemory without Milvus/MongoDB"""
+
+    @pytest.mark.asyncio
+    async def test_store_and_retrieve_top_k(self, tmp_path):
+        memory = LongTermMemory(store_path=str(tmp_path))
+        await memory.store_memory(make_item("m1", "u1", [1.0, 0.0, 0.0]))
+        await memory.store_memory(make_item("m2", "u1", [0.0, 1.0, 0.0]))
+        await memory.store_memory(make_item("m3", "u1", [0.9, 0.1, 0.0]))
+
+        results = await memory.retrieve_memories("u1", [1.0, 0.0, 0.0], top_k=2)
+
+        assert [item.id for item in results] == ["m1", "m3"]
+        assert results[0].summary == "summary of m1"
+        assert results[0].tags == ["gpa"]
+        assert results[0].metadata == {"session_length": 2}
+        await memory.flush_access()
+
+    @pytest.mark.asyncio
+    async def test_search_is_scoped_per_user(self, tmp_path):
+        memory = LongTermMemory(store_path=str(tmp_path))
+        await memory.store_memory(make_item("m1", "u1", [1.0, 0.0]))
+        await memory.store_memory(make_item("m2", "u2", [1.0, 0.0]))
+
+        results = await memory.retrieve_memories("u2", [1.0, 0.0], top_k=5)
+        assert [item.id for item in results] == ["m2"]
+        assert await memory.retrieve_memories("u3", [1.0, 0.0]) == []
+        await memory.flush_access()
+
+    @pytest.mark.asyncio
+    async def test_time_decay_reranks_candidates(self, tmp_path):
+        memory = LongTermMemory(store_path=str(tmp_path))
+        await memory.store_memory(make_item("old", "u1", [1.0, 0.0], age_days=60))
+        await memory.store_memory(make_item("new", "u1", [0.95, 0.05]))
+
+        results = await memory.retrieve_memories("u1", [1.0, 0.0], top_k=2)
+
+        assert [item.id for item in results] == ["new", "old"]
+        # 60 days is two 30-day half-lives
+        assert results[1].importance_score == pytest.approx(0.25)
+        await memory.flush_access()
+
+    def test_apply_time_decay_without_similarities(self, tmp_path):
+        memory = LongTermMemory(store_path=str(tmp_path))
+        items = [
+            make_item("a", "u1", [], importance=1.0, age_days=30),
+            make_item("b", "u1", [], importance=0.8),
+        ]
+
+        ranked = memory._apply_time_decay(items)
+
+        assert [item.id for item in ranked] == ["b", "a"]
+        assert ranked[1].importance_score == pytest.approx(0.5)
+
+    @pytest.mark.asyncio
+    async def test_access_updates_are_batched(self, tmp_path):
+        memory = LongTermMemory(store_path=str(tmp_path))
+        await memory.store_memory(make_item("m1", "u1", [1.0, 0.0]))
+
+        for _ in range(3):
+            results = await memory.retrieve_memories("u1", [1.0, 0.0], top_k=1)
+        assert results[0].access_count == 1
+        assert memory._pending_access["m1"][0] == 3
+
+        await memory.flush_access()
+        assert memory._pending_access == {}
+        record = memory.local_store.get_many(["m1"])[0]
+        assert record["access_count"] == 3
+        assert record["accessed_at"] > datetime.now().timestamp() - 60
+
+    @pytest.mark.asyncio
+    async def test_compaction_keeps_best_memories(self, tmp_path):
+        memory = LongTermMemory(store_path=str(tmp_path), max_memories_per_user=3)
+        for i in range(5):
+            await memory.store_memory(make_item(f"m{i}", "u1", [1.0, float(i)], age_days=10 * (4 - i)))
+
+        assert memory.local_store.count("u1") == 3
+        results = await memory.retrieve_memories("u1", [1.0, 0.0], top_k=5)
+        assert {item.id for item in results} == {"m2", "m3", "m4"}
+        await memory.flush_access()
+
+    @pytest.mark.asyncio
+    async def test_compaction_drops_faded_memories(self, tmp_path):
+        memory = LongTermMemory(store_path=str(tmp_path))
+        await memory.store_memory(make_item("ancient", "u1", [1.0, 0.0], age_days=365))
+        await memory.store_memory(make_item("recent", "u1", [1.0, 0.0]))
+
+        assert await memory.compact("u1") == 1
+        assert memory.local_store.count("u1") == 1
+
+    @pytest.mark.asyncio
+    async def test_store_persists_across_instances(self, tmp_path):
+        memory = LongTermMemory(store_path=str(tmp_path))
+        await memory.store_memory(make_item("m1", "u1", [1.0, 0.0]))
+
+        reopened = LongTermMemory(store_path=str(tmp_path))
+        results = await reopened.retrieve_memories("u1", [1.0, 0.0])
+        assert [item.id for item in results] == ["m1"]
+        await reopened.flush_access()
+
+    @pytest.mark.asyncio
+    async def test_shutdown_flushes_pending_access(self, tmp_path, monkeypatch):
+        from app.agents.v2 import config as v2_config
+
+        memory = LongTermMemory(store_path=str(tmp_path))
+        await memory.store_memory(make_item("m1", "u1", [1.0, 0.0]))
+        await memory.retrieve_memories("u1", [1.0, 0.0], top_k=1)
+        monkeypatch.setattr(v2_config.memory_bank, "long_term_memory", memory)
+
+        await v2_config.shutdown_v2()
+
+        assert memory._pending_access == {}
+        assert memory.local_store.get_many(["m1"])[0]["access_count"] == 1
@@ -361,6 +361,53 @@ class TestDatabaseIntegration:
         
         print("✅ Supabase integration tests passed")
 
+class TestSaveMatchingResult:
+    """Test batched persistence of matching results"""
+
+    @pytest.mark.asyncio
+    async def test_asyncpg_single_statement(self):
+        """All matches and the status update go out in one statement"""
+        mock_conn = AsyncMock()
+        mock_db_conn = {"type": "asyncpg", "connection": mock_conn}
+        matches = [{'id': i % 25, 'total_score': 1.0 - i / 100} for i in range(30)]
+
+        assert await save_matching_result(mock_db_conn, "req-1", 7, matches) == True
+
+        mock_conn.execute.assert_called_once()
+        query, request_id, student_id, mentor_ids, scores = mock_conn.execute.call_args[0]
+        assert "UNNEST" in query and "UPDATE mentor_matches" in query
+        assert (request_id, student_id) == ("req-1", 7)
+        assert mentor_ids == list(range(20))
+        assert scores[0] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_supabase_bulk_upsert(self):
+        """Supabase path inserts new rows as pending, merges scores, then updates the request status"""
+        mock_client = Mock()
+        mock_db_conn = {"type": "supabase", "connection": mock_client}
+        table = mock_client.table.return_value
+        table.upsert.return_value.execute = AsyncMock()
+        table.update.return_value.eq.return_value.execute = AsyncMock()
+        matches = [{'id': 1, 'total_score': 0.9}, {'id': 2, 'total_score': 0.8}]
+
+        assert await save_matching_result(mock_db_conn, "req-1", 7, matches) == True
+
+        assert table.upsert.call_count == 2
+        insert_call, merge_call = table.upsert.call_args_list
+        # new relationships are created as pending, existing ones are left alone
+        assert [row['mentor_id'] for row in insert_call[0][0]] == [1, 2]
+        assert all(row['status'] == 'pending' for row in insert_call[0][0])
+        assert insert_call[1] == {'on_conflict': 'student_id,mentor_id', 'ignore_duplicates': True}
+        # the merge only touches match_score, so existing statuses are kept
+        assert merge_call[0][0] == [
+            {'student_id': 7, 'mentor_id': 1, 'match_score': 0.9},
+            {'student_id': 7, 'mentor_id': 2, 'match_score': 0.8},
+        ]
+        assert merge_call[1] == {'on_conflict': 'student_id,mentor_id'}
+        assert [c[0][0] for c in mock_client.table.call_args_list] == [
+            'mentorship_relationships', 'mentorship_relationships', 'mentor_matches'
+        ]
+
 class TestEdgeCases:
     """Test edge cases and error handling"""
     
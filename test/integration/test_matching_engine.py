@@ -0,0 +1,147 @@
+"""
+Test suite for the in-process mentor matching engine
+Covers vectorized scoring, top-k ordering and incremental snapshot refresh
+"""
+
+import pytest
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.matching_engine import MentorMatchingEngine, build_snapshot, score_snapshot
+from app.core.matching_similarity import SimilarityGraph, build_similarity_graph, normalize_name
+
+class MockMatchingRequest:
+    def __init__(self, target_universities=None, target_majors=None, degree_level="master",
+                 preferred_languages=None, service_categories=None):
+        self.target_universities = target_universities or ["Stanford University"]
+        self.target_majors = target_majors or ["Computer Science"]
+        self.degree_level = degree_level
+        self.preferred_languages = preferred_languages
+        self.service_categories = service_categories
+
+@pytest.fixture
+def sample_mentors():
+    """Sample mentor data for testing"""
+    return [
+        {'id': 1, 'university': 'Stanford University', 'major': 'Computer Science', 'degree_level': 'master',
+         'rating': 4.8, 'total_sessions': 45, 'languages': ['English', 'Chinese'],
+         'specialties': ['Academic Guidance'], 'verification_status': 'verified', 'updated_at': 1},
+        {'id': 2, 'university': 'MIT', 'major': 'Software Engineering', 'degree_level': 'phd',
+         'rating': 4.9, 'total_sessions': 62, 'languages': ['English'],
+         'specialties': ['Research Guidance'], 'verification_status': 'verified', 'updated_at': 2},
+        {'id': 3, 'university': 'UC Berkeley', 'major': 'Data Science', 'degree_level': 'master',
+         'rating': None, 'total_sessions': 0, 'languages': None,
+         'specialties': None, 'verification_status': 'verified', 'updated_at': 3},
+    ]
+
+class TestScoring:
+    """Test vectorized scoring against the per-mentor rules"""
+
+    def test_exact_match_scores(self, sample_mentors):
+        request = MockMatchingRequest(preferred_languages=['English', 'Chinese'],
+                                      service_categories=['Academic Guidance'])
+        matches = score_snapshot(build_snapshot(sample_mentors), request)
+
+        top = matches[0]
+        assert top['id'] == 1
+        assert top['university_match'] == pytest.approx(0.3)
+        assert top['major_match'] == pytest.approx(0.25)
+        assert top['degree_match'] == pytest.approx(0.2)
+        assert top['rating_score'] == pytest.approx(4.8 / 5.0 * 0.15)
+        assert top['language_match'] == pytest.approx(0.1)
+        assert top['experience_bonus'] == pytest.approx(0.03)
+        assert top['specialty_bonus'] == pytest.approx(0.05)
+
+    def test_partial_and_adjacent_scores(self, sample_mentors):
+        request = MockMatchingRequest(target_universities=["Stanford"], preferred_languages=['English', 'Chinese'])
+        matches = {m['id']: m for m in score_snapshot(build_snapshot(sample_mentors), request)}
+
+        assert matches[1]['university_match'] == pytest.approx(0.2)
+        assert matches[2]['major_match'] == pytest.approx(0.18)
+        assert matches[2]['degree_match'] == pytest.approx(0.1)
+        assert matches[2]['language_match'] == pytest.approx(0.08)
+        assert matches[3]['language_match'] == 0.0
+        assert matches[3]['rating_score'] == 0.0
+
+    def test_top_k_ordering(self, sample_mentors):
+        matches = score_snapshot(build_snapshot(sample_mentors), MockMatchingRequest(), limit=2)
+        assert len(matches) == 2
+        assert matches[0]['total_score'] >= matches[1]['total_score']
+
+    def test_empty_snapshot(self):
+        assert score_snapshot(build_snapshot([]), MockMatchingRequest()) == []
+
+class TestSimilarityGraph:
+    """Test the precomputed university/major similarity graph"""
+
+    def test_normalization_and_aliases(self):
+        graph = build_similarity_graph()
+        assert normalize_name("  University of California,  Berkeley ") == "university of california berkeley"
+        assert graph.universities.resolve("uc berkeley") == graph.universities.resolve("UCB")
+        assert graph.universities.score("清华大学", "Tsinghua University") == pytest.approx(0.3)
+        assert graph.majors.score("CS", "computer science") == pytest.approx(0.25)
+
+    def test_edge_kinds(self):
+        graph = build_similarity_graph(
+            university_rankings=[("Far Away University", 400)],
+            universities=["Stanford"],
+        )
+        assert graph.universities.score("Stanford", "Stanford University") == pytest.approx(0.2)
+        assert graph.universities.score("MIT", "Peking University") == pytest.approx(0.15)
+        assert graph.universities.score("MIT", "Far Away University") == 0.0
+        assert graph.majors.score("Computer Science", "Data Science") == pytest.approx(0.18)
+        assert graph.majors.score("Computer Science", "Biology") == pytest.approx(0.12)
+        assert graph.is_related_major("COMPUTER SCIENCE", "data science")
+        assert not graph.is_related_major("Computer Science", "Biology")
+
+    def test_unknown_targets_use_token_overlap(self):
+        graph = build_similarity_graph()
+        scores = graph.universities.scores_for(["Stanford"])
+        assert scores[graph.universities.resolve("Stanford University")] == pytest.approx(0.2)
+        assert graph.universities.resolve("Stanford") == -1
+        assert scores[-1] == 0.0
+
+    def test_round_trip(self, tmp_path):
+        graph = build_similarity_graph(major_relations=[("Law", "Political Science")])
+        path = str(tmp_path / "similarity.json")
+        graph.save(path)
+        loaded = SimilarityGraph.load(path)
+        assert loaded.universities.names == graph.universities.names
+        assert loaded.majors.rows == graph.majors.rows
+        assert loaded.universities.resolve("MIT") == loaded.universities.resolve("麻省理工学院")
+        assert loaded.is_related_major("law", "political science")
+
+class TestIncrementalRefresh:
+    """Test snapshot maintenance"""
+
+    def test_apply_changes(self, sample_mentors):
+        engine = MentorMatchingEngine()
+        engine.load_rows(sample_mentors)
+        assert len(engine.snapshot) == 3
+
+        changed = engine.apply_changes([
+            {**sample_mentors[0], 'verification_status': 'rejected', 'updated_at': 5},
+            {'id': 9, 'university': 'MIT', 'major': 'Physics', 'degree_level': 'phd',
+             'verification_status': 'verified', 'updated_at': 4},
+        ])
+        assert changed == 2
+        assert {row['id'] for row in engine.snapshot.rows} == {2, 3, 9}
+        assert engine._watermark == 5
+
+    @pytest.mark.asyncio
+    async def test_ensure_fresh_loads_once(self, sample_mentors):
+        class FakeConnection:
+            calls = 0
+
+            async def fetch(self, query, *args):
+                FakeConnection.calls += 1
+                return sample_mentors
+
+        engine = MentorMatchingEngine(refresh_interval=60)
+        db_conn = {"type": "asyncpg", "connection": FakeConnection()}
+        await engine.match(db_conn, MockMatchingRequest())
+        await engine.match(db_conn, MockMatchingRequest())
+        assert FakeConnection.calls == 1
@@ -0,0 +1,191 @@
+"""
+Test suite for multi-deployment model routing
+Covers EWMA selection, failover, circuit breakers and hedged requests using the mock provider
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.llm import router as router_module
+from app.agents.v2.ai_foundation.llm.manager import DeploymentConfig, LLMManager, ModelConfig, ModelProvider
+from app.agents.v2.ai_foundation.llm.providers.base_provider import ProviderError
+from app.agents.v2.ai_foundation.llm.providers.mock_provider import MockProvider
+from app.agents.v2.ai_foundation.llm.router import CircuitBreaker, Deployment, ModelRouter
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+def deployment(name, **options):
+    options.setdefault("response_delay", 0.001)
+    return Deployment(name=name, provider=MockProvider(seed=1, **options), model="mock-model")
+
+class TestRouting:
+    """Test latency/error based deployment selection"""
+
+    @pytest.mark.asyncio
+    async def test_prefers_faster_deployment(self):
+        fast, slow = deployment("fast"), deployment("slow", response_delay=0.02)
+        router = ModelRouter([slow, fast], hedging=False, seed=3)
+        for _ in range(30):
+            await router.chat(MESSAGES)
+        assert fast.stats["requests"] > 3 * slow.stats["requests"]
+        assert fast.ewma_latency < slow.ewma_latency
+
+    @pytest.mark.asyncio
+    async def test_failover_on_429_and_breaker_opens(self):
+        broken, healthy = deployment("broken", error_rate=1.0), deployment("healthy")
+        router = ModelRouter([broken, healthy], hedging=False, seed=3)
+        for _ in range(10):
+            broken.ewma_latency = None  # 强制优先尝试故障部署
+            response = await router.chat(MESSAGES)
+            assert "你好" in response.content
+        assert broken.breaker.state == CircuitBreaker.OPEN
+        assert broken.stats["requests"] == broken.breaker.failure_threshold
+        assert router.stats["failovers"] == broken.breaker.failure_threshold
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_error_is_raised(self):
+        bad_request, healthy = deployment("bad", error_rate=1.0, error_status=400), deployment("healthy")
+        router = ModelRouter([bad_request, healthy], hedging=False, seed=3)
+        healthy.ewma_latency = 1.0
+        with pytest.raises(ProviderError) as exc_info:
+            await router.chat(MESSAGES)
+        assert exc_info.value.status_code == 400
+        assert healthy.stats["requests"] == 0
+        assert bad_request.breaker.state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_all_deployments_failing(self):
+        router = ModelRouter([deployment("a", error_rate=1.0, error_status=503),
+                              deployment("b", error_rate=1.0, error_status=503)])
+        with pytest.raises(ProviderError):
+            await router.chat(MESSAGES)
+        assert router.stats["failures"] == 1
+
+class TestCircuitBreaker:
+    """Test breaker state transitions"""
+
+    def test_half_open_probe(self, monkeypatch):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        breaker.record_failure()
+        breaker.record_failure()
+        assert not breaker.available()
+
+        now = time.monotonic()
+        monkeypatch.setattr(router_module.time, "monotonic", lambda: now + 11)
+        assert breaker.available()
+        breaker.on_dispatch()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.available()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+class TestStreamingBreaker:
+    """Test breaker bookkeeping for streamed calls"""
+
+    @staticmethod
+    def cooled_down(dep):
+        dep.breaker.failures = dep.breaker.failure_threshold
+        dep.breaker.state = CircuitBreaker.OPEN
+        dep.breaker.opened_at = time.monotonic() - dep.breaker.reset_timeout - 1
+        assert dep.breaker.available()
+
+    @pytest.mark.asyncio
+    async def test_cancel_before_first_chunk_releases_probe(self):
+        only = deployment("only", response_delay=1.0)
+        self.cooled_down(only)
+        router = ModelRouter([only], hedging=False)
+
+        async def consume():
+            async for _ in router.stream_chat(MESSAGES):
+                pass
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.02)
+        assert only.breaker.state == CircuitBreaker.HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert only.breaker.available()
+        chunks = []
+        only.provider.response_delay = 0.001
+        only.provider.stream_delay = 0
+        async for chunk in router.stream_chat(MESSAGES):
+            chunks.append(chunk)
+        assert chunks
+        assert only.breaker.state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_closed_generator_releases_probe(self):
+        only = deployment("only", response_delay=0.001)
+        self.cooled_down(only)
+        router = ModelRouter([only], hedging=False)
+
+        stream = router.stream_chat(MESSAGES)
+        await stream.aclose()
+        assert only.breaker.available()
+
+    @pytest.mark.asyncio
+    async def test_unexpected_error_is_recorded_as_failure(self):
+        class BrokenProvider(MockProvider):
+            async def stream_chat(self, messages, model, **kwargs):
+                raise RuntimeError("connection reset")
+                yield
+
+        broken = Deployment(name="broken", provider=BrokenProvider(), model="mock-model")
+        healthy = deployment("healthy", stream_delay=0)
+        healthy.ewma_latency = 1.0
+        router = ModelRouter([broken, healthy], hedging=False, seed=3)
+
+        chunks = [chunk async for chunk in router.stream_chat(MESSAGES)]
+        assert chunks
+        assert broken.stats["errors"] == 1
+        assert broken.breaker.failures == 1
+        assert router.stats["failovers"] == 1
+
+class TestHedging:
+    """Test hedged requests for slow primaries"""
+
+    @pytest.mark.asyncio
+    async def test_hedge_when_slower_than_p95(self):
+        primary, backup = deployment("primary"), deployment("backup", response_delay=0.005)
+        router = ModelRouter([primary, backup], hedge_min_delay=0.01, seed=3)
+        for _ in range(router_module.HEDGE_MIN_SAMPLES):
+            primary.record_success(0.002)
+        backup.ewma_latency = 1.0
+
+        primary.provider.response_delay = 1.0
+        start = time.monotonic()
+        response = await router.chat(MESSAGES)
+        assert time.monotonic() - start < 0.5
+        assert response.content
+        assert router.stats["hedged"] == 1
+        assert backup.stats["wins"] == 1
+
+class TestLLMManagerRouting:
+    """Test LLMManager wiring of multi-deployment models"""
+
+    @pytest.mark.asyncio
+    async def test_initialize_with_mock_deployments(self):
+        manager = LLMManager()
+        await manager.initialize([ModelConfig(
+            name="planner-model",
+            provider=ModelProvider.OPENAI,
+            api_key="k",
+            deployments=[
+                DeploymentConfig(name="primary", provider=ModelProvider.MOCK, api_key="mock",
+                                 options={"error_rate": 1.0, "error_status": 500, "response_delay": 0.001}),
+                DeploymentConfig(name="secondary", provider=ModelProvider.MOCK, api_key="mock",
+                                 options={"response_delay": 0.001}),
+            ]
+        )])
+        response = await manager.chat("t", "planner-model", MESSAGES)
+        assert response.model == "planner-model"
+        stats = manager.get_routing_stats()["planner-model"]
+        assert stats["deployments"]["secondary"]["wins"] >= 1
@@ -0,0 +1,129 @@
+"""
+Test suite for memory presence checks and request-scoped query embeddings
+Covers skipping embeddings for users without memories and sharing one embedding across retrieval branches
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+from datetime import datetime
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.llm.query_embedding import embed_query, request_embedding_scope
+from app.agents.v2.ai_foundation.memory.memory_bank import MemoryBank, MemoryItem
+
+class CountingEmbeddingManager:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    async def embed_texts(self, tenant_id, model_name, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(self.delay)
+        return [[1.0, 0.0] for _ in texts]
+
+def make_item(memory_id, user_id):
+    return MemoryItem(
+        id=memory_id, user_id=user_id, content="[]", summary="目标 CMU MSCS",
+        embedding=[1.0, 0.0], importance_score=1.0, created_at=datetime.now(),
+        accessed_at=datetime.now(), access_count=0, tags=[], metadata={}
+    )
+
+class TestEmbedQuery:
+    """Request-scoped sharing of query embeddings"""
+
+    @pytest.mark.asyncio
+    async def test_without_scope_every_call_embeds(self):
+        embedder = CountingEmbeddingManager()
+        await embed_query(embedder, "t", "m", "你好")
+        await embed_query(embedder, "t", "m", "你好")
+        assert len(embedder.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_branches_share_one_call(self):
+        embedder = CountingEmbeddingManager(delay=0.02)
+        with request_embedding_scope():
+            first, second = await asyncio.gather(
+                embed_query(embedder, "t", "m", "你好"),
+                embed_query(embedder, "t", "m", "你好")
+            )
+            await embed_query(embedder, "t", "other-model", "你好")
+        assert first == second == [1.0, 0.0]
+        assert len(embedder.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_scope_ends_with_block(self):
+        embedder = CountingEmbeddingManager()
+        with request_embedding_scope():
+            await embed_query(embedder, "t", "m", "你好")
+        await embed_query(embedder, "t", "m", "你好")
+        assert len(embedder.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_branch_does_not_cancel_shared_embedding(self):
+        embedder = CountingEmbeddingManager(delay=0.05)
+        with request_embedding_scope():
+            slow = asyncio.ensure_future(asyncio.wait_for(embed_query(embedder, "t", "m", "q"), timeout=0.01))
+            other = asyncio.ensure_future(embed_query(embedder, "t", "m", "q"))
+            with pytest.raises(asyncio.TimeoutError):
+                await slow
+            assert await other == [1.0, 0.0]
+        assert len(embedder.calls) == 1
+
+class TestMemoryPresence:
+    """get_context only embeds the query for users with long-term memories"""
+
+    @pytest.mark.asyncio
+    async def test_new_user_skips_embedding(self, tmp_path):
+        embedder = CountingEmbeddingManager()
+        bank = MemoryBank(llm_manager=None, embedding_manager=embedder, memory_store_path=str(tmp_path))
+
+        context = await bank.get_context(session_id="s1", user_id="new-user", query="你好")
+
+        assert embedder.calls == []
+        assert context.relevant_memories == []
+        assert not os.path.exists(os.path.join(str(tmp_path), "memories.db"))
+
+    @pytest.mark.asyncio
+    async def test_user_with_memories_embeds_once(self, tmp_path):
+        embedder = CountingEmbeddingManager()
+        bank = MemoryBank(llm_manager=None, embedding_manager=embedder, memory_store_path=str(tmp_path))
+        assert await bank.long_term_memory.has_memories("u1") is False
+
+        await bank.long_term_memory.store_memory(make_item("m1", "u1"))
+        assert await bank.long_term_memory.has_memories("u1") is True
+
+        context = await bank.get_context(session_id="s1", user_id="u1", query="CMU")
+        await bank.long_term_memory.flush_access()
+
+        assert len(embedder.calls) == 1
+        assert [memory["id"] for memory in context.relevant_memories] == ["m1"]
+
+    @pytest.mark.asyncio
+    async def test_presence_survives_restart(self, tmp_path):
+        bank = MemoryBank(llm_manager=None, embedding_manager=CountingEmbeddingManager(),
+                          memory_store_path=str(tmp_path))
+        await bank.long_term_memory.store_memory(make_item("m1", "u1"))
+
+        reopened = MemoryBank(llm_manager=None, embedding_manager=CountingEmbeddingManager(),
+                              memory_store_path=str(tmp_path))
+        assert await reopened.long_term_memory.has_memories("u1") is True
+        assert await reopened.long_term_memory.has_memories("u2") is False
+
+    @pytest.mark.asyncio
+    async def test_memory_and_knowledge_share_embedding(self, tmp_path):
+        embedder = CountingEmbeddingManager(delay=0.02)
+        bank = MemoryBank(llm_manager=None, embedding_manager=embedder, memory_store_path=str(tmp_path))
+        await bank.long_term_memory.store_memory(make_item("m1", "u1"))
+
+        with request_embedding_scope():
+            await asyncio.gather(
+                bank.get_context(session_id="s1", user_id="u1", query="CMU"),
+                embed_query(embedder, "u1", "text-embedding-ada-002", "CMU")
+            )
+        await bank.long_term_memory.flush_access()
+
+        assert len(embedder.calls) == 1
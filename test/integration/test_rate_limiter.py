@@ -0,0 +1,214 @@
+"""
+Test suite for the LLM rate limiter
+Covers token buckets, deadlines, concurrency limits, tenant fairness, bucket eviction and LLMManager integration
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.llm.manager import LLMManager, ModelConfig, ModelProvider
+from app.agents.v2.ai_foundation.llm.providers.base_provider import LLMResponse
+from app.agents.v2.ai_foundation.llm import rate_limiter as rate_limiter_module
+from app.agents.v2.ai_foundation.llm.rate_limiter import RateLimiter, RateLimitTimeout, TokenBucket
+from app.agents.v2.core_infrastructure.error.exceptions import LLMException
+
+class TestTokenBucket:
+    """Test token bucket waiting and adjustment"""
+
+    @pytest.mark.asyncio
+    async def test_waits_for_refill(self):
+        bucket = TokenBucket(6000, capacity=1)  # 100/s
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        assert time.monotonic() - start >= 0.025
+
+    @pytest.mark.asyncio
+    async def test_deadline(self):
+        bucket = TokenBucket(60, capacity=1)  # 1/s
+        await bucket.acquire()
+        with pytest.raises(RateLimitTimeout):
+            await bucket.acquire(deadline=time.monotonic() + 0.05)
+
+    def test_adjust_allows_debt(self):
+        bucket = TokenBucket(600)
+        bucket.adjust(1000)
+        assert bucket.tokens < 0
+
+class TestRateLimiter:
+    """Test the per-model/per-tenant limiter"""
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self):
+        limiter = RateLimiter()
+        limiter.configure("m", requests_per_minute=10000, max_concurrency=2)
+        active = peak = 0
+
+        async def call():
+            nonlocal active, peak
+            async with limiter.acquire("t", "m"):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.02)
+                active -= 1
+
+        await asyncio.gather(*[call() for _ in range(6)])
+        assert peak == 2
+        stats = limiter.get_stats()["m"]
+        assert stats["requests"] == 6
+        assert stats["waited"] >= 4
+        assert stats["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_single_tenant_uses_idle_capacity(self):
+        limiter = RateLimiter(tenant_share=0.5, queue_timeout=0.05)
+        limiter.configure("m", requests_per_minute=4)
+
+        for _ in range(4):
+            async with limiter.acquire("greedy", "m"):
+                pass
+        assert limiter.get_stats()["m"]["rejected"] == 0
+
+    @pytest.mark.asyncio
+    async def test_tenant_share_applies_when_others_wait(self):
+        limiter = RateLimiter(tenant_share=0.05, queue_timeout=0.05)
+        limiter.configure("m", requests_per_minute=60, max_concurrency=1)
+
+        # uncontended calls drain greedy's share (3 per minute) without being limited
+        for _ in range(4):
+            async with limiter.acquire("greedy", "m"):
+                pass
+
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.acquire("holder", "m", timeout=1):
+                await release.wait()
+
+        async def call(tenant_id):
+            async with limiter.acquire(tenant_id, "m", timeout=1):
+                return True
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        other = asyncio.ensure_future(call("other"))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(RateLimitTimeout):
+            async with limiter.acquire("greedy", "m"):
+                pass
+        release.set()
+        assert await other
+        await holder
+        assert limiter.get_stats()["m"]["rejected"] == 1
+        assert limiter._waiting["m"] == {}
+
+    @pytest.mark.asyncio
+    async def test_tenant_token_share_protects_other_tenants(self):
+        limiter = RateLimiter(tenant_share=0.5, queue_timeout=0.05)
+        limiter.configure("m", requests_per_minute=600, tokens_per_minute=1000, max_concurrency=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.acquire("holder", "m", timeout=1):
+                await release.wait()
+
+        async def call(tenant_id, tokens, timeout=1):
+            async with limiter.acquire(tenant_id, "m", tokens, timeout=timeout):
+                return True
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        first = asyncio.ensure_future(call("other", 100))
+        await asyncio.sleep(0.01)
+        greedy = asyncio.ensure_future(call("greedy", 400))
+        await asyncio.sleep(0.01)
+
+        # greedy's token share (500/min) is spent, so it waits in its own bucket
+        with pytest.raises(RateLimitTimeout):
+            await call("greedy", 400, timeout=0.05)
+        # and the model token budget is still there for the other tenant
+        second = asyncio.ensure_future(call("other", 400))
+        await asyncio.sleep(0.01)
+
+        release.set()
+        assert await first and await greedy and await second
+        await holder
+        assert limiter.get_stats()["m"]["rejected"] == 1
+
+    def test_record_tokens_corrects_tenant_bucket(self):
+        limiter = RateLimiter(tenant_share=0.5)
+        limiter.configure("m", requests_per_minute=60, tokens_per_minute=1000)
+        quota = limiter._tenant_quota("t", "m")
+
+        limiter.record_tokens("m", 300, 100, "t")
+
+        assert quota.tokens.tokens == pytest.approx(300, abs=1)
+        assert limiter._token_buckets["m"].tokens == pytest.approx(800, abs=1)
+
+    @pytest.mark.asyncio
+    async def test_idle_tenant_buckets_are_evicted(self, monkeypatch):
+        limiter = RateLimiter(max_tenant_buckets=3)
+        limiter.configure("m", requests_per_minute=60)
+        for i in range(3):
+            async with limiter.acquire(f"t{i}", "m"):
+                pass
+        assert len(limiter._tenant_buckets) == 3
+
+        # at the cap the least recently used bucket is dropped even if not yet refilled
+        async with limiter.acquire("t3", "m"):
+            pass
+        assert list(limiter._tenant_buckets) == [("t1", "m"), ("t2", "m"), ("t3", "m")]
+
+        # once refilled, idle buckets are reclaimed when a new tenant arrives
+        now = time.monotonic() + 120
+        monkeypatch.setattr(rate_limiter_module.time, "monotonic", lambda: now)
+        async with limiter.acquire("t4", "m"):
+            pass
+        assert list(limiter._tenant_buckets) == [("t4", "m")]
+
+    @pytest.mark.asyncio
+    async def test_unconfigured_model_passes(self):
+        async with RateLimiter().acquire("t", "unknown"):
+            pass
+
+class FakeProvider:
+    async def chat(self, messages, model, **kwargs):
+        await asyncio.sleep(0.01)
+        return LLMResponse(content="ok", model=model, usage={"total_tokens": 50},
+                           finish_reason="stop", response_time=0.01)
+
+class TestLLMManagerRateLimit:
+    """Test rate limiting inside LLMManager.chat"""
+
+    def make_manager(self, **config_kwargs):
+        manager = LLMManager()
+        config = ModelConfig(name="m", provider=ModelProvider.OPENAI, api_key="k", **config_kwargs)
+        manager.models["m"] = config
+        manager.providers["m"] = FakeProvider()
+        manager.rate_limiter.configure("m", config.rate_limit, config.tokens_per_minute, config.max_concurrency)
+        return manager
+
+    @pytest.mark.asyncio
+    async def test_chat_records_tokens_and_stats(self):
+        manager = self.make_manager(rate_limit=600, tokens_per_minute=10000)
+        response = await manager.chat("t", "m", [{"role": "user", "content": "你好"}])
+        assert response.content == "ok"
+        bucket = manager.rate_limiter._token_buckets["m"]
+        assert bucket.tokens == pytest.approx(10000 - 50, abs=5)
+        assert manager.get_rate_limit_stats()["m"]["requests"] == 1
+
+    @pytest.mark.asyncio
+    async def test_chat_raises_after_deadline(self):
+        manager = self.make_manager(rate_limit=1)
+        manager.rate_limiter.queue_timeout = 0.05
+        await manager.chat("t", "m", [{"role": "user", "content": "hi"}])
+        with pytest.raises(LLMException) as exc_info:
+            await manager.chat("t", "m", [{"role": "user", "content": "hi"}])
+        assert exc_info.value.details["reason"] == "rate_limit"
@@ -0,0 +1,157 @@
+"""
+Test suite for the semantic response cache
+Covers prompt normalization, exact and embedding-similarity hits, TTL, tenant scoping and AgentExecutor integration
+"""
+
+import pytest
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.agents import response_cache as response_cache_module
+from app.agents.v2.ai_foundation.agents.agent_factory import AgentConfig, AgentExecutor, AgentType, ToolRegistry
+from app.agents.v2.ai_foundation.agents.response_cache import SemanticResponseCache, normalize_prompt
+
+class KeywordEmbeddingManager:
+    """Maps prompts to fixed vectors by topic keyword"""
+
+    TOPICS = {"gpa": [1.0, 0.0, 0.0], "托福": [0.0, 1.0, 0.0]}
+
+    def __init__(self):
+        self.calls = 0
+
+    async def embed_texts(self, tenant_id, model_name, texts):
+        self.calls += 1
+        vectors = []
+        for text in texts:
+            vector = [0.0, 0.0, 1.0]
+            for keyword, topic in self.TOPICS.items():
+                if keyword in text:
+                    vector = topic
+            vectors.append(vector)
+        return vectors
+
+SCOPE = ("tenant-a", "study_planner", "gpt-4o-mini")
+
+class TestNormalization:
+    """Test prompt normalization used for exact matching"""
+
+    def test_normalize_prompt(self):
+        assert normalize_prompt("  What  is a good GPA？ ") == "what is a good gpa"
+        assert normalize_prompt("ＧＰＡ要求是多少?") == normalize_prompt("gpa要求是多少")
+
+class TestSemanticResponseCache:
+    """Test cache lookups, expiry and scoping"""
+
+    @pytest.mark.asyncio
+    async def test_exact_hit_without_embeddings(self):
+        cache = SemanticResponseCache()
+        await cache.set(*SCOPE, "What is a good GPA?", "3.5 以上")
+        assert await cache.get(*SCOPE, "what is a good gpa") == "3.5 以上"
+        assert await cache.get(*SCOPE, "完全不同的问题") is None
+        stats = cache.get_stats()
+        assert stats["exact_hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    @pytest.mark.asyncio
+    async def test_semantic_hit_and_threshold_miss(self):
+        embedder = KeywordEmbeddingManager()
+        cache = SemanticResponseCache(embedding_manager=embedder)
+        await cache.set(*SCOPE, "申请美国硕士 GPA 要多少", "一般 3.3 以上")
+        assert await cache.get(*SCOPE, "美研对 GPA 的要求") == "一般 3.3 以上"
+        assert await cache.get(*SCOPE, "托福需要多少分") is None
+        assert cache.stats["semantic_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self, monkeypatch):
+        cache = SemanticResponseCache(ttl=10)
+        now = 1000.0
+        monkeypatch.setattr(response_cache_module.time, "time", lambda: now)
+        await cache.set(*SCOPE, "问题", "回答")
+        now = 1011.0
+        assert await cache.get(*SCOPE, "问题") is None
+        assert cache.get_stats()["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_scoped_by_tenant_and_agent(self):
+        cache = SemanticResponseCache(embedding_manager=KeywordEmbeddingManager())
+        await cache.set(*SCOPE, "GPA 要求", "回答")
+        assert await cache.get("tenant-b", "study_planner", "gpt-4o-mini", "GPA 要求") is None
+        assert await cache.get("tenant-a", "study_consultant", "gpt-4o-mini", "GPA 要求") is None
+
+        cache.invalidate("tenant-a")
+        assert await cache.get(*SCOPE, "GPA 要求") is None
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        cache = SemanticResponseCache(max_entries_per_scope=2)
+        for i in range(3):
+            await cache.set(*SCOPE, f"问题{i}", f"回答{i}")
+        assert await cache.get(*SCOPE, "问题0") is None
+        assert await cache.get(*SCOPE, "问题2") == "回答2"
+        assert cache.stats["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_lookup_does_not_create_scope(self):
+        cache = SemanticResponseCache()
+        for i in range(50):
+            assert await cache.get(f"tenant-{i}", "study_planner", "gpt-4o-mini", "问题") is None
+        assert cache.get_stats()["scopes"] == 0
+
+    @pytest.mark.asyncio
+    async def test_expired_scope_is_dropped(self, monkeypatch):
+        cache = SemanticResponseCache(ttl=10)
+        now = 1000.0
+        monkeypatch.setattr(response_cache_module.time, "time", lambda: now)
+        await cache.set(*SCOPE, "问题", "回答")
+        now = 1011.0
+        assert await cache.get(*SCOPE, "别的问题") is None
+        stats = cache.get_stats()
+        assert stats["scopes"] == 0 and stats["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_global_entry_cap_evicts_least_recent_scope(self):
+        cache = SemanticResponseCache(max_entries=3)
+        await cache.set("tenant-a", "study_planner", "m", "问题1", "回答1")
+        await cache.set("tenant-b", "study_planner", "m", "问题1", "回答1")
+        await cache.set("tenant-c", "study_planner", "m", "问题1", "回答1")
+        # touching tenant-a makes tenant-b the least recently used scope
+        assert await cache.get("tenant-a", "study_planner", "m", "问题1") == "回答1"
+        await cache.set("tenant-d", "study_planner", "m", "问题1", "回答1")
+
+        assert await cache.get("tenant-b", "study_planner", "m", "问题1") is None
+        assert await cache.get("tenant-a", "study_planner", "m", "问题1") == "回答1"
+        stats = cache.get_stats()
+        assert stats["entries"] == 3 and stats["scopes"] == 3
+        assert stats["evictions"] == 1
+
+class FakeGraph:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, state):
+        self.calls += 1
+        return {"final_response": f"回答: {state.input}"}
+
+class TestAgentExecutorCache:
+    """Test opt-in caching in AgentExecutor.execute"""
+
+    @pytest.mark.asyncio
+    async def test_execute_uses_cache_only_when_requested(self, monkeypatch):
+        cache = SemanticResponseCache()
+        monkeypatch.setattr("app.agents.v2.ai_foundation.agents.agent_factory.response_cache", cache)
+        executor = AgentExecutor(
+            AgentConfig(agent_type=AgentType.STUDY_PLANNER, tenant_id="tenant-a"),
+            llm_manager=None, memory_bank=None, rag_manager=None, tool_registry=ToolRegistry()
+        )
+        executor.graph = FakeGraph()
+
+        first = await executor.execute("历史上下文\n当前问题: GPA?", cache_query="GPA?")
+        second = await executor.execute("另一段上下文\n当前问题: gpa", cache_query="gpa")
+        assert first == second
+        assert executor.graph.calls == 1
+
+        await executor.execute("GPA?")
+        assert executor.graph.calls == 2
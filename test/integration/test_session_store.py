@@ -0,0 +1,197 @@
+"""
+Test suite for the bounded local session store
+Covers LRU and TTL eviction, byte and turn caps, SQLite spill and its cleanup, and metrics
+"""
+
+import pytest
+import sys
+import os
+import json
+import time
+import asyncio
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.memory.session_store import LocalSessionStore
+from app.agents.v2.ai_foundation.memory.memory_bank import WorkingMemory
+
+def turn(i, size=10):
+    return {"human": f"q{i}", "assistant": "a" * size}
+
+class TestLocalSessionStore:
+    """Bounded in-process session store"""
+
+    @pytest.mark.asyncio
+    async def test_append_and_read_last_n(self):
+        store = LocalSessionStore()
+        for i in range(5):
+            await store.append("s1", turn(i))
+
+        assert [t["human"] for t in await store.get("s1", last_n=2)] == ["q3", "q4"]
+        assert len(await store.get("s1")) == 5
+        assert await store.length("s1") == 5
+        assert await store.get("missing") == []
+
+    @pytest.mark.asyncio
+    async def test_turn_cap_keeps_byte_accounting(self):
+        store = LocalSessionStore(max_turns=3)
+        for i in range(10):
+            await store.append("s1", turn(i))
+
+        assert [t["human"] for t in await store.get("s1")] == ["q7", "q8", "q9"]
+        stats = store.get_stats()
+        assert stats["trimmed_turns"] == 7
+        assert stats["bytes"] == sum(
+            len(json.dumps(t, ensure_ascii=False).encode("utf-8")) for t in await store.get("s1")
+        )
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_by_session_count(self):
+        store = LocalSessionStore(max_sessions=2)
+        await store.append("a", turn(1))
+        await store.append("b", turn(2))
+        await store.get("a")  # a is now most recently used
+        await store.append("c", turn(3))
+
+        assert await store.get("b") == []
+        assert len(await store.get("a")) == 1
+        assert store.get_stats()["evictions"] == 1
+        assert len(store) == 2
+
+    @pytest.mark.asyncio
+    async def test_byte_cap_evicts_oldest(self):
+        store = LocalSessionStore(max_bytes=300)
+        for i in range(5):
+            await store.append(f"s{i}", turn(i, size=100))
+
+        stats = store.get_stats()
+        assert stats["bytes"] <= 300
+        assert stats["evictions"] >= 2
+        assert len(await store.get("s4")) == 1
+
+    @pytest.mark.asyncio
+    async def test_oversized_session_is_kept_alone(self):
+        store = LocalSessionStore(max_bytes=50)
+        await store.append("small", turn(0, size=1))
+        await store.append("big", turn(1, size=200))
+
+        assert await store.get("small") == []
+        assert len(await store.get("big")) == 1
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self):
+        store = LocalSessionStore(ttl=0.05)
+        await store.append("s1", turn(1))
+        time.sleep(0.06)
+
+        assert await store.get("s1") == []
+        stats = store.get_stats()
+        assert stats["expirations"] == 1
+        assert stats["sessions"] == 0
+        assert stats["bytes"] == 0
+
+    @pytest.mark.asyncio
+    async def test_expired_sessions_purged_on_write(self):
+        store = LocalSessionStore(ttl=0.05)
+        await store.append("old", turn(1))
+        time.sleep(0.06)
+        await store.append("new", turn(2))
+
+        assert store.get_stats()["sessions"] == 1
+        assert store.get_stats()["expirations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_spill_and_reload(self, tmp_path):
+        store = LocalSessionStore(max_sessions=1, spill_path=str(tmp_path / "sessions.db"))
+        await store.append("a", turn(1))
+        await store.append("a", turn(2))
+        await store.append("b", turn(3))
+
+        assert store.get_stats()["spilled"] == 1
+        history = await store.get("a")
+        assert [t["human"] for t in history] == ["q1", "q2"]
+        stats = store.get_stats()
+        assert stats["spill_loads"] == 1
+        # loading a back evicts b to the spill file
+        assert stats["spilled"] == 2
+        assert [t["human"] for t in await store.get("b")] == ["q3"]
+
+    @pytest.mark.asyncio
+    async def test_delete_removes_spilled_session(self, tmp_path):
+        store = LocalSessionStore(max_sessions=1, spill_path=str(tmp_path / "sessions.db"))
+        await store.append("a", turn(1))
+        await store.append("b", turn(2))
+        await store.delete("a")
+
+        assert await store.get("a") == []
+        assert store.get_stats()["spill_loads"] == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_appends_to_spilled_session(self, tmp_path):
+        store = LocalSessionStore(max_sessions=1, spill_path=str(tmp_path / "sessions.db"))
+        for i in range(5):
+            await store.append("a", turn(i))
+        await store.append("b", turn(9))
+        assert store.get_stats()["spilled"] == 1
+
+        await asyncio.gather(store.append("a", turn("new1")), store.append("a", turn("new2")))
+
+        history = [t["human"] for t in await store.get("a")]
+        assert history == ["q0", "q1", "q2", "q3", "q4", "qnew1", "qnew2"]
+        held = sum(len(json.dumps(t, ensure_ascii=False).encode("utf-8")) for t in await store.get("a"))
+        assert store.get_stats()["bytes"] == held
+
+    @pytest.mark.asyncio
+    async def test_spill_purged_periodically(self, tmp_path):
+        store = LocalSessionStore(max_sessions=1, ttl=0.05, spill_path=str(tmp_path / "sessions.db"),
+                                  spill_purge_interval=2)
+        await store.append("a", turn(1))
+        await store.append("b", turn(2))
+        time.sleep(0.06)
+        await store.append("c", turn(3))
+        assert await store.spill.count() == 1
+
+        # spilling c is the second spill and purges the expired a from the file
+        await store.append("d", turn(4))
+        assert await store.spill.count() == 1
+        assert store.get_stats()["expirations"] == 2
+        assert [t["human"] for t in await store.get("c")] == ["q3"]
+
+    @pytest.mark.asyncio
+    async def test_spill_row_cap(self, tmp_path):
+        store = LocalSessionStore(max_sessions=1, spill_path=str(tmp_path / "sessions.db"),
+                                  spill_max_rows=2, spill_purge_interval=1)
+        for i in range(6):
+            await store.append(f"s{i}", turn(i))
+            time.sleep(0.001)
+
+        assert await store.spill.count() == 2
+        assert store.get_stats()["spill_dropped"] == 3
+        # the sessions expiring first are dropped, the most recent spills survive
+        assert [t["human"] for t in await store.get("s4")] == ["q4"]
+        assert await store.get("s0") == []
+
+class TestWorkingMemoryLocalStore:
+    """WorkingMemory falls back to the bounded store without Redis"""
+
+    @pytest.mark.asyncio
+    async def test_session_ttl_applies_locally(self):
+        memory = WorkingMemory(session_ttl=0.05)
+        await memory.add_interaction("s1", "hi", "hello")
+        assert len(await memory.get_session_history("s1")) == 1
+
+        time.sleep(0.06)
+        assert await memory.get_session_history("s1") == []
+        assert memory.get_stats()["expirations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stats_report_backend(self):
+        memory = WorkingMemory(max_turns=2)
+        for i in range(3):
+            await memory.add_interaction("s1", f"q{i}", "a")
+
+        stats = memory.get_stats()
+        assert stats["backend"] == "local"
+        assert stats["sessions"] == 1
+        assert stats["trimmed_turns"] == 1
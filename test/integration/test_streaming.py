@@ -0,0 +1,78 @@
+"""
+Test suite for token streaming
+Covers LLMManager.stream_chat deltas and usage, and AgentExecutor.stream events through the response node
+"""
+
+import pytest
+import sys
+import os
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.agents.agent_factory import AgentConfig, AgentExecutor, AgentType, ToolRegistry
+from app.agents.v2.ai_foundation.llm.manager import LLMManager, ModelConfig, ModelProvider
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+async def make_manager(**options):
+    manager = LLMManager()
+    await manager.initialize([ModelConfig(name="m", provider=ModelProvider.MOCK, api_key="mock", rate_limit=1000)])
+    manager.providers["m"].response_delay = options.get("response_delay", 0)
+    manager.providers["m"].stream_delay = options.get("stream_delay", 0)
+    return manager
+
+def make_executor(manager):
+    config = AgentConfig(
+        agent_type=AgentType.STUDY_PLANNER, tenant_id="t", model_name="m",
+        memory_enabled=False, rag_enabled=False
+    )
+    return AgentExecutor(config, llm_manager=manager, memory_bank=None, rag_manager=None, tool_registry=ToolRegistry())
+
+class TestLLMManagerStreaming:
+    """Test provider chunks are converted into deltas with a final usage chunk"""
+
+    @pytest.mark.asyncio
+    async def test_stream_chat_deltas_and_usage(self):
+        manager = await make_manager()
+        chunks = [chunk async for chunk in manager.stream_chat("t", "m", MESSAGES)]
+        text = "".join(chunk.delta for chunk in chunks)
+        assert text.startswith("你好！")
+        assert chunks[-2].content == text
+        final = chunks[-1]
+        assert final.finished and final.content == text and final.delta == ""
+        assert final.usage["total_tokens"] > 0
+        assert manager.usage_stats["t:m"]["total_requests"] == 1
+
+class TestAgentExecutorStreaming:
+    """Test streaming through the LangGraph response node"""
+
+    @pytest.mark.asyncio
+    async def test_events_order_and_final_answer(self):
+        executor = make_executor(await make_manager())
+        events = [event async for event in executor.stream("你好")]
+        types = [event["type"] for event in events]
+        assert types[-2:] == ["usage", "final_answer"]
+        assert set(types[:-2]) == {"token"}
+        tokens = "".join(event["content"] for event in events if event["type"] == "token")
+        assert tokens == events[-1]["content"]
+
+    @pytest.mark.asyncio
+    async def test_first_token_before_generation_finishes(self):
+        executor = make_executor(await make_manager(stream_delay=0.01))
+        start = time.monotonic()
+        first_token_at = None
+        async for event in executor.stream("你好"):
+            if event["type"] == "token" and first_token_at is None:
+                first_token_at = time.monotonic() - start
+        total = time.monotonic() - start
+        assert first_token_at is not None
+        assert first_token_at < total / 4
+
+    @pytest.mark.asyncio
+    async def test_errors_become_error_events(self):
+        manager = await make_manager()
+        manager.providers["m"].error_rate = 1.0
+        events = [event async for event in make_executor(manager).stream("你好")]
+        assert events[-1]["type"] == "error"
@@ -0,0 +1,217 @@
+"""
+Test suite for the v2 study tools data access
+Supabase requests are served by an in-memory httpx transport
+"""
+
+import os
+import re
+import sys
+
+import httpx
+import pytest
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import app.core.supabase_client as supabase_module
+from app.agents.v2.tools.study_tools import find_mentors_tool
+
+PROFILES = [
+    {'id': 1, 'mentor_id': 10, 'title': 'CS mentor', 'description': 'Stanford University CS master',
+     'learning_goals': 'Computer Science applications', 'hourly_rate': 200, 'currency': 'CNY', 'status': 'active',
+     'mentor': {'username': 'alice'}},
+    {'id': 2, 'mentor_id': 10, 'title': 'duplicate', 'description': 'Stanford', 'learning_goals': '',
+     'hourly_rate': 0, 'currency': 'CNY', 'status': 'active', 'mentor': {'username': 'alice'}},
+    {'id': 3, 'mentor_id': 11, 'title': 'MBA mentor', 'description': 'Stanford GSB', 'learning_goals': 'Business',
+     'hourly_rate': 300, 'currency': 'CNY', 'status': 'active', 'mentor': {'username': 'bob'}},
+    {'id': 4, 'mentor_id': 12, 'title': 'Inactive', 'description': 'Stanford', 'learning_goals': '',
+     'hourly_rate': 0, 'currency': 'CNY', 'status': 'active', 'mentor': None},
+]
+
+
+def install_client(monkeypatch, handler):
+    client = supabase_module.SupabaseClient()
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(supabase_module, 'get_supabase_client', get_client)
+
+
+def serve_profiles(rows, requests):
+    """Answer profile queries like PostgREST: inner join, AND of ilike terms, ordering and paging"""
+
+    def handler(request):
+        requests.append(request)
+        params = request.url.params
+        terms = [term.lower() for term in re.findall(r'description\.ilike\."\*(.*?)\*"', params.get('and', ''))]
+        matched = [
+            row for row in rows
+            if row['mentor'] and all(
+                term in row['description'].lower() or term in row['learning_goals'].lower() for term in terms
+            )
+        ]
+        matched.sort(key=lambda row: (row['mentor_id'], row['id']))
+        offset, limit = int(params['offset']), int(params['limit'])
+        return httpx.Response(200, json=matched[offset:offset + limit])
+
+    return handler
+
+
+def profile(row_id, mentor_id, description, learning_goals='', title=None):
+    return {'id': row_id, 'mentor_id': mentor_id, 'title': title or f'title{row_id}', 'description': description,
+            'learning_goals': learning_goals, 'hourly_rate': 0, 'currency': 'CNY', 'status': 'active',
+            'mentor': {'username': f'user{mentor_id}'}}
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    """Route SupabaseClient requests to an in-memory table and record them"""
+    requests = []
+    install_client(monkeypatch, serve_profiles(PROFILES, requests))
+    return requests
+
+
+class TestFindMentorsTool:
+    """find_mentors_tool ranks mentors with filtered profile queries"""
+
+    @pytest.mark.asyncio
+    async def test_pushed_down_filters(self, fake_supabase):
+        result = await find_mentors_tool.ainvoke({'university': 'Stanford', 'major': 'Computer Science'})
+
+        # one query per term combination: both terms, then each term alone
+        assert len(fake_supabase) == 3
+        params = fake_supabase[0].url.params
+        assert params['and'] == (
+            '(or(description.ilike."*Stanford*",learning_goals.ilike."*Stanford*"),'
+            'or(description.ilike."*Computer Science*",learning_goals.ilike."*Computer Science*"))'
+        )
+        assert 'mentor:users!mentor_id!inner(username)' in params['select']
+        assert params['mentor.role'] == 'eq.mentor'
+        assert params['mentor.is_active'] == 'eq.true'
+        assert params['order'] == 'mentor_id.asc,id.asc'
+
+        assert result.index('alice') < result.index('bob')
+        assert 'duplicate' not in result
+        assert 'Inactive' not in result
+
+    @pytest.mark.asyncio
+    async def test_best_match_is_never_dropped(self, monkeypatch):
+        from app.agents.v2.tools import study_tools
+
+        monkeypatch.setattr(study_tools, 'MENTOR_PAGE_SIZE', 4)
+        # many low-id mentors match only the university, the best mentor has the highest id
+        rows = [profile(i, i, 'Stanford') for i in range(60)]
+        rows.append(profile(1000, 999, 'Stanford master', 'Computer Science'))
+        rows.append(profile(1001, 998, 'Stanford', 'Computer Science'))
+        requests = []
+        install_client(monkeypatch, serve_profiles(rows, requests))
+
+        client = await supabase_module.get_supabase_client()
+        ranked = await study_tools._fetch_ranked_mentors(
+            client, [('Stanford', 3), ('Computer Science', 3), ('master', 2)]
+        )
+
+        assert [(score, row['mentor_id']) for score, row in ranked] == [
+            (8, 999), (6, 998), (3, 0), (3, 1), (3, 2)
+        ]
+        # one request per tier down to the university-only tier, which fills the remaining three with one page
+        assert len(requests) == 5
+
+    @pytest.mark.asyncio
+    async def test_pages_past_already_ranked_mentors(self, monkeypatch):
+        from app.agents.v2.tools import study_tools
+
+        monkeypatch.setattr(study_tools, 'MENTOR_PAGE_SIZE', 2)
+        rows = [profile(i, i, 'Stanford master') for i in range(3)] + [profile(10 + i, 10 + i, 'Stanford') for i in range(4)]
+        requests = []
+        install_client(monkeypatch, serve_profiles(rows, requests))
+
+        client = await supabase_module.get_supabase_client()
+        ranked = await study_tools._fetch_ranked_mentors(client, [('Stanford', 3), ('master', 2)])
+
+        assert [row['mentor_id'] for _, row in ranked] == [0, 1, 2, 10, 11]
+
+
+class TestPlatformStats:
+    """Platform statistics are counted server-side and cached"""
+
+    @pytest.mark.asyncio
+    async def test_supabase_counts_use_head_requests(self, monkeypatch):
+        import app.core.platform_stats as platform_stats_module
+        from app.core.platform_stats import PlatformStatsCache
+
+        monkeypatch.setattr(platform_stats_module, 'SUPABASE_PAGE_SIZE', 2)
+        services = [{'category': '申请指导'}, {'category': '申请指导'}, {'category': None}]
+        mentors = [
+            {'university': 'MIT', 'major': 'Physics', 'degree_level': 'phd'},
+            {'university': 'CMU', 'major': 'Physics', 'degree_level': None},
+            {'university': 'Stanford', 'major': 'Economics', 'degree_level': 'master'},
+        ]
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            table = request.url.path.rsplit('/', 1)[-1]
+            params = request.url.params
+            if request.method == 'HEAD':
+                if table == 'services':
+                    total = 3
+                else:
+                    total = 7 if params['role'] == 'eq.mentor' else 30
+                return httpx.Response(200, headers={'content-range': f'*/{total}'})
+            assert params['order'] == 'id.asc'
+            rows = services if table == 'services' else mentors
+            offset, limit = int(params['offset']), int(params['limit'])
+            return httpx.Response(200, json=rows[offset:offset + limit])
+
+        client = supabase_module.SupabaseClient()
+        client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        cache = PlatformStatsCache(ttl=60)
+        db_conn = {"type": "supabase", "connection": client}
+
+        stats = await cache.get(db_conn)
+        assert (stats.mentor_count, stats.student_count, stats.service_count) == (7, 30, 3)
+        # both column reads span two pages
+        assert stats.service_categories == {'申请指导': 2, '其他': 1}
+        assert stats.universities == ['CMU', 'MIT', 'Stanford']
+        assert stats.degree_levels == ['master', 'phd']
+        assert sum(r.method == 'HEAD' for r in requests) == 3
+        assert len(requests) == 7
+
+        await cache.get(db_conn)
+        assert len(requests) == 7
+
+    @pytest.mark.asyncio
+    async def test_single_flight_refresh(self):
+        import asyncio
+        from app.core.platform_stats import PlatformStatsCache
+
+        class FakeConnection:
+            calls = 0
+
+            async def fetchrow(self, query):
+                FakeConnection.calls += 1
+                await asyncio.sleep(0.01)
+                return {'mentor_count': 3, 'student_count': 5, 'universities': ['MIT'],
+                        'majors': ['Physics'], 'degree_levels': ['phd']}
+
+            async def fetch(self, query):
+                return [{'category': '文书指导', 'count': 4}]
+
+        cache = PlatformStatsCache(ttl=60)
+        db_conn = {"type": "asyncpg", "connection": FakeConnection()}
+        results = await asyncio.gather(*(cache.get(db_conn) for _ in range(5)))
+
+        assert FakeConnection.calls == 1
+        assert all(stats is results[0] for stats in results)
+        assert results[0].service_count == 4
+
+        cache.invalidate()
+        await cache.get(db_conn)
+        assert FakeConnection.calls == 2
@@ -0,0 +1,98 @@
+"""
+Test suite for the async Supabase REST query builder
+Requests are served by an in-memory httpx transport
+"""
+
+import json
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from app.core.supabase_client import SupabaseClient
+
+
+def make_client(handler):
+    """Build a SupabaseClient whose requests go to handler"""
+    client = SupabaseClient()
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+class TestQueryBuilder:
+    """Test request construction and response parsing"""
+
+    @pytest.mark.asyncio
+    async def test_select_filters_order_range_count(self):
+        seen = {}
+
+        def handler(request):
+            seen['request'] = request
+            return httpx.Response(200, json=[{'id': 1}], headers={'content-range': '0-0/42'})
+
+        client = make_client(handler)
+        result = await client.table('mentorship_relationships').select('id, major', count='exact') \
+            .eq('verification_status', 'verified').in_('university', ['MIT', 'UC Berkeley, CA']) \
+            .ilike('major', '%science%').not_.in_('id', [3, 4]).gte('rating', 4.5) \
+            .order('rating', desc=True).order('id').range(20, 29).execute()
+
+        request = seen['request']
+        params = list(request.url.params.multi_items())
+        assert request.method == 'GET'
+        assert request.url.path == '/rest/v1/mentorship_relationships'
+        assert ('select', 'id,major') in params
+        assert ('verification_status', 'eq.verified') in params
+        assert ('university', 'in.(MIT,"UC Berkeley, CA")') in params
+        assert ('major', 'ilike.%science%') in params
+        assert ('id', 'not.in.(3,4)') in params
+        assert ('rating', 'gte.4.5') in params
+        assert ('order', 'rating.desc,id.asc') in params
+        assert ('offset', '20') in params and ('limit', '10') in params
+        assert request.headers['prefer'] == 'count=exact'
+        assert result.data == [{'id': 1}]
+        assert result.count == 42
+
+    @pytest.mark.asyncio
+    async def test_bulk_upsert(self):
+        seen = {}
+
+        def handler(request):
+            seen['request'] = request
+            return httpx.Response(201, content=request.content)
+
+        client = make_client(handler)
+        rows = [{'student_id': 1, 'mentor_id': 2}, {'student_id': 1, 'mentor_id': 3}]
+        result = await client.table('mentorship_relationships').upsert(
+            rows, on_conflict='student_id,mentor_id'
+        ).execute()
+
+        request = seen['request']
+        assert request.method == 'POST'
+        assert request.url.params['on_conflict'] == 'student_id,mentor_id'
+        assert 'resolution=merge-duplicates' in request.headers['prefer']
+        assert json.loads(request.content) == rows
+        assert result.data == rows
+
+    @pytest.mark.asyncio
+    async def test_update_and_errors(self):
+        def handler(request):
+            if request.method == 'PATCH':
+                return httpx.Response(200, json=[{'id': 5, 'status': 'deleted'}])
+            return httpx.Response(400, json={'message': 'bad filter'})
+
+        client = make_client(handler)
+        result = await client.table('reviews').update({'status': 'deleted'}).eq('id', 5).execute()
+        assert result.data[0]['status'] == 'deleted'
+
+        with pytest.raises(HTTPException) as exc_info:
+            await client.table('reviews').select('*').eq('id', 'x').execute()
+        assert exc_info.value.status_code == 400
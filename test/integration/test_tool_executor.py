@@ -0,0 +1,137 @@
+"""
+Test suite for concurrent tool execution
+Covers parallel calls, thread-pool offloading of sync tools, per-tool timeouts, the TTL result cache
+and the AgentExecutor tool node
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.agents import tool_executor as tool_executor_module
+from app.agents.v2.ai_foundation.agents.agent_factory import (
+    AgentConfig, AgentExecutor, AgentState, AgentType, ToolRegistry
+)
+from app.agents.v2.ai_foundation.agents.tool_executor import ToolCall, ToolExecutor
+
+def slow_async(delay, value="ok"):
+    async def tool(**kwargs):
+        await asyncio.sleep(delay)
+        return f"{value}:{kwargs}"
+    return tool
+
+class TestToolExecutor:
+    """Test the executor in isolation"""
+
+    @pytest.mark.asyncio
+    async def test_calls_run_concurrently_in_order(self):
+        executor = ToolExecutor(cache_ttl=0)
+        start = time.monotonic()
+        results = await executor.run_many([
+            ToolCall("a", slow_async(0.1, "a"), {"q": 1}),
+            ToolCall("b", slow_async(0.1, "b"), {"q": 2}),
+        ])
+        assert time.monotonic() - start < 0.18
+        assert [r.tool for r in results] == ["a", "b"]
+        assert results[0].result == "a:{'q': 1}"
+
+    @pytest.mark.asyncio
+    async def test_sync_tool_does_not_block_loop(self):
+        executor = ToolExecutor(cache_ttl=0)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.02)
+
+        def blocking(query):
+            time.sleep(0.15)
+            return query
+
+        result, _ = await asyncio.gather(executor.run(ToolCall("sync", blocking, {"query": "x"})), ticker())
+        assert result.result == "x"
+        assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+
+    @pytest.mark.asyncio
+    async def test_timeout_cancels_tool(self):
+        executor = ToolExecutor(cache_ttl=0)
+        cancelled = asyncio.Event()
+
+        async def hanging():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        result = await executor.run(ToolCall("hang", hanging, {}, timeout=0.05))
+        assert result.error and "超时" in result.error
+        assert cancelled.is_set()
+        assert executor.stats["timeouts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_result_cache(self, monkeypatch):
+        executor = ToolExecutor(cache_ttl=60)
+        calls = []
+
+        async def search(query):
+            calls.append(query)
+            return f"result {query}"
+
+        for _ in range(2):
+            await executor.run(ToolCall("search", search, {"query": "cmu"}))
+        await executor.run(ToolCall("search", search, {"query": "mit"}))
+        assert calls == ["cmu", "mit"]
+
+        await executor.run(ToolCall("search", search, {"query": "cmu"}, cache_ttl=0))
+        assert calls == ["cmu", "mit", "cmu"]
+
+        now = time.time()
+        monkeypatch.setattr(tool_executor_module.time, "time", lambda: now + 61)
+        await executor.run(ToolCall("search", search, {"query": "mit"}))
+        assert calls[-1] == "mit" and len(calls) == 4
+
+    @pytest.mark.asyncio
+    async def test_errors_are_not_cached(self):
+        executor = ToolExecutor()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            raise RuntimeError("boom")
+
+        for _ in range(2):
+            result = await executor.run(ToolCall("flaky", flaky, {}))
+            assert "boom" in result.error
+        assert len(attempts) == 2
+
+class TestAgentToolNode:
+    """Test AgentExecutor._use_tool_node uses the executor"""
+
+    @pytest.mark.asyncio
+    async def test_tool_node_runs_tools_concurrently(self):
+        registry = ToolRegistry()
+        registry.register_tool("mentors", slow_async(0.1, "mentors"))
+        registry.register_tool("search", slow_async(1.0, "search"), timeout=0.05)
+        agent = AgentExecutor(
+            AgentConfig(agent_type=AgentType.STUDY_PLANNER, tenant_id="t"),
+            llm_manager=None, memory_bank=None, rag_manager=None, tool_registry=registry
+        )
+        agent.tool_executor = ToolExecutor(cache_ttl=0)
+        state = AgentState(input="q", messages=[], context={}, tool_calls=[
+            {"name": "mentors", "arguments": {"school": "CMU"}},
+            {"name": "search", "arguments": {"query": "CMU"}},
+        ])
+        start = time.monotonic()
+        state = await agent._use_tool_node(state)
+        assert time.monotonic() - start < 0.18
+        results = state.context["tool_results"]
+        assert results[0]["result"].startswith("mentors")
+        assert "超时" in results[1]["result"]
+        assert state.tool_calls == []
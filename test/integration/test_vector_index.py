@@ -0,0 +1,142 @@
+"""
+Test suite for the local tenant-partitioned vector index
+Covers exact and IVF search, tenant isolation, deletes/upserts and persistence
+"""
+
+import pytest
+import sys
+import os
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.data_communication.rag import vector_index
+from app.agents.v2.data_communication.rag.vector_index import LocalVectorIndex, VectorSegment
+
+DIM = 16
+
+def make_vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, DIM)).astype(np.float32)
+
+def add_vectors(index, tenant_id, vectors, prefix="doc", metadata=None):
+    ids = [f"{prefix}_{i}" for i in range(len(vectors))]
+    metadatas = [dict(metadata or {}, document_id=prefix, n=i) for i in range(len(vectors))]
+    index.add(tenant_id, ids, vectors.tolist(), [f"content {i}" for i in ids], metadatas)
+    return ids
+
+class TestExactSearch:
+    """Test exact scan search below the IVF threshold"""
+
+    def test_top_k_nearest(self, tmp_path):
+        index = LocalVectorIndex(str(tmp_path))
+        vectors = make_vectors(50)
+        ids = add_vectors(index, "t1", vectors)
+
+        results = index.search("t1", vectors[7].tolist(), top_k=5)
+        assert len(results) == 5
+        assert results[0][0]["id"] == ids[7]
+        assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_tenant_isolation(self, tmp_path):
+        index = LocalVectorIndex(str(tmp_path))
+        vectors = make_vectors(10)
+        add_vectors(index, "t1", vectors, prefix="a")
+        add_vectors(index, "t2", vectors, prefix="b")
+
+        results = index.search("t2", vectors[0].tolist(), top_k=10)
+        assert {record["id"] for record, _ in results} == {f"b_{i}" for i in range(10)}
+        assert index.search("t3", vectors[0].tolist()) == []
+
+    def test_metadata_filters(self, tmp_path):
+        index = LocalVectorIndex(str(tmp_path))
+        add_vectors(index, "t1", make_vectors(20, seed=1), prefix="a")
+        add_vectors(index, "t1", make_vectors(20, seed=2), prefix="b")
+
+        results = index.search("t1", make_vectors(1, seed=3)[0].tolist(), top_k=30,
+                               filters={"document_id": "b"})
+        assert len(results) == 20
+        assert all(record["metadata"]["document_id"] == "b" for record, _ in results)
+
+class TestMutations:
+    """Test tombstone deletes, upserts and compaction"""
+
+    def test_delete_and_upsert(self, tmp_path):
+        index = LocalVectorIndex(str(tmp_path))
+        vectors = make_vectors(10)
+        ids = add_vectors(index, "t1", vectors)
+
+        assert index.delete("t1", [ids[0], ids[1]]) == 2
+        results = index.search("t1", vectors[0].tolist(), top_k=10)
+        assert ids[0] not in {record["id"] for record, _ in results}
+
+        # 同ID重新写入覆盖旧向量
+        index.add("t1", [ids[2]], [vectors[9].tolist()], ["updated"], [{"document_id": "doc"}])
+        assert len(index.segment("t1")) == 8
+        top_record, _ = index.search("t1", vectors[9].tolist(), top_k=2)[0]
+        assert top_record["id"] in {ids[2], ids[9]}
+        assert index.stats("t1")["total_chunks"] == 8
+
+    def test_delete_by_filter_compacts(self, tmp_path):
+        index = LocalVectorIndex(str(tmp_path))
+        add_vectors(index, "t1", make_vectors(10, seed=1), prefix="a")
+        add_vectors(index, "t1", make_vectors(10, seed=2), prefix="b")
+
+        assert index.delete("t1", filters={"document_id": "a"}) == 10
+        segment = index.segment("t1")
+        assert segment.count == 10
+        assert index.stats("t1")["total_documents"] == 1
+
+class TestPersistence:
+    """Test reloading the index from disk"""
+
+    def test_reload(self, tmp_path):
+        index = LocalVectorIndex(str(tmp_path))
+        vectors = make_vectors(30)
+        ids = add_vectors(index, "tenant/with:odd chars", vectors)
+        index.delete("tenant/with:odd chars", [ids[3]])
+
+        reloaded = LocalVectorIndex(str(tmp_path))
+        results = reloaded.search("tenant/with:odd chars", vectors[5].tolist(), top_k=3)
+        assert results[0][0]["id"] == ids[5]
+        assert len(reloaded.segment("tenant/with:odd chars")) == 29
+
+    def test_truncates_torn_tail(self, tmp_path):
+        index = LocalVectorIndex(str(tmp_path))
+        add_vectors(index, "t1", make_vectors(5))
+        segment = index.segment("t1")
+        with open(os.path.join(segment.path, vector_index.RECORDS_FILE), "a") as f:
+            f.write('{"id": "partial"')
+
+        reloaded = VectorSegment(segment.path)
+        assert len(reloaded) == 5
+        assert "partial" not in reloaded.row_by_id
+
+class TestIVF:
+    """Test the inverted-file path for larger segments"""
+
+    def test_ivf_recall(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(vector_index, "IVF_MIN_VECTORS", 200)
+        index = LocalVectorIndex(str(tmp_path))
+        vectors = make_vectors(1000)
+        ids = add_vectors(index, "t1", vectors)
+        assert index.stats("t1")["ivf_lists"] > 0
+
+        hits = 0
+        for i in range(0, 1000, 50):
+            results = index.search("t1", vectors[i].tolist(), top_k=1)
+            hits += results[0][0]["id"] == ids[i]
+        assert hits >= 18
+
+    def test_ivf_filter_falls_back_to_exact(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(vector_index, "IVF_MIN_VECTORS", 200)
+        index = LocalVectorIndex(str(tmp_path))
+        add_vectors(index, "t1", make_vectors(500, seed=1), prefix="a")
+        add_vectors(index, "t1", make_vectors(3, seed=2), prefix="rare")
+
+        results = index.search("t1", make_vectors(1, seed=3)[0].tolist(), top_k=3,
+                               filters={"document_id": "rare"})
+        assert {record["id"] for record, _ in results} == {"rare_0", "rare_1", "rare_2"}
@@ -0,0 +1,109 @@
+"""
+Test suite for WorkingMemory session history
+Covers append-only Redis lists, the local ring buffer, last-N reads and concurrent turns
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.agents.v2.ai_foundation.memory.memory_bank import WorkingMemory
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.ops.append((name, args))
+            return self
+        return queue
+
+    async def execute(self):
+        self.redis.pipelines += 1
+        return [await getattr(self.redis, name)(*args) for name, args in self.ops]
+
+class FakeRedis:
+    """Minimal async Redis list implementation"""
+
+    def __init__(self):
+        self.lists = {}
+        self.ttls = {}
+        self.pipelines = 0
+        self.reads = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+        return len(self.lists[key])
+
+    async def ltrim(self, key, start, end):
+        items = self.lists.get(key, [])
+        self.lists[key] = items[start:] if end == -1 else items[start:end + 1]
+
+    async def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+    async def lrange(self, key, start, end):
+        self.reads.append((start, end))
+        items = self.lists.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    async def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    async def delete(self, key):
+        self.lists.pop(key, None)
+
+class TestRedisSessionHistory:
+    """Test the Redis list representation"""
+
+    @pytest.mark.asyncio
+    async def test_append_trim_expire_in_one_pipeline(self):
+        redis = FakeRedis()
+        memory = WorkingMemory(redis, max_turns=3)
+        for i in range(5):
+            await memory.add_interaction("s", f"问{i}", f"答{i}")
+        assert redis.pipelines == 5
+        history = await memory.get_session_history("s")
+        assert [turn["human"] for turn in history] == ["问2", "问3", "问4"]
+        assert redis.ttls["session:s:turns"] == memory.session_ttl
+        assert await memory.get_session_length("s") == 3
+
+    @pytest.mark.asyncio
+    async def test_last_n_window(self):
+        redis = FakeRedis()
+        memory = WorkingMemory(redis)
+        for i in range(10):
+            await memory.add_interaction("s", f"问{i}", f"答{i}")
+        window = await memory.get_session_history("s", last_n=2)
+        assert [turn["assistant"] for turn in window] == ["答8", "答9"]
+        assert redis.reads[-1] == (-2, -1)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_turns_are_not_lost(self):
+        memory = WorkingMemory(FakeRedis())
+        await asyncio.gather(*[memory.add_interaction("s", f"问{i}", f"答{i}") for i in range(20)])
+        assert await memory.get_session_length("s") == 20
+
+class TestLocalSessionHistory:
+    """Test the local ring buffer used without Redis"""
+
+    @pytest.mark.asyncio
+    async def test_ring_buffer_and_window(self):
+        memory = WorkingMemory(max_turns=4)
+        for i in range(6):
+            await memory.add_interaction("s", f"问{i}", f"答{i}")
+        assert [turn["human"] for turn in await memory.get_session_history("s")] == ["问2", "问3", "问4", "问5"]
+        assert [turn["human"] for turn in await memory.get_session_history("s", last_n=1)] == ["问5"]
+        assert await memory.get_session_history("s", last_n=0) == []
+
+        await memory.clear_session("s")
+        assert await memory.get_session_history("s") == []